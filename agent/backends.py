@@ -0,0 +1,141 @@
+"""Local model backends: a scripted policy that stands in for the OpenAI API.
+
+A backend is anything with create(model=, messages=, tools=) like client.chat.completions
+(async create() for arun_agent_task). Scripted backends need no network or API key, so the
+harness itself (workspaces, tools, outcome capture, grading) can be benchmarked in isolation.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from openai.types.chat import ChatCompletion
+
+from streaming import response_chunks
+
+
+def _estimate_tokens(value: Any) -> int:
+    """Rough token count (~4 characters per token) for synthetic usage numbers."""
+    text = value if isinstance(value, str) else json.dumps(value)
+    return max(1, len(text) // 4)
+
+
+class ScriptedBackend:
+    """Replays a fixed policy: the Nth assistant turn of every conversation returns script turn N.
+
+    Script YAML:
+
+        latency_sec: 0.2          # optional artificial latency per call
+        turns:
+          - tool_calls:
+              - name: read_file
+                arguments: {path: main.py}
+          - content: "All done."
+
+    The turn is chosen from the number of assistant messages already in the request, so one
+    backend can serve many concurrent trials. Past the end of the script the last turn repeats.
+    With stream=True the turn is returned as chunks, the latency spread evenly across them.
+    """
+
+    def __init__(self, turns: list[dict[str, Any]], *, latency_sec: float = 0.0):
+        if not turns:
+            raise ValueError("Scripted backend needs at least one turn")
+        self.turns = turns
+        self.latency_sec = latency_sec
+
+    @classmethod
+    def from_yaml(cls, path: Path, *, latency_sec: float | None = None) -> "ScriptedBackend":
+        import yaml  # only needed for script files; the evaluation harness depends on pyyaml
+
+        data = yaml.safe_load(Path(path).read_text()) or {}
+        latency = data.get("latency_sec", 0.0) if latency_sec is None else latency_sec
+        return cls(data.get("turns", []), latency_sec=latency)
+
+    def _respond(self, model: str, messages: list[dict[str, Any]]) -> ChatCompletion:
+        turn_index = sum(1 for m in messages if m.get("role") == "assistant")
+        turn = self.turns[min(turn_index, len(self.turns) - 1)]
+
+        message: dict[str, Any] = {"role": "assistant", "content": turn.get("content")}
+        if turn.get("tool_calls"):
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{turn_index}_{i}",
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call.get("arguments", {}))},
+                }
+                for i, call in enumerate(turn["tool_calls"])
+            ]
+
+        prompt_tokens = _estimate_tokens(messages)
+        completion_tokens = _estimate_tokens(message)
+        return ChatCompletion.model_validate(
+            {
+                "id": f"scripted-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+                        "message": message,
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        )
+
+    def create(
+        self,
+        *,
+        model: str,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        stream: bool = False,
+        **kwargs,
+    ):
+        if stream:
+            return self._stream(self._respond(model, messages))
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+        return self._respond(model, messages)
+
+    def _stream(self, response: ChatCompletion):
+        chunks = response_chunks(response)
+        for chunk in chunks:
+            if self.latency_sec:
+                time.sleep(self.latency_sec / len(chunks))
+            yield chunk
+
+
+class AsyncScriptedBackend(ScriptedBackend):
+    """Async variant of ScriptedBackend for arun_agent_task."""
+
+    async def create(
+        self,
+        *,
+        model: str,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        stream: bool = False,
+        **kwargs,
+    ):
+        if stream:
+            return self._astream(self._respond(model, messages))
+        if self.latency_sec:
+            await asyncio.sleep(self.latency_sec)
+        return self._respond(model, messages)
+
+    async def _astream(self, response: ChatCompletion):
+        chunks = response_chunks(response)
+        for chunk in chunks:
+            if self.latency_sec:
+                await asyncio.sleep(self.latency_sec / len(chunks))
+            yield chunk
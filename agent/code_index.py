@@ -0,0 +1,262 @@
+"""In-memory trigram index of a workspace's text files, for the search_code tool.
+
+Each indexed file keeps its lines and the set of (lowercased) trigrams it contains; a
+literal query only scans files that contain every trigram of the query. A workspace's index
+is made on its first search: cloned from a memoised index when the contents are identical
+(a workspace nothing has changed yet), built otherwise. After that it is kept current
+incrementally: files written through the tools are re-indexed immediately, and a stat
+rescan before each search picks up changes made any other way (e.g. by run_command).
+"""
+
+import fnmatch
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from test_impact import IGNORED_DIRS
+
+# Only text files with these suffixes are indexed
+INDEXED_SUFFIXES = {
+    ".py", ".pyi", ".md", ".rst", ".txt", ".toml", ".cfg", ".ini", ".yaml", ".yml", ".json",
+    ".html", ".css", ".js", ".ts", ".sql", ".sh",
+}
+# Larger files are skipped (generated or data files)
+MAX_INDEXED_FILE_BYTES = 1 << 20
+DEFAULT_MAX_RESULTS = 30
+MAX_RESULTS_LIMIT = 200
+# Characters of a matching line shown per result
+MAX_LINE_CHARS = 200
+
+_DEFINITION = re.compile(r"^\s*(?:async\s+def|def|class)\s+(\w+)")
+
+# Built indexes kept for cloning, by content signature. Most trials search a pristine workspace
+# and share one entry; a workspace edited before its first search brings its own, so keep few
+MEMO_MAX_ENTRIES = 4
+
+_memo: OrderedDict[str, "CodeIndex"] = OrderedDict()
+# One lock per signature being built, so builds of different contents run in parallel
+_building: dict[str, threading.Lock] = {}
+_memo_lock = threading.Lock()
+
+
+def _memoised(signature: str) -> "CodeIndex | None":
+    with _memo_lock:
+        base = _memo.get(signature)
+        if base is not None:
+            _memo.move_to_end(signature)
+        return base
+
+
+def trigrams(text: str) -> set[str]:
+    lowered = text.lower()
+    return {lowered[i : i + 3] for i in range(len(lowered) - 2)}
+
+
+@dataclass
+class _Entry:
+    mtime_ns: int
+    size: int
+    lines: list[str]
+    trigrams: frozenset[str]
+
+
+class CodeIndex:
+    """Trigram index over the text files under root. Safe to share across threads."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._files: dict[str, _Entry] = {}
+        self._postings: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def _scan(self) -> dict[str, os.stat_result]:
+        """Stat every indexable file under root, by relative posix path."""
+        found = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if d not in IGNORED_DIRS]
+            for name in filenames:
+                if os.path.splitext(name)[1] not in INDEXED_SUFFIXES:
+                    continue
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                if st.st_size <= MAX_INDEXED_FILE_BYTES:
+                    found[Path(full).relative_to(self.root).as_posix()] = st
+        return found
+
+    def _remove(self, rel: str) -> None:
+        entry = self._files.pop(rel, None)
+        if entry is None:
+            return
+        for gram in entry.trigrams:
+            files = self._postings.get(gram)
+            if files is not None:
+                files.discard(rel)
+                if not files:
+                    del self._postings[gram]
+
+    def _add(self, rel: str, text: str, st: os.stat_result) -> None:
+        self._remove(rel)
+        grams = frozenset(trigrams(text))
+        self._files[rel] = _Entry(st.st_mtime_ns, st.st_size, text.splitlines(), grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(rel)
+
+    def _index_file(self, rel: str, st: os.stat_result | None = None) -> None:
+        full = self.root / rel
+        try:
+            st = st or full.stat()
+            if os.path.splitext(rel)[1] not in INDEXED_SUFFIXES or st.st_size > MAX_INDEXED_FILE_BYTES:
+                self._remove(rel)
+                return
+            text = full.read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            self._remove(rel)
+            return
+        self._add(rel, text, st)
+
+    def update(self, rel: str) -> None:
+        """Re-index one file (path relative to root) after it was written; drops it if gone."""
+        with self._lock:
+            self._index_file(rel)
+
+    def refresh(self) -> int:
+        """Re-index files whose size or mtime changed since indexed, add new ones, drop deleted ones.
+
+        Returns the number of files re-indexed or dropped.
+        """
+        with self._lock:
+            return self._refresh()
+
+    def _refresh(self) -> int:
+        current = self._scan()
+        changed = 0
+        for rel in set(self._files) - set(current):
+            self._remove(rel)
+            changed += 1
+        for rel, st in current.items():
+            entry = self._files.get(rel)
+            if entry is None or entry.mtime_ns != st.st_mtime_ns or entry.size != st.st_size:
+                self._index_file(rel, st)
+                changed += 1
+        return changed
+
+    def build(self) -> "CodeIndex":
+        self.refresh()
+        return self
+
+    def clone(self, root: Path) -> "CodeIndex":
+        """A copy of this index for another directory with the same contents (e.g. a workspace)."""
+        with self._lock:
+            other = CodeIndex(root)
+            other._files = dict(self._files)
+            other._postings = {gram: set(files) for gram, files in self._postings.items()}
+        return other
+
+    @classmethod
+    def for_workspace(cls, root: Path) -> "CodeIndex":
+        """An index of root, cloned from a memoised index of identical contents if there is one."""
+        digest = hashlib.sha256()
+        stats = {}
+        probe = cls(root)
+        for rel, st in sorted(probe._scan().items()):
+            try:
+                data = (root / rel).read_bytes()
+            except OSError:
+                continue
+            digest.update(rel.encode("utf-8") + b"\0" + data + b"\0")
+            stats[rel] = st
+        signature = digest.hexdigest()
+
+        base = _memoised(signature)
+        if base is None:
+            with _memo_lock:
+                build_lock = _building.setdefault(signature, threading.Lock())
+            with build_lock:
+                # Whoever held the lock first has built it
+                base = _memoised(signature)
+                if base is None:
+                    base = cls(root).build()
+                    with _memo_lock:
+                        _memo[signature] = base
+                        while len(_memo) > MEMO_MAX_ENTRIES:
+                            _memo.popitem(last=False)
+                        _building.pop(signature, None)
+        index = base.clone(root)
+        # Same contents, different files: adopt this workspace's stats so refresh() sees no changes
+        for rel, st in stats.items():
+            entry = index._files.get(rel)
+            if entry is not None:
+                index._files[rel] = _Entry(st.st_mtime_ns, st.st_size, entry.lines, entry.trigrams)
+        return index
+
+    def _candidates(self, query: str, regex: bool) -> set[str]:
+        if regex or len(query) < 3:
+            return set(self._files)
+        grams = sorted(trigrams(query), key=lambda g: len(self._postings.get(g, ())))
+        result = set(self._postings.get(grams[0], ()))
+        for gram in grams[1:]:
+            result &= self._postings.get(gram, set())
+            if not result:
+                break
+        return result
+
+    def search(
+        self,
+        query: str,
+        *,
+        regex: bool = False,
+        case_sensitive: bool = False,
+        path_glob: str | None = None,
+        max_results: int = DEFAULT_MAX_RESULTS,
+    ) -> tuple[list[tuple[str, int, str]], int]:
+        """Matching lines as (path, line number, line), ranked, at most max_results.
+
+        Definitions of a matching name rank first, then other def/class lines, then files with
+        more matches. Also returns the total number of matching lines. Raises re.error for an
+        invalid regex.
+        """
+        flags = 0 if case_sensitive else re.IGNORECASE
+        pattern = re.compile(query if regex else re.escape(query), flags)
+        with self._lock:
+            self._refresh()
+            matches: list[tuple[str, int, str]] = []
+            for rel in self._candidates(query, regex):
+                if path_glob and not fnmatch.fnmatch(rel, path_glob):
+                    continue
+                for line_no, line in enumerate(self._files[rel].lines, 1):
+                    if pattern.search(line):
+                        matches.append((rel, line_no, line))
+
+        per_file: dict[str, int] = {}
+        for rel, _, _ in matches:
+            per_file[rel] = per_file.get(rel, 0) + 1
+
+        def rank(match: tuple[str, int, str]) -> tuple:
+            definition = _DEFINITION.match(match[2])
+            tier = 2 if definition is None else 0 if pattern.search(definition.group(1)) else 1
+            return (tier, -per_file[match[0]], match[0], match[1])
+
+        matches.sort(key=rank)
+        return matches[: max(1, min(max_results, MAX_RESULTS_LIMIT))], len(matches)
+
+
+def format_results(query: str, results: list[tuple[str, int, str]], total: int) -> str:
+    """path:line: text lines for the model, with a note on how many matches were left out."""
+    if not results:
+        return f"No matches for {query!r}"
+    lines = []
+    for rel, line_no, text in results:
+        text = text.strip()
+        if len(text) > MAX_LINE_CHARS:
+            text = text[:MAX_LINE_CHARS] + "..."
+        lines.append(f"{rel}:{line_no}: {text}")
+    if total > len(results):
+        lines.append(f"... {total - len(results)} more matches; narrow the query or use path_glob")
+    return "\n".join(lines)
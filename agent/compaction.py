@@ -0,0 +1,108 @@
+"""Context compaction: keep the prompt sent to the model under a token budget.
+
+The full transcript is kept for the trajectory; only the copy sent to the model is compacted.
+"""
+
+import json
+from typing import Any
+
+DEFAULT_TOKEN_BUDGET = 32_000
+# Compaction shrinks the prompt to this fraction of the budget, so it runs rarely and the
+# compacted prefix stays byte-identical (and provider-cacheable) for many calls after
+COMPACTION_TARGET_RATIO = 0.6
+# The most recent tool results are left intact unless nothing else gets under budget
+KEEP_RECENT_TOOL_RESULTS = 4
+# Characters kept (half head, half tail) from a truncated tool result
+STALE_TOOL_RESULT_CHARS = 1_200
+
+
+def estimate_tokens(messages: list[dict[str, Any]]) -> int:
+    """Rough token count (~4 characters per token) of message contents and tool call arguments."""
+    chars = 0
+    for m in messages:
+        chars += len(m.get("content") or "")
+        for tc in m.get("tool_calls") or []:
+            chars += len(tc["function"]["name"]) + len(tc["function"]["arguments"] or "")
+    return chars // 4
+
+
+def head_tail(text: str, keep_chars: int, what: str = "characters") -> str:
+    """Keep the first and last keep_chars/2 characters of text with an elision marker between."""
+    if len(text) <= keep_chars:
+        return text
+    half = keep_chars // 2
+    elided = len(text) - 2 * half
+    return f"{text[:half]}\n... [{elided} {what} elided] ...\n{text[len(text) - half:]}"
+
+
+def _tool_calls_by_id(messages: list[dict[str, Any]]) -> dict[str, tuple[str, dict]]:
+    calls = {}
+    for m in messages:
+        for tc in m.get("tool_calls") or []:
+            try:
+                args = json.loads(tc["function"]["arguments"] or "{}")
+            except json.JSONDecodeError:
+                args = {}
+            calls[tc["id"]] = (tc["function"]["name"], args if isinstance(args, dict) else {})
+    return calls
+
+
+class Compactor:
+    """Builds the message list for each LLM call, shrinking stale tool output when over budget.
+
+    The list sent to the model is append-only between compactions: new transcript messages
+    are appended to the previous request unchanged, so provider-side prompt caching keeps
+    hitting. Only when that list exceeds token_budget is it compacted, down to
+    COMPACTION_TARGET_RATIO of the budget, in order until it fits:
+      1. reads of a file that was read in full, written or edited later are replaced by a stub
+      2. older tool results are cut to their head and tail, oldest first
+      3. the most recent tool results are cut the same way
+    """
+
+    def __init__(self, token_budget: int | None = DEFAULT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.tokens_saved = 0
+        self.n_compactions = 0
+        self._view: list[dict[str, Any]] = []
+        self._n_seen = 0
+
+    def compact(self, messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Return the messages to send for this call; `messages` itself is not modified."""
+        if self.token_budget is None:
+            return messages
+
+        self._view.extend(dict(m) for m in messages[self._n_seen :])
+        self._n_seen = len(messages)
+        if estimate_tokens(self._view) > self.token_budget:
+            self._shrink(self._view, int(self.token_budget * COMPACTION_TARGET_RATIO))
+            self.n_compactions += 1
+
+        self.tokens_saved += estimate_tokens(messages) - estimate_tokens(self._view)
+        return list(self._view)
+
+    @staticmethod
+    def _shrink(view: list[dict[str, Any]], target: int) -> None:
+        calls = _tool_calls_by_id(view)
+        tool_positions = [i for i, m in enumerate(view) if m.get("role") == "tool"]
+
+        # 1. Collapse superseded reads (a later read of only some lines supersedes nothing)
+        last_touch: dict[str, int] = {}
+        for i in tool_positions:
+            name, args = calls.get(view[i].get("tool_call_id"), ("", {}))
+            full_read = name == "read_file" and args.get("offset") is None and args.get("limit") is None
+            if (full_read or name in ("write_file", "edit_file")) and "path" in args:
+                last_touch[args["path"]] = i
+        for i in tool_positions:
+            name, args = calls.get(view[i].get("tool_call_id"), ("", {}))
+            if name == "read_file" and last_touch.get(args.get("path"), i) > i:
+                view[i]["content"] = (
+                    f"[Earlier read of {args['path']} omitted: the file was read, written or edited again later]"
+                )
+
+        # 2./3. Truncate tool results, older ones first, then the most recent ones
+        recent = set(tool_positions[-KEEP_RECENT_TOOL_RESULTS:])
+        ordered = [i for i in tool_positions if i not in recent] + [i for i in tool_positions if i in recent]
+        for i in ordered:
+            if estimate_tokens(view) <= target:
+                break
+            view[i]["content"] = head_tail(view[i].get("content") or "", STALE_TOOL_RESULT_CHARS)
@@ -0,0 +1,114 @@
+"""Tool call execution: run read-only calls from one assistant turn concurrently, keep writes ordered."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+# Tools that never change the workspace
+READ_ONLY_TOOLS = {"read_file", "search_code"}
+
+MAX_PARALLEL_TOOL_CALLS = 8
+
+
+def is_read_only(name: str, arguments: dict) -> bool:
+    """True if a call has no side effects and may run alongside other read-only calls.
+
+    run_command is read-only only when the model marks it with read_only=true.
+    """
+    if name in READ_ONLY_TOOLS:
+        return True
+    if name == "run_command":
+        return arguments.get("read_only") is True
+    return False
+
+
+class ToolCallScheduler:
+    """Runs tool calls in threads as they are submitted.
+
+    Read-only calls run concurrently with each other. A call with side effects waits for
+    every earlier call and blocks every later one, so writes keep their original order.
+    Results are returned in submission order.
+    """
+
+    def __init__(self, run_one: Callable[[str, dict], str], max_workers: int = MAX_PARALLEL_TOOL_CALLS):
+        self._run_one = run_one
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool-call")
+        self._futures: list[Future] = []
+        self._barrier: Future | None = None
+        self._since_barrier: list[Future] = []
+
+    def _run_after(self, deps: list[Future], name: str, arguments: dict) -> str:
+        wait(deps)
+        return self._run_one(name, arguments)
+
+    def submit(self, name: str, arguments: dict) -> None:
+        """Dispatch a call; it starts as soon as the calls it depends on have finished."""
+        if is_read_only(name, arguments):
+            deps = [self._barrier] if self._barrier else []
+            future = self._pool.submit(self._run_after, deps, name, arguments)
+            self._since_barrier.append(future)
+        else:
+            deps = ([self._barrier] if self._barrier else []) + self._since_barrier
+            future = self._pool.submit(self._run_after, deps, name, arguments)
+            self._barrier = future
+            self._since_barrier = []
+        self._futures.append(future)
+
+    def results(self) -> list[str]:
+        """Wait for all submitted calls and return their results in submission order."""
+        try:
+            return [f.result() for f in self._futures]
+        finally:
+            self._pool.shutdown(wait=False)
+
+
+class AsyncToolCallScheduler:
+    """Asyncio variant of ToolCallScheduler for coroutine tools."""
+
+    def __init__(self, run_one: Callable[[str, dict], Awaitable[str]]):
+        self._run_one = run_one
+        self._tasks: list[asyncio.Task] = []
+        self._barrier: asyncio.Task | None = None
+        self._since_barrier: list[asyncio.Task] = []
+
+    async def _run_after(self, deps: list[asyncio.Task], name: str, arguments: dict) -> str:
+        if deps:
+            await asyncio.wait(deps)
+        return await self._run_one(name, arguments)
+
+    def submit(self, name: str, arguments: dict) -> None:
+        """Dispatch a call; it starts as soon as the calls it depends on have finished."""
+        if is_read_only(name, arguments):
+            deps = [self._barrier] if self._barrier else []
+            task = asyncio.ensure_future(self._run_after(deps, name, arguments))
+            self._since_barrier.append(task)
+        else:
+            deps = ([self._barrier] if self._barrier else []) + self._since_barrier
+            task = asyncio.ensure_future(self._run_after(deps, name, arguments))
+            self._barrier = task
+            self._since_barrier = []
+        self._tasks.append(task)
+
+    async def results(self) -> list[str]:
+        """Wait for all submitted calls and return their results in submission order."""
+        return list(await asyncio.gather(*self._tasks))
+
+
+def execute_tool_calls(calls: list[tuple[str, dict]], run_one: Callable[[str, dict], str]) -> list[str]:
+    """Execute one turn's tool calls and return results in call order."""
+    if len(calls) <= 1 or not any(is_read_only(name, args) for name, args in calls):
+        return [run_one(name, args) for name, args in calls]
+    scheduler = ToolCallScheduler(run_one, max_workers=min(len(calls), MAX_PARALLEL_TOOL_CALLS))
+    for name, args in calls:
+        scheduler.submit(name, args)
+    return scheduler.results()
+
+
+async def aexecute_tool_calls(
+    calls: list[tuple[str, dict]], run_one: Callable[[str, dict], Awaitable[str]]
+) -> list[str]:
+    """Async variant of execute_tool_calls."""
+    scheduler = AsyncToolCallScheduler(run_one)
+    for name, args in calls:
+        scheduler.submit(name, args)
+    return await scheduler.results()
@@ -0,0 +1,211 @@
+"""Record/replay cache for chat completion responses, keyed on the request content."""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from openai import AsyncOpenAI, OpenAI
+from openai.types.chat import ChatCompletion
+
+from streaming import StreamAssembler, response_chunks
+
+# passthrough: always call the API; record: serve hits, call the API on misses and store the
+# response; replay: serve hits only and raise CacheMiss otherwise (no network, no API key)
+CACHE_MODES = ("passthrough", "record", "replay")
+
+# Tool results that differ between otherwise identical runs (workspace paths, test timings, object
+# addresses in reprs) are normalised before hashing so reruns hit the cache. Only tool results, and
+# only these formats: anything else that differs, e.g. "timeout of 5s" in a prompt, must change the key
+_VOLATILE = [
+    (re.compile(r"eval_workspaces_\w+/trial_\d+"), "<workspace>"),
+    (re.compile(r"eval_trial_\w+"), "<workspace>"),
+    # pytest's summary ("3 passed, 1 failed in 0.12s", "(0:01:05)" past a minute) and run_tests' header
+    (
+        re.compile(
+            r"\b((?:passed|failed|errors?|skipped|deselected|xfailed|xpassed|warnings?|no tests ran)\)? in )"
+            r"\d+\.\d{2}s\b(?: \(\d+:\d{2}:\d{2}\))?"
+        ),
+        r"\1<duration>",
+    ),
+    (re.compile(r"\b(tests timed out after )\d+s\b"), r"\1<duration>"),
+    (re.compile(r"\bat 0x[0-9a-fA-F]+>"), "at <addr>>"),
+]
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a request has no recorded response."""
+
+
+def _normalise(text: str) -> str:
+    for pattern, repl in _VOLATILE:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def _normalise_message(message: dict[str, Any]) -> dict[str, Any]:
+    if message.get("role") != "tool" or not isinstance(message.get("content"), str):
+        return message
+    return {**message, "content": _normalise(message["content"])}
+
+
+def cache_key(model: str, messages: list[dict[str, Any]], tools: list[dict[str, Any]] | None) -> str:
+    """Content address of a request: sha256 over canonical JSON of model, messages and tools."""
+    payload = {"model": model, "messages": [_normalise_message(m) for m in messages], "tools": tools or []}
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite store of recorded responses. Safe to share across threads."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, model: str, response: dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created) VALUES (?, ?, ?, ?)",
+                (key, model, json.dumps(response), time.time()),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+class CachedCompletions:
+    """Drop-in for client.chat.completions that records and replays responses.
+
+    The OpenAI client is only created (via client_factory) on the first cache miss that
+    needs the network, so replay runs need no API key. With stream=True, hits are replayed as
+    chunks and misses are streamed through, the assembled response being recorded at the end.
+    """
+
+    default_client_factory: Callable[[], Any] = OpenAI
+
+    def __init__(self, cache: ResponseCache, mode: str, client_factory: Callable[[], Any] | None = None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode} (expected one of {', '.join(CACHE_MODES)})")
+        self.cache = cache
+        self.mode = mode
+        self._client_factory = client_factory or self.default_client_factory
+        self._client = None
+
+    def _client_completions(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client.chat.completions
+
+    def _lookup(self, model: str, messages: list[dict[str, Any]], tools: list[dict[str, Any]] | None):
+        """Return (key, cached response or None)."""
+        if self.mode == "passthrough":
+            return None, None
+        key = cache_key(model, messages, tools)
+        data = self.cache.get(key)
+        if data is not None:
+            return key, ChatCompletion.model_validate(data)
+        if self.mode == "replay":
+            raise CacheMiss(f"No recorded response for request {key[:12]} (model={model})")
+        return key, None
+
+    def _store(self, key: str | None, model: str, response: ChatCompletion) -> None:
+        if key is not None:
+            self.cache.put(key, model, response.model_dump(mode="json"))
+
+    def create(
+        self,
+        *,
+        model: str,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        stream: bool = False,
+        **kwargs,
+    ):
+        key, cached = self._lookup(model, messages, tools)
+        if cached is not None:
+            return iter(response_chunks(cached)) if stream else cached
+        if stream:
+            chunks = self._client_completions().create(
+                model=model, messages=messages, tools=tools, stream=True, **kwargs
+            )
+            return self._record_stream(key, model, chunks)
+        response = self._client_completions().create(model=model, messages=messages, tools=tools, **kwargs)
+        self._store(key, model, response)
+        return response
+
+    def _record_stream(self, key: str | None, model: str, chunks):
+        assembler = StreamAssembler()
+        for chunk in chunks:
+            assembler.feed(chunk)
+            yield chunk
+        self._store(key, model, assembler.response())
+
+
+class AsyncCachedCompletions(CachedCompletions):
+    """Async variant of CachedCompletions wrapping an AsyncOpenAI client."""
+
+    default_client_factory = AsyncOpenAI
+
+    async def create(
+        self,
+        *,
+        model: str,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+        stream: bool = False,
+        **kwargs,
+    ):
+        key, cached = self._lookup(model, messages, tools)
+        if cached is not None:
+            return _aiter(response_chunks(cached)) if stream else cached
+        if stream:
+            chunks = await self._client_completions().create(
+                model=model, messages=messages, tools=tools, stream=True, **kwargs
+            )
+            return self._arecord_stream(key, model, chunks)
+        response = await self._client_completions().create(model=model, messages=messages, tools=tools, **kwargs)
+        self._store(key, model, response)
+        return response
+
+    async def _arecord_stream(self, key: str | None, model: str, chunks):
+        assembler = StreamAssembler()
+        async for chunk in chunks:
+            assembler.feed(chunk)
+            yield chunk
+        self._store(key, model, assembler.response())
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
@@ -1,25 +1,53 @@
 """ReAct loop: user input -> LLM -> parse tool calls -> execute tools -> send results back -> repeat."""
 
+import asyncio
+import hashlib
 import json
 import os
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
-from tools import APP_ROOT, get_tool_functions, read_file, run_command, write_file
+from compaction import DEFAULT_TOKEN_BUDGET, Compactor
+from executor import AsyncToolCallScheduler, ToolCallScheduler, aexecute_tool_calls, execute_tool_calls
+from output_capture import DEFAULT_OUTPUT_BUDGET_BYTES
+from pytest_service import PytestService
+from shell import ShellSession
+from streaming import StreamAssembler
+from test_impact import TestImpactMap
+from tools import (
+    APP_ROOT,
+    ToolState,
+    edit_file,
+    get_async_tool_functions,
+    get_tool_functions,
+    read_file,
+    run_command,
+    run_tests,
+    search_code,
+    write_file,
+)
 
 load_dotenv()
 api_key = os.environ.get("OPENAI_API_KEY")
-if not api_key:
-    raise SystemExit("Missing OPENAI_API_KEY.")
+
+
+def _require_api_key() -> str:
+    """Return the OpenAI API key; only needed when a request actually goes to the API."""
+    if not api_key:
+        raise SystemExit("Missing OPENAI_API_KEY.")
+    return api_key
+
 
 SYSTEM_PROMPT = (
     "You are an expert coding agent. The app is in ../app. "
-    "When running tests or server commands, ALWAYS prepend poetry run (e.g. poetry run pytest)."
+    "Use search_code to find code instead of grep. Use the run_tests tool to run the test suite. "
+    "To change part of an existing file, use edit_file rather than rewriting it with write_file. "
+    "When running other commands such as the server, ALWAYS prepend poetry run (e.g. poetry run uvicorn main:app)."
 )
 
 
@@ -33,6 +61,15 @@ class RunResult:
     usage: dict[str, int]
     latency_sec: float
     finished: bool
+    # One entry per LLM call: prompt_tokens, completion_tokens, total_tokens, cached_tokens, latency_sec
+    llm_calls: list[dict[str, Any]] = field(default_factory=list)
+    # Estimated prompt tokens removed by context compaction, summed over all LLM calls
+    compaction_tokens_saved: int = 0
+    # Files written through write_file or edit_file, relative to the app root
+    files_changed: list[str] = field(default_factory=list)
+    # Bytes the model emitted in file-changing tool calls, and bytes of files written as a result
+    bytes_emitted: int = 0
+    bytes_written: int = 0
 
 
 TOOLS = [
@@ -40,7 +77,11 @@ TOOLS = [
         "type": "function",
         "function": {
             "name": "run_command",
-            "description": "Run a shell command. Use cwd='../app' to run from the app directory (e.g. for poetry run pytest).",
+            "description": (
+                "Run a shell command. Use cwd='../app' to run from the app directory (e.g. for poetry run pytest). "
+                "Set read_only=true for commands with no side effects so they can run in parallel with other reads. "
+                "Long output is cut to its head and tail."
+            ),
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -49,6 +90,14 @@ TOOLS = [
                         "type": "string",
                         "description": "Optional working directory, e.g. '../app' to run from the app root.",
                     },
+                    "read_only": {
+                        "type": "boolean",
+                        "description": "True if the command does not modify files or state (e.g. ls, cat, grep, git diff).",
+                    },
+                    "timeout": {
+                        "type": "number",
+                        "description": "Seconds before the command is killed (default 300); partial output is returned.",
+                    },
                 },
                 "required": ["cmd"],
             },
@@ -58,11 +107,16 @@ TOOLS = [
         "type": "function",
         "function": {
             "name": "read_file",
-            "description": "Read a file from ../app. Path is relative to the app root.",
+            "description": (
+                "Read a file from ../app. Path is relative to the app root. Output is capped at about 64 KB; "
+                "for large files, read a range of lines with offset and limit."
+            ),
             "parameters": {
                 "type": "object",
                 "properties": {
                     "path": {"type": "string", "description": "Path relative to app root, e.g. 'main.py' or 'tests/test_main.py'."},
+                    "offset": {"type": "integer", "description": "Optional first line to read (1-based). Default: 1."},
+                    "limit": {"type": "integer", "description": "Optional maximum number of lines to read."},
                 },
                 "required": ["path"],
             },
@@ -83,12 +137,112 @@ TOOLS = [
             },
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "edit_file",
+            "description": (
+                "Edit a file in ../app by replacing an exact string. old_string must match the file exactly "
+                "(including whitespace and indentation) and occur once, unless replace_all is true. "
+                "Much cheaper than write_file for small changes to existing files."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {"type": "string", "description": "Path relative to app root."},
+                    "old_string": {
+                        "type": "string",
+                        "description": "Exact text to replace; include enough surrounding lines to make it unique.",
+                    },
+                    "new_string": {"type": "string", "description": "Replacement text."},
+                    "replace_all": {
+                        "type": "boolean",
+                        "description": "Replace every occurrence instead of requiring exactly one.",
+                    },
+                },
+                "required": ["path", "old_string", "new_string"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_code",
+            "description": (
+                "Search the app's source and text files. Returns ranked 'path:line: text' matches "
+                "(definitions first). Faster than grep through run_command."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "Text to find (a regular expression if regex is true)."},
+                    "regex": {"type": "boolean", "description": "Treat query as a Python regular expression."},
+                    "path_glob": {"type": "string", "description": "Optional glob to limit files, e.g. 'tests/*.py'."},
+                    "case_sensitive": {"type": "boolean", "description": "Match case exactly. Default: false."},
+                    "max_results": {"type": "integer", "description": "Maximum matches to return (default 30)."},
+                },
+                "required": ["query"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "run_tests",
+            "description": (
+                "Run the app's pytest suite and return pass/fail counts plus details of failing tests. "
+                "Faster than running pytest through run_command."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "paths": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": (
+                            "Optional test files or node ids relative to the app root, "
+                            "e.g. 'tests/test_main.py::test_create'. Default: all tests."
+                        ),
+                    },
+                    "keyword": {"type": "string", "description": "Optional pytest -k expression to select tests."},
+                    "fail_fast": {"type": "boolean", "description": "Stop at the first failure (pytest -x)."},
+                    "affected_only": {
+                        "type": "boolean",
+                        "description": (
+                            "Run only the test files that import (directly or not) a file you have written. "
+                            "Ignored when paths are given."
+                        ),
+                    },
+                },
+            },
+        },
+    },
 ]
 
+
+def canonical_tools(tools: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Tool schemas sorted by name with sorted keys, so the request prefix is byte-stable."""
+    ordered = sorted(tools, key=lambda t: t["function"]["name"])
+    return json.loads(json.dumps(ordered, sort_keys=True))
+
+
+# Sent with every request: identical bytes across turns and trials maximise provider prompt caching
+REQUEST_TOOLS = canonical_tools(TOOLS)
+
+
+def prompt_cache_key(system_prompt: str, task_instruction: str) -> str:
+    """Routing hint so requests sharing a prefix (same prompt, tools and task) hit the same cache."""
+    prefix = json.dumps([system_prompt, task_instruction, REQUEST_TOOLS], sort_keys=True)
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:32]
+
+
 TOOL_FUNCTIONS = {
     "run_command": run_command,
     "read_file": read_file,
     "write_file": write_file,
+    "edit_file": edit_file,
+    "search_code": search_code,
+    "run_tests": run_tests,
 }
 
 
@@ -105,11 +259,143 @@ def _run_tool(name: str, arguments: dict, tool_functions: dict[str, callable]) -
         return f"Tool error: {e}"
 
 
+async def _arun_tool(name: str, arguments: dict, tool_functions: dict[str, callable]) -> str:
+    """Async variant of _run_tool for coroutine tool functions."""
+    fn = tool_functions.get(name)
+    if not fn:
+        return f"Unknown tool: {name}"
+    try:
+        return str(await fn(**arguments))
+    except TypeError as e:
+        return f"Tool argument error: {e}"
+    except Exception as e:
+        return f"Tool error: {e}"
+
+
 def run_tool(name: str, arguments: dict) -> str:
     """Execute a tool by name with the given arguments; return result string. Uses default TOOL_FUNCTIONS."""
     return _run_tool(name, arguments, TOOL_FUNCTIONS)
 
 
+def _parse_arguments(raw: str | None) -> dict:
+    """Parse tool call arguments JSON; malformed arguments become {}."""
+    try:
+        return json.loads(raw) if raw else {}
+    except json.JSONDecodeError:
+        return {}
+
+
+def _assistant_message(msg) -> dict[str, Any]:
+    """Convert an assistant message from the API into a transcript entry."""
+    message: dict[str, Any] = {"role": "assistant", "content": msg.content or ""}
+    if msg.tool_calls:
+        message["tool_calls"] = [
+            {
+                "id": tc.id,
+                "type": "function",
+                "function": {"name": tc.function.name, "arguments": tc.function.arguments},
+            }
+            for tc in msg.tool_calls
+        ]
+    return message
+
+
+def _record_usage(
+    response,
+    usage: dict[str, int],
+    llm_calls: list[dict[str, Any]],
+    latency_sec: float,
+    ttft_sec: float | None = None,
+    time_to_first_tool_sec: float | None = None,
+) -> None:
+    """Add a response's token counts to the cumulative usage and append a per-call record.
+
+    cached_tokens is the part of the prompt served from the provider's prompt cache.
+    ttft_sec (first chunk) and time_to_first_tool_sec (first tool call dispatched) are measured
+    from the request; without streaming both are the full latency.
+    """
+    call = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+    if response.usage:
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            call[key] = getattr(response.usage, key, 0) or 0
+        details = getattr(response.usage, "prompt_tokens_details", None)
+        call["cached_tokens"] = getattr(details, "cached_tokens", 0) or 0
+        for key in call:
+            usage[key] = usage.get(key, 0) + call[key]
+    call["latency_sec"] = latency_sec
+    call["ttft_sec"] = latency_sec if ttft_sec is None else ttft_sec
+    has_tools = bool(response.choices and response.choices[0].message.tool_calls)
+    call["time_to_first_tool_sec"] = (
+        (latency_sec if time_to_first_tool_sec is None else time_to_first_tool_sec) if has_tools else None
+    )
+    llm_calls.append(call)
+
+
+def _ordered_results(dispatched: list[int], results: list[str]) -> list[str]:
+    """Tool results in tool call index order, from results in dispatch order."""
+    by_index = dict(zip(dispatched, results))
+    return [by_index[i] for i in sorted(by_index)]
+
+
+def _stream_completion(completions, request: dict[str, Any], run_one, call_start: float):
+    """Stream one completion, running each tool call as soon as its arguments are complete.
+
+    Returns (response, tool results in call order, latency_sec, ttft_sec, time_to_first_tool_sec);
+    latency_sec ends with the stream, not with the tool calls it started.
+    """
+    assembler = StreamAssembler()
+    scheduler = ToolCallScheduler(run_one)
+    dispatched: list[int] = []
+    ttft = first_tool = latency = None
+
+    def dispatch(released: list[tuple[int, str, str]]) -> None:
+        nonlocal first_tool
+        for index, name, arguments in released:
+            if first_tool is None:
+                first_tool = time.perf_counter() - call_start
+            scheduler.submit(name, _parse_arguments(arguments))
+            dispatched.append(index)
+
+    try:
+        for chunk in completions.create(**request, stream=True, stream_options={"include_usage": True}):
+            if ttft is None and chunk.choices:
+                ttft = time.perf_counter() - call_start
+            dispatch(assembler.feed(chunk))
+        dispatch(assembler.finish())
+        latency = time.perf_counter() - call_start
+    finally:
+        # Also on error: no tool call may still be running once the turn is over
+        results = scheduler.results()
+    return assembler.response(), _ordered_results(dispatched, results), latency, ttft, first_tool
+
+
+async def _astream_completion(completions, request: dict[str, Any], run_one, call_start: float):
+    """Async variant of _stream_completion."""
+    assembler = StreamAssembler()
+    scheduler = AsyncToolCallScheduler(run_one)
+    dispatched: list[int] = []
+    ttft = first_tool = latency = None
+
+    def dispatch(released: list[tuple[int, str, str]]) -> None:
+        nonlocal first_tool
+        for index, name, arguments in released:
+            if first_tool is None:
+                first_tool = time.perf_counter() - call_start
+            scheduler.submit(name, _parse_arguments(arguments))
+            dispatched.append(index)
+
+    try:
+        async for chunk in await completions.create(**request, stream=True, stream_options={"include_usage": True}):
+            if ttft is None and chunk.choices:
+                ttft = time.perf_counter() - call_start
+            dispatch(assembler.feed(chunk))
+        dispatch(assembler.finish())
+        latency = time.perf_counter() - call_start
+    finally:
+        results = await scheduler.results()
+    return assembler.response(), _ordered_results(dispatched, results), latency, ttft, first_tool
+
+
 def run_agent_task(
     task_instruction: str,
     *,
@@ -118,13 +404,40 @@ def run_agent_task(
     model: str = "gpt-4o-mini",
     max_turns: int = 50,
     timeout_sec: float | None = None,
+    backend=None,
+    token_budget: int | None = DEFAULT_TOKEN_BUDGET,
+    persistent_shell: bool = False,
+    pytest_service: PytestService | None = None,
+    test_impact: TestImpactMap | None = None,
+    output_budget: int = DEFAULT_OUTPUT_BUDGET_BYTES,
+    command_log_dir: Path | None = None,
+    stream: bool = False,
 ) -> RunResult:
     """Run the agent on a single task and return transcript + metadata.
 
     Uses tools bound to app_root so the evaluator can run trials against isolated app copies.
+    backend is anything with a create(model=, messages=, tools=) method like client.chat.completions
+    (e.g. llm_cache.CachedCompletions); defaults to a new OpenAI client.
+    Prompts over token_budget (estimated) are compacted before each call; None disables compaction.
+    With persistent_shell, run_command reuses one shell (and the workspace .venv) for the whole task.
+    pytest_service, if given, serves run_tests warm; the caller owns (and closes) it.
+    test_impact is the baseline's TestImpactMap for run_tests(affected_only=True); built on demand if None.
+    run_command keeps the head and tail of each output stream, output_budget bytes in all; with
+    command_log_dir, streams that overflow it are also written there in full.
+    With stream, the completion is streamed and each tool call starts as soon as its arguments
+    are complete, overlapping tool execution with the rest of the turn's generation.
     """
-    client = OpenAI(api_key=api_key)
-    tool_functions = get_tool_functions(app_root)
+    completions = backend or OpenAI(api_key=_require_api_key()).chat.completions
+    shell = ShellSession(app_root) if persistent_shell else None
+    # The code index is built (or cloned from the baseline's) on the first search_code call, so
+    # trials that never search don't hash the workspace
+    state = ToolState(
+        test_impact=test_impact,
+        output_budget=output_budget,
+        command_log_dir=command_log_dir,
+    )
+    tool_functions = get_tool_functions(app_root, shell=shell, tests=pytest_service, state=state)
+    run_one = lambda name, args: _run_tool(name, args, tool_functions)  # noqa: E731
 
     messages: list[dict[str, Any]] = [
         {"role": "system", "content": system_prompt},
@@ -133,59 +446,162 @@ def run_agent_task(
 
     n_turns = 0
     n_tool_calls = 0
-    usage: dict[str, int] = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    usage: dict[str, int] = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+    llm_calls: list[dict[str, Any]] = []
+    compactor = Compactor(token_budget)
+    cache_key = prompt_cache_key(system_prompt, task_instruction)
     start = time.perf_counter()
     finished = False
 
-    while n_turns < max_turns:
-        if timeout_sec is not None and (time.perf_counter() - start) > timeout_sec:
+    try:
+        while n_turns < max_turns:
+            if timeout_sec is not None and (time.perf_counter() - start) > timeout_sec:
+                break
+
+            call_start = time.perf_counter()
+            request = dict(
+                model=model, messages=compactor.compact(messages), tools=REQUEST_TOOLS, prompt_cache_key=cache_key
+            )
+            results = ttft = first_tool = None
+            if stream:
+                response, results, latency, ttft, first_tool = _stream_completion(
+                    completions, request, run_one, call_start
+                )
+            else:
+                response = completions.create(**request)
+                latency = time.perf_counter() - call_start
+            _record_usage(response, usage, llm_calls, latency, ttft, first_tool)
+            msg = response.choices[0].message
+
+            if msg.tool_calls:
+                n_turns += 1
+                messages.append(_assistant_message(msg))
+                n_tool_calls += len(msg.tool_calls)
+                if results is None:
+                    calls = [(tc.function.name, _parse_arguments(tc.function.arguments)) for tc in msg.tool_calls]
+                    results = execute_tool_calls(calls, run_one)
+                for tc, result in zip(msg.tool_calls, results):
+                    messages.append({"role": "tool", "tool_call_id": tc.id, "content": result})
+                continue
+
+            if msg.content:
+                n_turns += 1
+
+            messages.append(_assistant_message(msg))
+            finished = True
             break
+    finally:
+        if shell is not None:
+            shell.close()
+
+    latency_sec = time.perf_counter() - start
+    return RunResult(
+        messages=messages,
+        n_turns=n_turns,
+        n_tool_calls=n_tool_calls,
+        usage=usage,
+        latency_sec=latency_sec,
+        finished=finished,
+        llm_calls=llm_calls,
+        compaction_tokens_saved=compactor.tokens_saved,
+        files_changed=sorted(state.touched_files),
+        bytes_emitted=state.bytes_emitted,
+        bytes_written=state.bytes_written,
+    )
 
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            tools=TOOLS,
-        )
-        msg = response.choices[0].message
-
-        if response.usage:
-            usage["prompt_tokens"] = getattr(response.usage, "prompt_tokens", 0) or 0
-            usage["completion_tokens"] = getattr(response.usage, "completion_tokens", 0) or 0
-            usage["total_tokens"] = getattr(response.usage, "total_tokens", 0) or 0
-
-        if msg.tool_calls:
-            n_turns += 1
-            messages.append(
-                {
-                    "role": "assistant",
-                    "content": msg.content or "",
-                    "tool_calls": [
-                        {
-                            "id": tc.id,
-                            "type": "function",
-                            "function": {"name": tc.function.name, "arguments": tc.function.arguments},
-                        }
-                        for tc in msg.tool_calls
-                    ],
-                }
+
+async def arun_agent_task(
+    task_instruction: str,
+    *,
+    app_root: Path,
+    system_prompt: str = SYSTEM_PROMPT,
+    model: str = "gpt-4o-mini",
+    max_turns: int = 50,
+    timeout_sec: float | None = None,
+    backend=None,
+    token_budget: int | None = DEFAULT_TOKEN_BUDGET,
+    persistent_shell: bool = False,
+    pytest_service: PytestService | None = None,
+    test_impact: TestImpactMap | None = None,
+    output_budget: int = DEFAULT_OUTPUT_BUDGET_BYTES,
+    command_log_dir: Path | None = None,
+    stream: bool = False,
+) -> RunResult:
+    """Async variant of run_agent_task.
+
+    Uses the async OpenAI client and asyncio subprocesses, so many tasks can run
+    concurrently on one event loop without a thread per task. backend must have an
+    async create(); defaults to a new AsyncOpenAI client.
+    """
+    client = None
+    if backend is None:
+        client = AsyncOpenAI(api_key=_require_api_key())
+        backend = client.chat.completions
+    shell = ShellSession(app_root) if persistent_shell else None
+    state = ToolState(
+        test_impact=test_impact,
+        output_budget=output_budget,
+        command_log_dir=command_log_dir,
+    )
+    tool_functions = get_async_tool_functions(app_root, shell=shell, tests=pytest_service, state=state)
+    run_one = lambda name, args: _arun_tool(name, args, tool_functions)  # noqa: E731
+
+    messages: list[dict[str, Any]] = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": task_instruction},
+    ]
+
+    n_turns = 0
+    n_tool_calls = 0
+    usage: dict[str, int] = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "cached_tokens": 0}
+    llm_calls: list[dict[str, Any]] = []
+    compactor = Compactor(token_budget)
+    cache_key = prompt_cache_key(system_prompt, task_instruction)
+    start = time.perf_counter()
+    finished = False
+
+    try:
+        while n_turns < max_turns:
+            if timeout_sec is not None and (time.perf_counter() - start) > timeout_sec:
+                break
+
+            call_start = time.perf_counter()
+            request = dict(
+                model=model, messages=compactor.compact(messages), tools=REQUEST_TOOLS, prompt_cache_key=cache_key
             )
-            for tc in msg.tool_calls:
-                n_tool_calls += 1
-                name = tc.function.name
-                try:
-                    args = json.loads(tc.function.arguments) if tc.function.arguments else {}
-                except json.JSONDecodeError:
-                    args = {}
-                result = _run_tool(name, args, tool_functions)
-                messages.append({"role": "tool", "tool_call_id": tc.id, "content": result})
-            continue
+            results = ttft = first_tool = None
+            if stream:
+                response, results, latency, ttft, first_tool = await _astream_completion(
+                    backend, request, run_one, call_start
+                )
+            else:
+                response = await backend.create(**request)
+                latency = time.perf_counter() - call_start
+            _record_usage(response, usage, llm_calls, latency, ttft, first_tool)
+            msg = response.choices[0].message
+
+            if msg.tool_calls:
+                n_turns += 1
+                messages.append(_assistant_message(msg))
+                n_tool_calls += len(msg.tool_calls)
+                if results is None:
+                    calls = [(tc.function.name, _parse_arguments(tc.function.arguments)) for tc in msg.tool_calls]
+                    results = await aexecute_tool_calls(calls, run_one)
+                for tc, result in zip(msg.tool_calls, results):
+                    messages.append({"role": "tool", "tool_call_id": tc.id, "content": result})
+                continue
 
-        if msg.content:
-            n_turns += 1
+            if msg.content:
+                n_turns += 1
 
-        messages.append({"role": "assistant", "content": msg.content or ""})
-        finished = True
-        break
+            messages.append(_assistant_message(msg))
+            finished = True
+            break
+    finally:
+        if client is not None:
+            await client.close()
+        if shell is not None:
+            shell.close()
 
     latency_sec = time.perf_counter() - start
     return RunResult(
@@ -195,13 +611,19 @@ def run_agent_task(
         usage=usage,
         latency_sec=latency_sec,
         finished=finished,
+        llm_calls=llm_calls,
+        compaction_tokens_saved=compactor.tokens_saved,
+        files_changed=sorted(state.touched_files),
+        bytes_emitted=state.bytes_emitted,
+        bytes_written=state.bytes_written,
     )
 
 
 def main() -> None:
-    client = OpenAI(api_key=api_key)
+    client = OpenAI(api_key=_require_api_key())
     print("Agent ready. Type your message (or 'exit' to quit).")
     messages = []
+    compactor = Compactor()
     while True:
         user_input = input("You: ").strip()
         if user_input.lower() in ("exit", "quit"):
@@ -218,32 +640,14 @@ def main() -> None:
         while True:
             response = client.chat.completions.create(
                 model="gpt-4o-mini",
-                messages=messages,
-                tools=TOOLS,
+                messages=compactor.compact(messages),
+                tools=REQUEST_TOOLS,
             )
             msg = response.choices[0].message
             if msg.tool_calls:
-                messages.append(
-                    {
-                        "role": "assistant",
-                        "content": msg.content or "",
-                        "tool_calls": [
-                            {
-                                "id": tc.id,
-                                "type": "function",
-                                "function": {"name": tc.function.name, "arguments": tc.function.arguments},
-                            }
-                            for tc in msg.tool_calls
-                        ],
-                    }
-                )
-                for tc in msg.tool_calls:
-                    name = tc.function.name
-                    try:
-                        args = json.loads(tc.function.arguments) if tc.function.arguments else {}
-                    except json.JSONDecodeError:
-                        args = {}
-                    result = run_tool(name, args)
+                messages.append(_assistant_message(msg))
+                calls = [(tc.function.name, _parse_arguments(tc.function.arguments)) for tc in msg.tool_calls]
+                for tc, result in zip(msg.tool_calls, execute_tool_calls(calls, run_tool)):
                     messages.append(
                         {"role": "tool", "tool_call_id": tc.id, "content": result}
                     )
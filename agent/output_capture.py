@@ -0,0 +1,188 @@
+"""Bounded capture of command output: keep the head and tail, count what's elided in between.
+
+A command's stdout and stderr are streamed through a BoundedOutput each, so a runaway
+command costs at most the byte budget in memory and in the tool message. If a spill path
+is given, the full stream is written there once it overflows the budget, and the elided
+marker says where to find it.
+"""
+
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+# Bytes of each stream (stdout, stderr) kept for the tool result: half head, half tail
+DEFAULT_OUTPUT_BUDGET_BYTES = 32_000
+DEFAULT_COMMAND_TIMEOUT_SEC = 300
+MAX_COMMAND_TIMEOUT_SEC = 1_800
+
+_CHUNK_BYTES = 65536
+
+
+class BoundedOutput:
+    """Accumulates a byte stream, keeping at most budget bytes (the first and last budget/2)."""
+
+    def __init__(self, budget: int = DEFAULT_OUTPUT_BUDGET_BYTES, spill_path: Path | None = None):
+        self.budget = max(2, budget)
+        self.spill_path = spill_path
+        self.total = 0
+        self._head_budget = self.budget // 2
+        self._tail_budget = self.budget - self._head_budget
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._spill = None
+        self._lock = threading.Lock()
+
+    @property
+    def elided(self) -> int:
+        return self.total - len(self._head) - len(self._tail)
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        with self._lock:
+            self.total += len(chunk)
+            if self._spill is not None:
+                self._spill.write(chunk)
+            room = self._head_budget - len(self._head)
+            if room > 0:
+                self._head += chunk[:room]
+                chunk = chunk[room:]
+            self._tail += chunk
+            if len(self._tail) > self._tail_budget:
+                if self._spill is None and self.spill_path is not None:
+                    # Head and tail still hold everything so far: start the spill file with them
+                    self._open_spill()
+                del self._tail[: len(self._tail) - self._tail_budget]
+
+    def _open_spill(self) -> None:
+        try:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            self._spill = open(self.spill_path, "wb")
+            self._spill.write(self._head)
+            self._spill.write(self._tail)
+        except OSError:
+            self._spill = None
+            self.spill_path = None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+
+    def text(self) -> str:
+        """The kept output, with a marker where bytes were elided."""
+        with self._lock:
+            head = self._head.decode("utf-8", errors="replace")
+            if not self.elided:
+                return head + self._tail.decode("utf-8", errors="replace")
+            where = f"; full output in {self.spill_path}" if self._spill is not None else ""
+            marker = f"\n... [{self.elided} bytes elided{where}] ...\n"
+            return head + marker + self._tail.decode("utf-8", errors="replace")
+
+
+def clamp_timeout(timeout: float | None) -> float:
+    """A per-call timeout in seconds: the default if unset, within (0, MAX_COMMAND_TIMEOUT_SEC]."""
+    if timeout is None or timeout <= 0:
+        return DEFAULT_COMMAND_TIMEOUT_SEC
+    return min(float(timeout), MAX_COMMAND_TIMEOUT_SEC)
+
+
+def _pump(stream, sink: BoundedOutput) -> None:
+    fd = stream.fileno()
+    while True:
+        try:
+            chunk = os.read(fd, _CHUNK_BYTES)
+        except OSError:
+            return
+        if not chunk:
+            return
+        sink.feed(chunk)
+
+
+def _kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def run_bounded(
+    cmd: str, cwd: Path, timeout: float, stdout: BoundedOutput, stderr: BoundedOutput
+) -> int | None:
+    """Run a shell command, streaming its output into stdout/stderr. Returns the exit code, None on timeout.
+
+    On timeout the command's whole process group is killed; the sinks keep what was read so far.
+    """
+    proc = subprocess.Popen(
+        cmd,
+        shell=True,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    readers = [
+        threading.Thread(target=_pump, args=(proc.stdout, stdout), daemon=True),
+        threading.Thread(target=_pump, args=(proc.stderr, stderr), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+    # Done when both pipes are closed and the shell has exited; a background child that keeps
+    # a pipe open holds the command until the deadline, as with capture_output
+    deadline = time.monotonic() + timeout
+    returncode = None
+    for reader in readers:
+        reader.join(max(0.0, deadline - time.monotonic()))
+    if not any(reader.is_alive() for reader in readers):
+        try:
+            returncode = proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            pass
+    if returncode is None:
+        _kill_group(proc.pid)
+        proc.wait()
+        for reader in readers:
+            reader.join(1.0)
+    proc.stdout.close()
+    proc.stderr.close()
+    return returncode
+
+
+async def _apump(stream: asyncio.StreamReader, sink: BoundedOutput) -> None:
+    while True:
+        chunk = await stream.read(_CHUNK_BYTES)
+        if not chunk:
+            return
+        sink.feed(chunk)
+
+
+async def arun_bounded(
+    cmd: str, cwd: Path, timeout: float, stdout: BoundedOutput, stderr: BoundedOutput
+) -> int | None:
+    """Async variant of run_bounded, on an asyncio subprocess."""
+    proc = await asyncio.create_subprocess_shell(
+        cmd,
+        cwd=cwd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    pumps = asyncio.gather(_apump(proc.stdout, stdout), _apump(proc.stderr, stderr))
+    try:
+        deadline = time.monotonic() + timeout
+        await asyncio.wait_for(asyncio.shield(pumps), timeout=timeout)
+        return await asyncio.wait_for(proc.wait(), timeout=max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        _kill_group(proc.pid)
+        await proc.wait()
+        try:
+            await asyncio.wait_for(pumps, timeout=1.0)
+        except asyncio.TimeoutError:
+            pass
+        return None
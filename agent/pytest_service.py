@@ -0,0 +1,196 @@
+"""Warm pytest runs for an app workspace, with structured per-test results.
+
+PytestService keeps a zygote worker (pytest_worker.py) running under the workspace's
+interpreter. Third-party imports are paid once; every run forks a child that imports the
+app modules fresh, so edits are always picked up and nothing needs reloading by hand.
+"""
+
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from shell import StreamReader
+
+WORKER_SCRIPT = Path(__file__).resolve().parent / "pytest_worker.py"
+
+DEFAULT_TEST_TIMEOUT_SEC = 120
+# Time allowed for the zygote to start and pre-import its dependencies
+WORKER_START_TIMEOUT_SEC = 60
+# Failures listed in full in the tool result shown to the model
+MAX_REPORTED_FAILURES = 10
+
+
+@dataclass
+class PytestRun:
+    """Result of one pytest run. exit_code is None if the run timed out, the worker died or pytest couldn't start."""
+
+    exit_code: int | None
+    # One entry per test: nodeid, outcome (passed/failed/error/skipped), duration, longrepr on failure
+    tests: list[dict[str, Any]] = field(default_factory=list)
+    duration_sec: float = 0.0
+    output: str = ""
+    timed_out: bool = False
+
+    def counts(self) -> dict[str, int]:
+        counts: dict[str, int] = {}
+        for t in self.tests:
+            counts[t["outcome"]] = counts.get(t["outcome"], 0) + 1
+        return counts
+
+
+def format_run(run: PytestRun) -> str:
+    """Compact text for the model: a summary line and the failing tests, not the full pytest output."""
+    if run.timed_out:
+        return f"Error: tests timed out after {run.duration_sec:.0f}s"
+    counts = ", ".join(f"{n} {outcome}" for outcome, n in sorted(run.counts().items())) or "no tests ran"
+    lines = [f"exit_code={run.exit_code} ({counts}) in {run.duration_sec:.2f}s"]
+    failures = [t for t in run.tests if t["outcome"] in ("failed", "error")]
+    for t in failures[:MAX_REPORTED_FAILURES]:
+        lines.append(f"\n{t['outcome'].upper()} {t['nodeid']}\n{t.get('longrepr', '')}")
+    if len(failures) > MAX_REPORTED_FAILURES:
+        lines.append(f"\n... {len(failures) - MAX_REPORTED_FAILURES} more failures")
+    if not run.tests and run.exit_code != 0:
+        # Usage or internal errors (bad arguments, import errors in conftest, no interpreter) only
+        # show up in the output
+        lines.append(run.output[-MAX_REPORTED_FAILURES * 200 :])
+    return "\n".join(lines)
+
+
+def _python_command(app_root: Path) -> list[str]:
+    """The workspace's interpreter: its .venv if present, otherwise whatever `poetry run` resolves."""
+    venv_python = app_root / ".venv" / "bin" / "python"
+    if venv_python.exists():
+        return [str(venv_python)]
+    return ["poetry", "run", "python"]
+
+
+class PytestService:
+    """Runs the app's tests on request, warm when possible.
+
+    With warm=True a zygote worker is started in the background right away, so its imports
+    overlap whatever the caller does first; if it cannot start (or fork is unavailable) every
+    run falls back to a cold one-shot worker process. Runs are serialised per service, as
+    they share the workspace's database file.
+    """
+
+    def __init__(self, app_root: Path, *, warm: bool = True):
+        self.app_root = app_root
+        self.warm = warm and hasattr(os, "fork")
+        self.n_runs = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._proc: subprocess.Popen | None = None
+        self._stdout: StreamReader | None = None
+        if self.warm:
+            threading.Thread(target=self._prestart, daemon=True).start()
+
+    def _prestart(self) -> None:
+        with self._lock:
+            if self.warm and self._proc is None and not self._closed:
+                self._start()
+
+    def _start(self) -> bool:
+        self._proc = subprocess.Popen(
+            [*_python_command(self.app_root), str(WORKER_SCRIPT)],
+            cwd=self.app_root,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._stdout = StreamReader(self._proc.stdout)
+        line = self._stdout.read_line(time.monotonic() + WORKER_START_TIMEOUT_SEC)
+        try:
+            ready = json.loads(line).get("ready", False)
+        except json.JSONDecodeError:
+            ready = False
+        if not ready:
+            self._stop()
+            self.warm = False
+        return ready
+
+    def _stop(self) -> None:
+        if self._proc is None:
+            return
+        self._proc.kill()
+        self._proc.wait()
+        self._proc = None
+
+    def _run_warm(self, args: list[str], timeout: float) -> PytestRun | None:
+        if (self._proc is None or self._proc.poll() is not None) and not self._start():
+            return None
+        request = json.dumps({"args": args, "timeout": timeout}) + "\n"
+        try:
+            self._proc.stdin.write(request.encode("utf-8"))
+            self._proc.stdin.flush()
+        except OSError:
+            self._stop()
+            return None
+        # The zygote enforces the timeout itself; the margin covers a hung zygote
+        start = time.perf_counter()
+        line = self._stdout.read_line(time.monotonic() + timeout + 10)
+        try:
+            return PytestRun(**json.loads(line))
+        except (json.JSONDecodeError, TypeError):
+            self._stop()
+            if time.perf_counter() - start >= timeout:
+                return PytestRun(exit_code=None, duration_sec=time.perf_counter() - start, timed_out=True)
+            return None
+
+    def _run_cold(self, args: list[str], timeout: float) -> PytestRun:
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="pytest_run_") as tmp:
+            result_path = Path(tmp) / "result.json"
+            try:
+                proc = subprocess.run(
+                    [*_python_command(self.app_root), str(WORKER_SCRIPT), "--once", "--result", str(result_path)]
+                    + ["--", *args],
+                    cwd=self.app_root,
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout,
+                )
+            except subprocess.TimeoutExpired:
+                return PytestRun(exit_code=None, duration_sec=time.perf_counter() - start, timed_out=True)
+            except OSError as e:
+                # No interpreter or poetry to run with: an errored run, not an exception for the caller
+                return PytestRun(
+                    exit_code=None, duration_sec=time.perf_counter() - start, output=f"Could not start pytest: {e}"
+                )
+            output = (proc.stdout or "") + (proc.stderr or "")
+            if not result_path.exists():
+                return PytestRun(exit_code=proc.returncode, duration_sec=time.perf_counter() - start, output=output)
+            return PytestRun(**json.loads(result_path.read_text()), output=output)
+
+    def run(self, args: list[str] | None = None, timeout: float = DEFAULT_TEST_TIMEOUT_SEC) -> PytestRun:
+        """Run pytest with args (e.g. test paths, -k, -x) from the app root."""
+        args = list(args or [])
+        with self._lock:
+            self.n_runs += 1
+            if self.warm:
+                run = self._run_warm(args, timeout)
+                if run is not None:
+                    return run
+            return self._run_cold(args, timeout)
+
+    def close(self) -> None:
+        """Stop the zygote worker, if running."""
+        with self._lock:
+            self._closed = True
+            if self._proc is not None:
+                try:
+                    self._proc.stdin.close()
+                except OSError:
+                    pass
+                self._stop()
+
+    def __enter__(self) -> "PytestService":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,199 @@
+"""Pytest worker, run with the app's interpreter (stdlib + pytest only; never imports agent code).
+
+Zygote mode (default): pre-import the app's heavy third-party dependencies once, then serve
+requests from stdin, one JSON object per line: {"args": [...], "timeout": seconds}. Each
+request runs pytest in a forked child, so app modules are imported fresh from the current
+files every run while FastAPI, SQLAlchemy, pydantic and pytest itself stay warm. Replies
+are JSON lines on stdout: exit_code, tests, duration_sec, output, timed_out.
+
+One-shot mode (--once --result PATH -- ARGS...): run pytest once in-process and write the
+same result JSON to PATH. Used where fork is unavailable or the zygote failed to start.
+"""
+
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+import traceback
+
+# Imported by the zygote before the first request; missing ones are skipped
+PRELOAD_MODULES = (
+    "pytest",
+    "_pytest.python",
+    "_pytest.assertion.rewrite",
+    "pydantic",
+    "sqlalchemy",
+    "sqlalchemy.orm",
+    "sqlalchemy.dialects.sqlite",
+    "fastapi",
+    "fastapi.testclient",
+    "starlette.testclient",
+    "httpx",
+)
+
+# Plugins loaded by the zygote can't have their asserts rewritten in the child; that's expected
+ZYGOTE_PYTEST_ARGS = ["-W", "ignore::pytest.PytestAssertRewriteWarning"]
+
+# Failure text kept per test
+MAX_LONGREPR_CHARS = 2_000
+
+
+class _ResultCollector:
+    """Pytest plugin that folds setup/call/teardown reports into one result per test."""
+
+    def __init__(self):
+        self.tests: dict[str, dict] = {}
+
+    def pytest_runtest_logreport(self, report):
+        entry = self.tests.setdefault(report.nodeid, {"nodeid": report.nodeid, "outcome": "passed", "duration": 0.0})
+        entry["duration"] += report.duration
+        if report.failed:
+            # A failure outside the test body is an error, as in pytest's own summary
+            entry["outcome"] = "failed" if report.when == "call" else "error"
+            entry["longrepr"] = report.longreprtext[-MAX_LONGREPR_CHARS:]
+        elif report.skipped and entry["outcome"] == "passed":
+            entry["outcome"] = "skipped"
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self.tests[report.nodeid] = {
+                "nodeid": report.nodeid,
+                "outcome": "error",
+                "duration": 0.0,
+                "longrepr": report.longreprtext[-MAX_LONGREPR_CHARS:],
+            }
+
+
+def run_pytest(args: list[str]) -> dict:
+    """Run pytest in this process and return exit code, per-test results and wall time."""
+    import pytest
+
+    collector = _ResultCollector()
+    start = time.perf_counter()
+    # No cache dir writes: runs must not leave files behind in the workspace
+    exit_code = pytest.main([*args, "-p", "no:cacheprovider"], plugins=[collector])
+    return {
+        "exit_code": int(exit_code),
+        "tests": list(collector.tests.values()),
+        "duration_sec": time.perf_counter() - start,
+    }
+
+
+def _child(args: list[str], output_path: str, result_path: str) -> None:
+    """Body of a forked child: output to output_path, result JSON to result_path. Never returns."""
+    code = 1
+    try:
+        os.setpgid(0, 0)
+        fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        os.close(fd)
+        null = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(null, 0)
+        os.close(null)
+        result = run_pytest([*ZYGOTE_PYTEST_ARGS, *args])
+        with open(result_path, "w") as f:
+            json.dump(result, f)
+        code = 0
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+def _serve_one(args: list[str], timeout: float) -> dict:
+    with tempfile.TemporaryDirectory(prefix="pytest_worker_") as tmp:
+        output_path = os.path.join(tmp, "output")
+        result_path = os.path.join(tmp, "result.json")
+        start = time.perf_counter()
+        sys.stdout.flush()
+        pid = os.fork()
+        if pid == 0:
+            _child(args, output_path, result_path)
+
+        deadline = time.monotonic() + timeout
+        timed_out = False
+        while os.waitpid(pid, os.WNOHANG) == (0, 0):
+            if time.monotonic() > deadline:
+                timed_out = True
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                os.waitpid(pid, 0)
+                break
+            time.sleep(0.005)
+
+        result = {"exit_code": None, "tests": [], "duration_sec": time.perf_counter() - start}
+        if not timed_out and os.path.exists(result_path):
+            with open(result_path) as f:
+                result = json.load(f)
+        try:
+            with open(output_path, encoding="utf-8", errors="replace") as f:
+                result["output"] = f.read()
+        except FileNotFoundError:
+            result["output"] = ""
+        result["timed_out"] = timed_out
+        return result
+
+
+def _preload() -> list[str]:
+    """Import PRELOAD_MODULES and installed pytest plugins (entry point group pytest11)."""
+    preloaded = []
+    for name in PRELOAD_MODULES:
+        try:
+            __import__(name)
+            preloaded.append(name)
+        except ImportError:
+            pass
+    try:
+        from importlib.metadata import entry_points
+
+        for ep in entry_points(group="pytest11"):
+            try:
+                ep.load()
+                preloaded.append(ep.value)
+            except Exception:
+                pass
+    except Exception:
+        pass
+    return preloaded
+
+
+def serve() -> None:
+    preloaded = _preload()
+    protocol = sys.stdout
+    protocol.write(json.dumps({"ready": True, "preloaded": preloaded}) + "\n")
+    protocol.flush()
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        reply = _serve_one(request.get("args", []), float(request.get("timeout", 120)))
+        protocol.write(json.dumps(reply) + "\n")
+        protocol.flush()
+
+
+def main() -> None:
+    # The worker lives in agent/, which must not shadow app modules such as main.py
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path[:] = [p for p in sys.path if os.path.abspath(p or ".") != script_dir]
+    sys.path.insert(0, os.getcwd())
+
+    argv = sys.argv[1:]
+    if argv[:1] == ["--once"]:
+        result_path = argv[2]
+        args = argv[4:] if argv[3:4] == ["--"] else argv[3:]
+        with open(result_path, "w") as f:
+            json.dump(run_pytest(args), f)
+        return
+    serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Persistent shell session: one long-lived bash per workspace instead of a process per command."""
+
+import os
+import shlex
+import signal
+import subprocess
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from output_capture import BoundedOutput
+
+SENTINEL = "__AGENT_CMD_DONE__"
+
+# With the workspace virtualenv on PATH, `poetry run X` is just `X`: skip Poetry's startup
+_POETRY_SHIM = 'poetry() { if [ "$1" = run ]; then shift; "$@"; else command poetry "$@"; fi; }\n'
+
+
+class StreamReader:
+    """Drains a pipe in a background thread so the shell never blocks on a full buffer."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._buf = bytearray()
+        self._cond = threading.Condition()
+        self.closed = False
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def _pump(self) -> None:
+        fd = self._stream.fileno()
+        while True:
+            try:
+                chunk = os.read(fd, 65536)
+            except OSError:
+                chunk = b""
+            with self._cond:
+                if not chunk:
+                    self.closed = True
+                    self._cond.notify_all()
+                    return
+                self._buf.extend(chunk)
+                self._cond.notify_all()
+
+    def read_until(self, marker: bytes, deadline: float, sink: BoundedOutput | None = None) -> tuple[bytes, bool]:
+        """Consume and return output up to marker. Returns (data, found); on timeout, what was read so far.
+
+        With sink, output is fed to it as it arrives instead of returned (data is b""), so only
+        the sink's budget is held in memory however much the command prints.
+        """
+        with self._cond:
+            while True:
+                idx = self._buf.find(marker)
+                if idx >= 0:
+                    data = bytes(self._buf[:idx])
+                    del self._buf[: idx + len(marker)]
+                    return self._emit(data, sink), True
+                remaining = deadline - time.monotonic()
+                if self.closed or remaining <= 0:
+                    data = bytes(self._buf)
+                    self._buf.clear()
+                    return self._emit(data, sink), False
+                # Everything but a possible partial marker at the end can go to the sink now
+                cut = len(self._buf) - (len(marker) - 1)
+                if sink is not None and cut > 0:
+                    sink.feed(bytes(self._buf[:cut]))
+                    del self._buf[:cut]
+                self._cond.wait(remaining)
+
+    @staticmethod
+    def _emit(data: bytes, sink: BoundedOutput | None) -> bytes:
+        if sink is None:
+            return data
+        sink.feed(data)
+        return b""
+
+    def read_line(self, deadline: float) -> bytes:
+        data, _ = self.read_until(b"\n", deadline)
+        return data
+
+
+class ShellSession:
+    """A bash process kept alive for the duration of a trial.
+
+    Each command runs in a subshell (so cd/exports don't leak between commands, as with a
+    fresh process), with stdin from /dev/null; its end is marked by sentinel lines on stdout
+    and stderr carrying the exit code. If the workspace has a .venv it is activated once and
+    `poetry run` is short-circuited. On timeout the session is killed and restarted lazily.
+    """
+
+    def __init__(self, app_root: Path):
+        self.app_root = app_root
+        self._lock = threading.Lock()
+        self._proc: subprocess.Popen | None = None
+        self._stdout: StreamReader | None = None
+        self._stderr: StreamReader | None = None
+
+    def _start(self) -> None:
+        env = dict(os.environ)
+        venv = self.app_root / ".venv"
+        if (venv / "bin").is_dir():
+            env["VIRTUAL_ENV"] = str(venv)
+            env["PATH"] = f"{venv / 'bin'}{os.pathsep}{env.get('PATH', '')}"
+            env.pop("PYTHONHOME", None)
+        self._proc = subprocess.Popen(
+            ["bash", "--noprofile", "--norc"],
+            cwd=self.app_root,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True,
+        )
+        self._stdout = StreamReader(self._proc.stdout)
+        self._stderr = StreamReader(self._proc.stderr)
+        if "VIRTUAL_ENV" in env:
+            self._send(_POETRY_SHIM)
+
+    def _send(self, text: str) -> None:
+        self._proc.stdin.write(text.encode("utf-8"))
+        self._proc.stdin.flush()
+
+    def run(
+        self,
+        cmd: str,
+        cwd: Path,
+        timeout: float,
+        stdout: BoundedOutput | None = None,
+        stderr: BoundedOutput | None = None,
+    ) -> tuple[int | None, str, str]:
+        """Run cmd in cwd. Returns (exit_code, stdout, stderr); exit_code is None on timeout.
+
+        Output is streamed into the stdout/stderr sinks (default: ones with the default budget)
+        and returned as their head/tail text; on timeout, whatever was read so far.
+        """
+        stdout = stdout or BoundedOutput()
+        stderr = stderr or BoundedOutput()
+        with self._lock:
+            if self._proc is None or self._proc.poll() is not None:
+                self._start()
+            token = uuid.uuid4().hex
+            marker = f"\n{SENTINEL}{token} "
+            self._send(
+                f"( cd {shlex.quote(str(cwd))} && eval {shlex.quote(cmd)} ) < /dev/null\n"
+                f"__rc=$?\n"
+                f"printf '\\n{SENTINEL}{token} %s\\n' \"$__rc\"\n"
+                f"printf '\\n{SENTINEL}{token} \\n' >&2\n"
+            )
+            deadline = time.monotonic() + timeout
+            _, done_out = self._stdout.read_until(marker.encode(), deadline, stdout)
+            exit_code = None
+            if done_out:
+                rc = self._stdout.read_line(deadline).strip()
+                exit_code = int(rc) if rc.lstrip(b"-").isdigit() else None
+            _, done_err = self._stderr.read_until(marker.encode(), deadline, stderr)
+            if done_err:
+                self._stderr.read_line(deadline)
+            if not (done_out and done_err):
+                self._kill()
+                exit_code = None
+            return exit_code, stdout.text(), stderr.text()
+
+    def _kill(self) -> None:
+        if self._proc is None:
+            return
+        try:
+            os.killpg(self._proc.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self._proc.wait()
+        self._proc = None
+
+    def close(self) -> None:
+        """Terminate the shell and anything it started."""
+        with self._lock:
+            self._kill()
@@ -0,0 +1,164 @@
+"""Streamed chat completions: assemble chunks into a response, releasing tool calls as they complete.
+
+A tool call's arguments arrive as a sequence of string deltas. The call is complete when the
+next call starts, when its arguments already form a whole JSON object, or when the stream
+ends. StreamAssembler hands each call over at that point, so the agent can start running it
+while the model is still generating the rest of the turn.
+
+Backends without a real stream (scripted, cached) synthesise one from a full response with
+response_chunks.
+"""
+
+import json
+from typing import Any
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+# Characters of tool call arguments per synthesised chunk
+SYNTHETIC_ARGUMENT_CHUNK_CHARS = 256
+
+
+class _PendingCall:
+    def __init__(self, index: int):
+        self.index = index
+        self.id = ""
+        self.name = ""
+        self.arguments: list[str] = []
+        self.released = False
+
+    def arguments_text(self) -> str:
+        return "".join(self.arguments)
+
+    def looks_complete(self) -> bool:
+        """True if the arguments so far are a whole JSON object (only tried when they end in '}')."""
+        if not self.arguments or not self.arguments[-1].rstrip().endswith("}"):
+            return False
+        try:
+            return isinstance(json.loads(self.arguments_text()), dict)
+        except json.JSONDecodeError:
+            return False
+
+
+class StreamAssembler:
+    """Folds ChatCompletionChunks into one ChatCompletion, releasing each tool call once it is complete."""
+
+    def __init__(self):
+        self.id = ""
+        self.model = ""
+        self.created = 0
+        self.content: list[str] = []
+        self.finish_reason: str | None = None
+        self.usage: dict[str, Any] | None = None
+        self._calls: dict[int, _PendingCall] = {}
+
+    def feed(self, chunk: ChatCompletionChunk) -> list[tuple[int, str, str]]:
+        """Consume one chunk. Returns the tool calls it completed, as (index, name, arguments JSON)."""
+        self.id = self.id or chunk.id
+        self.model = self.model or chunk.model
+        self.created = self.created or chunk.created
+        if chunk.usage is not None:
+            self.usage = chunk.usage.model_dump(exclude_none=True)
+        released = []
+        for choice in chunk.choices:
+            if choice.index != 0:
+                continue
+            delta = choice.delta
+            if delta.content:
+                self.content.append(delta.content)
+            for tc in delta.tool_calls or []:
+                # A new call means every earlier one is done
+                for call in self._calls.values():
+                    if call.index < tc.index:
+                        released += self._release(call)
+                call = self._calls.setdefault(tc.index, _PendingCall(tc.index))
+                call.id = call.id or (tc.id or "")
+                if tc.function is not None:
+                    call.name = call.name or (tc.function.name or "")
+                    if tc.function.arguments:
+                        call.arguments.append(tc.function.arguments)
+                if call.looks_complete():
+                    released += self._release(call)
+            if choice.finish_reason:
+                self.finish_reason = choice.finish_reason
+        return released
+
+    def _release(self, call: _PendingCall) -> list[tuple[int, str, str]]:
+        if call.released:
+            return []
+        call.released = True
+        return [(call.index, call.name, call.arguments_text())]
+
+    def finish(self) -> list[tuple[int, str, str]]:
+        """Release the tool calls still pending at the end of the stream."""
+        released = []
+        for index in sorted(self._calls):
+            released += self._release(self._calls[index])
+        return released
+
+    def response(self) -> ChatCompletion:
+        """The whole streamed turn as a non-streaming response."""
+        message: dict[str, Any] = {"role": "assistant", "content": "".join(self.content) or None}
+        calls = [self._calls[i] for i in sorted(self._calls)]
+        if calls:
+            message["tool_calls"] = [
+                {"id": c.id, "type": "function", "function": {"name": c.name, "arguments": c.arguments_text()}}
+                for c in calls
+            ]
+        data: dict[str, Any] = {
+            "id": self.id or "stream",
+            "object": "chat.completion",
+            "created": self.created,
+            "model": self.model,
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": self.finish_reason or ("tool_calls" if calls else "stop"),
+                    "message": message,
+                }
+            ],
+        }
+        if self.usage is not None:
+            data["usage"] = self.usage
+        return ChatCompletion.model_validate(data)
+
+
+def _chunk(response: ChatCompletion, delta: dict[str, Any], finish_reason: str | None = None) -> ChatCompletionChunk:
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": response.id,
+            "object": "chat.completion.chunk",
+            "created": response.created,
+            "model": response.model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+    )
+
+
+def response_chunks(response: ChatCompletion) -> list[ChatCompletionChunk]:
+    """response as the chunks a stream would deliver: content, each tool call's arguments in pieces, usage."""
+    choice = response.choices[0]
+    msg = choice.message
+    chunks = [_chunk(response, {"role": "assistant", "content": msg.content or ""})]
+    for i, tc in enumerate(msg.tool_calls or []):
+        args = tc.function.arguments or ""
+        step = SYNTHETIC_ARGUMENT_CHUNK_CHARS
+        pieces = [args[j : j + step] for j in range(0, len(args), step)]
+        head = {"index": i, "id": tc.id, "type": "function", "function": {"name": tc.function.name, "arguments": ""}}
+        chunks.append(_chunk(response, {"tool_calls": [head]}))
+        for piece in pieces:
+            chunks.append(_chunk(response, {"tool_calls": [{"index": i, "function": {"arguments": piece}}]}))
+    chunks.append(_chunk(response, {}, choice.finish_reason))
+    if response.usage is not None:
+        chunks.append(
+            ChatCompletionChunk.model_validate(
+                {
+                    "id": response.id,
+                    "object": "chat.completion.chunk",
+                    "created": response.created,
+                    "model": response.model,
+                    "choices": [],
+                    "usage": response.usage.model_dump(exclude_none=True),
+                }
+            )
+        )
+    return chunks
@@ -0,0 +1,183 @@
+"""Test impact selection: which test files can be affected by a set of changed app files.
+
+The map is static: each .py file's imports are resolved (via ast) to files in the app, and a
+test file depends on the transitive closure of its own imports and those of the conftest.py
+files above it. It is built once per baseline (keyed by a hash of the app's sources) and
+cached on disk; files changed since are re-parsed at query time, so new imports count.
+"""
+
+import ast
+import hashlib
+import json
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+
+# Directories never scanned for sources
+IGNORED_DIRS = {".venv", "__pycache__", ".pytest_cache", ".git", "node_modules"}
+
+_memo: dict[str, "TestImpactMap"] = {}
+_memo_lock = threading.Lock()
+
+
+def _is_test_file(rel: str) -> bool:
+    name = rel.rsplit("/", 1)[-1]
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def _python_files(app_root: Path) -> list[str]:
+    """Paths (relative, posix) of all .py files under app_root, sorted."""
+    files = []
+    for path in app_root.rglob("*.py"):
+        rel = path.relative_to(app_root)
+        if not IGNORED_DIRS.intersection(rel.parts[:-1]):
+            files.append(rel.as_posix())
+    return sorted(files)
+
+
+def _conftests(test_file: str, files: Iterable[str]) -> list[str]:
+    """conftest.py files that apply to test_file: those in its directory or any parent."""
+    test_dir = test_file.rsplit("/", 1)[0] if "/" in test_file else ""
+    result = []
+    for rel in files:
+        if rel == "conftest.py" or rel.endswith("/conftest.py"):
+            conf_dir = rel.rsplit("/", 1)[0] if "/" in rel else ""
+            if not conf_dir or test_dir == conf_dir or test_dir.startswith(conf_dir + "/"):
+                result.append(rel)
+    return result
+
+
+def baseline_signature(app_root: Path) -> str:
+    """sha256 over the path and contents of every .py file under app_root."""
+    digest = hashlib.sha256()
+    for rel in _python_files(app_root):
+        digest.update(rel.encode("utf-8") + b"\0")
+        digest.update((app_root / rel).read_bytes() + b"\0")
+    return digest.hexdigest()
+
+
+def _resolve_module(dotted: str, search_dirs: list[str], known: set[str]) -> str | None:
+    """The app file a dotted module name refers to, searching each directory in order."""
+    path = dotted.replace(".", "/")
+    for base in search_dirs:
+        prefix = f"{base}/{path}" if base else path
+        for candidate in (f"{prefix}.py", f"{prefix}/__init__.py"):
+            if candidate in known:
+                return candidate
+    return None
+
+
+def parse_imports(app_root: Path, rel: str, known: set[str]) -> list[str]:
+    """App files imported directly by app_root/rel. Imports that don't resolve in the app are ignored.
+
+    Absolute imports are looked up from the app root (pytest's pythonpath) and from the
+    importing file's directory (pytest's rootdir-based sys.path insertion).
+    """
+    try:
+        tree = ast.parse((app_root / rel).read_text(encoding="utf-8", errors="replace"), filename=rel)
+    except (OSError, SyntaxError, ValueError):
+        return []
+    package = rel.rsplit("/", 1)[0] if "/" in rel else ""
+    search_dirs = ["", package] if package else [""]
+
+    imported: set[str] = set()
+    for node in ast.walk(tree):
+        names: list[str] = []
+        dirs = search_dirs
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                parts = package.split("/") if package else []
+                base_parts = parts[: len(parts) - (node.level - 1)] if node.level > 1 else parts
+                dirs = ["/".join(base_parts)]
+            module = node.module or ""
+            # `from pkg import name` may import the submodule pkg/name.py or a name from pkg
+            names = [f"{module}.{alias.name}" if module else alias.name for alias in node.names]
+            if module:
+                names.append(module)
+        for name in names:
+            target = _resolve_module(name, dirs, known)
+            if target is not None and target != rel:
+                imported.add(target)
+    return sorted(imported)
+
+
+class TestImpactMap:
+    """Static map from test files to the app files they (transitively) import."""
+
+    __test__ = False  # not a pytest test class, despite the name
+
+    def __init__(self, imports: dict[str, list[str]]):
+        # Direct imports of every .py file in the app, by relative path
+        self.imports = imports
+
+    @classmethod
+    def build(cls, app_root: Path) -> "TestImpactMap":
+        files = _python_files(app_root)
+        known = set(files)
+        return cls({rel: parse_imports(app_root, rel, known) for rel in files})
+
+    @classmethod
+    def load_or_build(cls, app_root: Path, cache_dir: Path) -> "TestImpactMap":
+        """The map for app_root's current sources, from memory or the cache under cache_dir if built before."""
+        signature = baseline_signature(app_root)
+        with _memo_lock:
+            if signature in _memo:
+                return _memo[signature]
+            cache_file = cache_dir / f"{signature[:16]}.json"
+            impact = None
+            if cache_file.exists():
+                try:
+                    impact = cls(json.loads(cache_file.read_text())["imports"])
+                except (OSError, ValueError, KeyError):
+                    impact = None
+            if impact is None:
+                impact = cls.build(app_root)
+                try:
+                    cache_dir.mkdir(parents=True, exist_ok=True)
+                    tmp = cache_file.with_suffix(".tmp")
+                    tmp.write_text(json.dumps({"imports": impact.imports}))
+                    tmp.replace(cache_file)
+                except OSError:
+                    pass
+            _memo[signature] = impact
+            return impact
+
+    @property
+    def test_files(self) -> list[str]:
+        return [rel for rel in self.imports if _is_test_file(rel)]
+
+    def dependencies(self, test_file: str, imports: dict[str, list[str]] | None = None) -> set[str]:
+        """All app files test_file depends on, itself and its conftest.py files included."""
+        imports = self.imports if imports is None else imports
+        stack = [test_file, *_conftests(test_file, imports)]
+        seen: set[str] = set()
+        while stack:
+            rel = stack.pop()
+            if rel in seen:
+                continue
+            seen.add(rel)
+            stack.extend(imports.get(rel, []))
+        return seen
+
+    def affected_tests(self, changed: Iterable[str], app_root: Path | None = None) -> list[str] | None:
+        """Test files whose dependencies include any changed file (paths relative to the app root).
+
+        Returns None when the selection can't be trusted and the full suite should run: a changed
+        file that isn't Python (config, data, pyproject.toml). With app_root, changed files are
+        re-parsed so imports added since the baseline count.
+        """
+        changed = set(changed)
+        if any(not rel.endswith(".py") for rel in changed):
+            return None
+        imports = dict(self.imports)
+        if app_root is not None and changed:
+            present = {rel for rel in changed if (app_root / rel).is_file()}
+            for rel in changed - present:
+                imports.pop(rel, None)
+            known = set(imports) | present
+            for rel in present:
+                imports[rel] = parse_imports(app_root, rel, known)
+        test_files = [rel for rel in imports if _is_test_file(rel)]
+        return sorted(t for t in test_files if self.dependencies(t, imports) & changed)
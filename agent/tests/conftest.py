@@ -0,0 +1,14 @@
+import pytest
+
+
+@pytest.fixture
+def app_root(tmp_path):
+    """A small app for the tools to work on."""
+    root = tmp_path / "app"
+    (root / "tests").mkdir(parents=True)
+    (root / "main.py").write_text('from models import Todo\n\n\ndef list_todos():\n    return [Todo("a")]\n')
+    (root / "models.py").write_text("class Todo:\n    def __init__(self, title):\n        self.title = title\n")
+    (root / "tests" / "test_main.py").write_text(
+        "from main import list_todos\n\n\ndef test_list():\n    assert len(list_todos()) == 1\n"
+    )
+    return root
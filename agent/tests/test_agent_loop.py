@@ -0,0 +1,50 @@
+import asyncio
+
+from backends import AsyncScriptedBackend, ScriptedBackend
+from main import arun_agent_task, run_agent_task
+
+SCRIPT = [
+    {"tool_calls": [{"name": "read_file", "arguments": {"path": "models.py", "limit": 1}}]},
+    {"tool_calls": [{"name": "write_file", "arguments": {"path": "notes.txt", "contents": "done\n"}}]},
+    {"content": "Finished."},
+]
+
+
+def test_async_loop_runs_tools_until_the_model_stops(app_root):
+    result = asyncio.run(arun_agent_task("Take notes", app_root=app_root, backend=AsyncScriptedBackend(SCRIPT)))
+    assert result.finished
+    assert (result.n_turns, result.n_tool_calls) == (3, 2)
+    tool_results = [m["content"] for m in result.messages if m["role"] == "tool"]
+    assert tool_results[0].startswith("class Todo:\n")
+    assert tool_results[1] == "Wrote notes.txt"
+    assert (app_root / "notes.txt").read_text() == "done\n"
+    assert result.files_changed == ["notes.txt"]
+    assert len(result.llm_calls) == 3
+
+
+def test_async_loop_matches_the_sync_loop(app_root):
+    sync = run_agent_task("Take notes", app_root=app_root, backend=ScriptedBackend(SCRIPT))
+    (app_root / "notes.txt").unlink()
+    async_ = asyncio.run(arun_agent_task("Take notes", app_root=app_root, backend=AsyncScriptedBackend(SCRIPT)))
+    assert async_.messages == sync.messages
+    assert async_.usage == sync.usage
+
+
+def test_async_tasks_share_one_event_loop(app_root):
+    """Concurrent tasks overlap their model latency instead of running one after another."""
+    backend = AsyncScriptedBackend([{"content": "Done."}], latency_sec=0.2)
+
+    async def run_many():
+        return await asyncio.gather(*(arun_agent_task("Hi", app_root=app_root, backend=backend) for _ in range(10)))
+
+    results = asyncio.run(run_many())
+    assert all(r.finished for r in results)
+    assert sum(r.latency_sec for r in results) > 1.5
+    assert max(r.latency_sec for r in results) < 1.0
+
+
+def test_async_loop_stops_at_max_turns(app_root):
+    backend = AsyncScriptedBackend([{"tool_calls": [{"name": "read_file", "arguments": {"path": "main.py"}}]}])
+    result = asyncio.run(arun_agent_task("Loop", app_root=app_root, backend=backend, max_turns=3))
+    assert not result.finished
+    assert result.n_turns == 3
@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+import pytest
+
+from backends import AsyncScriptedBackend, ScriptedBackend
+
+TURNS = [
+    {"tool_calls": [{"name": "read_file", "arguments": {"path": "main.py"}}]},
+    {"content": "Done."},
+]
+
+
+def _messages(n_assistant):
+    return [{"role": "user", "content": "Go"}] + [{"role": "assistant", "content": ""}] * n_assistant
+
+
+def test_turn_follows_the_number_of_assistant_messages():
+    backend = ScriptedBackend(TURNS)
+    first = backend.create(model="m", messages=_messages(0)).choices[0]
+    assert first.finish_reason == "tool_calls"
+    call = first.message.tool_calls[0]
+    assert (call.id, call.function.name) == ("call_0_0", "read_file")
+    assert json.loads(call.function.arguments) == {"path": "main.py"}
+    assert backend.create(model="m", messages=_messages(1)).choices[0].message.content == "Done."
+    # Past the end of the script the last turn repeats
+    assert backend.create(model="m", messages=_messages(5)).choices[0].message.content == "Done."
+
+
+def test_usage_grows_with_the_prompt():
+    backend = ScriptedBackend(TURNS)
+    short = backend.create(model="m", messages=_messages(0)).usage
+    long = backend.create(model="m", messages=_messages(0) + [{"role": "user", "content": "x" * 400}]).usage
+    assert long.prompt_tokens >= short.prompt_tokens + 100
+    assert short.total_tokens == short.prompt_tokens + short.completion_tokens
+
+
+def test_from_yaml(tmp_path):
+    script = tmp_path / "script.yaml"
+    script.write_text("latency_sec: 0.5\nturns:\n  - content: Hi\n")
+    backend = ScriptedBackend.from_yaml(script)
+    assert (backend.turns, backend.latency_sec) == ([{"content": "Hi"}], 0.5)
+    assert ScriptedBackend.from_yaml(script, latency_sec=0.0).latency_sec == 0.0
+
+
+def test_empty_script_is_rejected():
+    with pytest.raises(ValueError):
+        ScriptedBackend([])
+
+
+def test_async_backend_answers_like_the_sync_one():
+    response = asyncio.run(AsyncScriptedBackend(TURNS).create(model="m", messages=_messages(1)))
+    assert response.choices[0].message.content == "Done."
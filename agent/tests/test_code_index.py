@@ -0,0 +1,112 @@
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import code_index
+from code_index import MEMO_MAX_ENTRIES, CodeIndex, format_results
+from tools import ToolState, _edit_file, _search_code, _write_file
+
+
+@pytest.fixture(autouse=True)
+def empty_memo(monkeypatch):
+    monkeypatch.setattr(code_index, "_memo", OrderedDict())
+
+
+def _paths(results):
+    return [(rel, line_no) for rel, line_no, _ in results]
+
+
+def test_definitions_rank_first(app_root):
+    results, total = CodeIndex(app_root).build().search("todo")
+    # def list_todos and class Todo, then main.py (three matches) before test_main.py (two)
+    assert _paths(results) == [
+        ("main.py", 4),
+        ("models.py", 1),
+        ("main.py", 1),
+        ("main.py", 5),
+        ("tests/test_main.py", 1),
+        ("tests/test_main.py", 5),
+    ]
+    assert total == 6
+
+
+def test_query_options(app_root):
+    index = CodeIndex(app_root).build()
+    results, _ = index.search("Todo", case_sensitive=True, path_glob="main.py")
+    assert _paths(results) == [("main.py", 1), ("main.py", 5)]
+    assert _paths(index.search(r"def \w+_todos", regex=True)[0]) == [("main.py", 4)]
+    assert index.search("zzz_missing")[0] == []
+    # Shorter than a trigram: every file is a candidate
+    assert ("models.py", 3) in _paths(index.search("= ")[0])
+
+
+def test_search_after_tool_edits(app_root):
+    state = ToolState()
+    assert _search_code("priority", app_root=app_root, state=state) == "No matches for 'priority'"
+    new = "self.title = title\n        self.priority = 0"
+    _edit_file("models.py", "self.title = title", new, app_root=app_root, state=state)
+    _write_file("priorities.py", "def priority_order():\n    pass\n", app_root=app_root, state=state)
+    assert _search_code("priority", app_root=app_root, state=state).splitlines() == [
+        "priorities.py:1: def priority_order():",
+        "models.py:4: self.priority = 0",
+    ]
+
+
+def test_search_after_edits_made_outside_the_tools(app_root):
+    index = CodeIndex(app_root).build()
+    (app_root / "models.py").write_text("class Task:\n    pass\n")
+    (app_root / "tests" / "test_main.py").unlink()
+    (app_root / "notes.md").write_text("Rename Todo to Task\n")
+    assert _paths(index.search("todo")[0]) == [("main.py", 4), ("main.py", 1), ("main.py", 5), ("notes.md", 1)]
+    assert _paths(index.search("class task")[0]) == [("models.py", 1)]
+    assert index.refresh() == 0
+
+
+def test_unindexed_files_are_skipped(app_root):
+    (app_root / "todo.db").write_bytes(b"Todo")
+    (app_root / ".venv" / "lib").mkdir(parents=True)
+    (app_root / ".venv" / "lib" / "todo.py").write_text("Todo\n")
+    results, _ = CodeIndex(app_root).build().search("todo")
+    assert {rel for rel, _, _ in results} == {"main.py", "models.py", "tests/test_main.py"}
+
+
+def test_identical_workspaces_clone_one_build(app_root, tmp_path, monkeypatch):
+    builds = []
+    real_build = CodeIndex.build
+    monkeypatch.setattr(CodeIndex, "build", lambda self: builds.append(self.root) or real_build(self))
+    copies = [shutil.copytree(app_root, tmp_path / f"trial_{i}") for i in range(3)]
+    indexes = [CodeIndex.for_workspace(root) for root in copies]
+    assert builds == [copies[0]]
+    # A clone has its own files: an edit in one workspace is not seen by the others
+    (copies[1] / "models.py").write_text("class Task:\n    pass\n")
+    assert _paths(indexes[1].search("class task")[0]) == [("models.py", 1)]
+    assert indexes[2].search("class task")[0] == []
+    assert indexes[2].refresh() == 0
+
+
+def test_memo_is_bounded(app_root, tmp_path):
+    for i in range(MEMO_MAX_ENTRIES + 2):
+        root = shutil.copytree(app_root, tmp_path / f"trial_{i}")
+        (root / "extra.py").write_text(f"x = {i}\n")
+        CodeIndex.for_workspace(root)
+    assert len(code_index._memo) == MEMO_MAX_ENTRIES
+    assert code_index._building == {}
+
+
+def test_parallel_first_searches_share_one_build(app_root, monkeypatch):
+    builds = []
+    real_build = CodeIndex.build
+    monkeypatch.setattr(CodeIndex, "build", lambda self: builds.append(self.root) or real_build(self))
+    state = ToolState()
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: _search_code("Todo", app_root=app_root, state=state), range(8)))
+    assert len(set(results)) == 1
+    assert len(builds) == 1
+
+
+def test_format_results():
+    assert format_results("x", [], 0) == "No matches for 'x'"
+    text = format_results("x", [("a.py", 3, "    x = 1  ")], 5)
+    assert text == "a.py:3: x = 1\n... 4 more matches; narrow the query or use path_glob"
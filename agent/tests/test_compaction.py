@@ -0,0 +1,80 @@
+import copy
+import json
+
+from compaction import COMPACTION_TARGET_RATIO, Compactor, estimate_tokens, head_tail
+
+
+def _tool_turn(call_id, name, args, result):
+    return [
+        {
+            "role": "assistant",
+            "content": "",
+            "tool_calls": [{"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}],
+        },
+        {"role": "tool", "tool_call_id": call_id, "content": result},
+    ]
+
+
+def _transcript():
+    return [{"role": "system", "content": "You are an agent."}, {"role": "user", "content": "Fix it"}]
+
+
+def test_view_is_append_only_between_compactions():
+    compactor = Compactor(token_budget=6_000)
+    messages = _transcript()
+    previous = compactor.compact(messages)
+    n_calls = 0
+    for n in range(15):
+        messages += _tool_turn(f"call_{n}", "run_command", {"cmd": "ls"}, f"{n % 10}" * 2_400)
+        before = compactor.n_compactions
+        view = compactor.compact(messages)
+        n_calls += 1
+        if compactor.n_compactions == 0:
+            assert view == messages
+        elif compactor.n_compactions == before:
+            # New messages are appended to the previous request unchanged
+            assert view[: len(previous)] == previous
+            assert view[len(previous) :] == messages[len(previous) :]
+        assert estimate_tokens(view) <= 6_000
+        previous = view
+    # Each compaction leaves headroom, so most calls reuse the previous request as their prefix
+    assert 0 < compactor.n_compactions <= n_calls // 3
+
+
+def test_compaction_shrinks_to_the_target_and_keeps_the_transcript():
+    compactor = Compactor(token_budget=5_000)
+    messages = _transcript()
+    for n in range(8):
+        messages += _tool_turn(f"call_{n}", "run_command", {"cmd": "ls"}, f"{n}" * 8_000)
+    original = copy.deepcopy(messages)
+    view = compactor.compact(messages)
+    assert messages == original
+    assert len(view) == len(messages)
+    assert estimate_tokens(view) <= 5_000 * COMPACTION_TARGET_RATIO
+    assert compactor.tokens_saved == estimate_tokens(messages) - estimate_tokens(view)
+    # Oldest results are cut first
+    assert "elided" in view[3]["content"]
+
+
+def test_superseded_reads_are_replaced_by_a_stub():
+    compactor = Compactor(token_budget=400)
+    messages = _transcript()
+    messages += _tool_turn("a", "read_file", {"path": "main.py"}, "old " * 300)
+    messages += _tool_turn("b", "read_file", {"path": "models.py", "offset": 1, "limit": 5}, "partial")
+    messages += _tool_turn("c", "edit_file", {"path": "main.py", "old_string": "a", "new_string": "b"}, "Edited main.py")
+    messages += _tool_turn("d", "read_file", {"path": "models.py"}, "models " * 100)
+    view = compactor.compact(messages)
+    assert view[3]["content"].startswith("[Earlier read of main.py omitted")
+    assert view[5]["content"].startswith("[Earlier read of models.py omitted")
+    assert view[9]["content"] == messages[9]["content"]
+
+
+def test_no_budget_sends_the_transcript_as_is():
+    messages = _transcript() + _tool_turn("a", "run_command", {"cmd": "ls"}, "x" * 1_000_000)
+    assert Compactor(token_budget=None).compact(messages) is messages
+
+
+def test_head_tail():
+    assert head_tail("short", 10) == "short"
+    cut = head_tail("a" * 10 + "b" * 10, 10)
+    assert cut == "aaaaa\n... [10 characters elided] ...\nbbbbb"
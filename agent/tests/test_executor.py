@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from executor import AsyncToolCallScheduler, ToolCallScheduler, aexecute_tool_calls, execute_tool_calls, is_read_only
+
+
+class Recorder:
+    """A run_one that logs when each call starts and ends and can hold calls back."""
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+        self.events = []
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def _enter(self, label):
+        with self._lock:
+            self.events.append(("start", label))
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+    def _exit(self, label):
+        with self._lock:
+            self.running -= 1
+            self.events.append(("end", label))
+
+    def __call__(self, name, arguments):
+        label = arguments["label"]
+        self._enter(label)
+        time.sleep(self.delays.get(label, 0.05))
+        self._exit(label)
+        return f"{name}:{label}"
+
+    async def arun(self, name, arguments):
+        label = arguments["label"]
+        self._enter(label)
+        await asyncio.sleep(self.delays.get(label, 0.05))
+        self._exit(label)
+        return f"{name}:{label}"
+
+    def index(self, kind, label):
+        return self.events.index((kind, label))
+
+
+def read(label):
+    return ("read_file", {"label": label})
+
+
+def write(label):
+    return ("write_file", {"label": label})
+
+
+# read, read, write, read, read: the write waits for both reads and blocks the two after it
+CALLS = [read("r1"), read("r2"), write("w"), read("r3"), read("r4")]
+
+
+def _assert_barrier(recorder):
+    for before in ("r1", "r2"):
+        assert recorder.index("end", before) < recorder.index("start", "w")
+    for after in ("r3", "r4"):
+        assert recorder.index("end", "w") < recorder.index("start", after)
+    assert recorder.max_running == 2
+
+
+def test_is_read_only():
+    assert is_read_only("read_file", {})
+    assert is_read_only("search_code", {})
+    assert not is_read_only("write_file", {})
+    assert not is_read_only("run_command", {"cmd": "ls"})
+    assert is_read_only("run_command", {"cmd": "ls", "read_only": True})
+    assert not is_read_only("run_command", {"cmd": "ls", "read_only": "true"})
+
+
+def test_write_is_a_barrier_between_parallel_reads():
+    recorder = Recorder()
+    results = execute_tool_calls(CALLS, recorder)
+    assert results == ["read_file:r1", "read_file:r2", "write_file:w", "read_file:r3", "read_file:r4"]
+    _assert_barrier(recorder)
+
+
+def test_async_write_is_a_barrier_between_parallel_reads():
+    recorder = Recorder()
+    results = asyncio.run(aexecute_tool_calls(CALLS, recorder.arun))
+    assert results == ["read_file:r1", "read_file:r2", "write_file:w", "read_file:r3", "read_file:r4"]
+    _assert_barrier(recorder)
+
+
+def test_writes_keep_their_order():
+    recorder = Recorder(delays={"w1": 0.1, "w2": 0.0})
+    execute_tool_calls([read("r"), write("w1"), write("w2")], recorder)
+    assert recorder.index("end", "w1") < recorder.index("start", "w2")
+    assert recorder.max_running == 1
+
+
+def test_results_are_in_submission_order_not_completion_order():
+    recorder = Recorder(delays={"slow": 0.2, "fast": 0.0})
+    assert execute_tool_calls([read("slow"), read("fast")], recorder) == ["read_file:slow", "read_file:fast"]
+    assert [kind for kind, _ in recorder.events[:2]] == ["start", "start"]
+    assert recorder.index("end", "fast") < recorder.index("end", "slow")
+
+
+def test_a_turn_without_reads_runs_in_the_caller():
+    callers = []
+
+    def run_one(name, arguments):
+        callers.append(threading.current_thread())
+        return name
+
+    execute_tool_calls([write("w1"), write("w2")], run_one)
+    assert callers == [threading.current_thread()] * 2
+
+
+def test_scheduler_starts_calls_as_they_are_submitted():
+    """Streaming submits calls one at a time; each read starts without waiting for the turn to end."""
+    started = threading.Event()
+
+    def run_one(name, arguments):
+        started.set()
+        return name
+
+    scheduler = ToolCallScheduler(run_one)
+    scheduler.submit(*read("r"))
+    assert started.wait(1)
+    assert scheduler.results() == ["read_file"]
+
+
+def test_scheduler_raises_a_failed_call():
+    def run_one(name, arguments):
+        raise RuntimeError("boom")
+
+    scheduler = ToolCallScheduler(run_one)
+    scheduler.submit(*read("r"))
+    with pytest.raises(RuntimeError, match="boom"):
+        scheduler.results()
+
+
+def test_async_scheduler_barrier_waits_for_earlier_reads():
+    recorder = Recorder(delays={"r": 0.1, "w": 0.0})
+
+    async def run():
+        scheduler = AsyncToolCallScheduler(recorder.arun)
+        scheduler.submit(*read("r"))
+        scheduler.submit(*write("w"))
+        return await scheduler.results()
+
+    assert asyncio.run(run()) == ["read_file:r", "write_file:w"]
+    assert recorder.index("end", "r") < recorder.index("start", "w")
@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+import pytest
+
+from backends import ScriptedBackend
+from llm_cache import CachedCompletions, CacheMiss, ResponseCache, cache_key
+from streaming import StreamAssembler
+
+MODEL = "gpt-4o-mini"
+TOOLS = [{"type": "function", "function": {"name": "read_file", "parameters": {"type": "object"}}}]
+
+
+def _transcript(tool_result, prompt="Fix the bug"):
+    return [
+        {"role": "system", "content": "You are an agent."},
+        {"role": "user", "content": prompt},
+        {"role": "assistant", "content": "", "tool_calls": [{"id": "call_0_0", "type": "function"}]},
+        {"role": "tool", "tool_call_id": "call_0_0", "content": tool_result},
+    ]
+
+
+def test_key_is_stable_across_dict_order_and_copies():
+    messages = _transcript("ok")
+    reordered = [dict(reversed(list(m.items()))) for m in messages]
+    assert cache_key(MODEL, messages, TOOLS) == cache_key(MODEL, reordered, [dict(t) for t in TOOLS])
+    assert cache_key(MODEL, messages, None) == cache_key(MODEL, messages, [])
+
+
+def test_key_depends_on_model_tools_and_content():
+    key = cache_key(MODEL, _transcript("ok"), TOOLS)
+    assert cache_key("gpt-4o", _transcript("ok"), TOOLS) != key
+    assert cache_key(MODEL, _transcript("ok"), None) != key
+    assert cache_key(MODEL, _transcript("ok "), TOOLS) != key
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        ("3 passed in 0.12s", "3 passed in 4.56s"),
+        ("1 failed, 2 passed in 1.00s (0:00:01)", "1 failed, 2 passed in 65.10s (0:01:05)"),
+        ("no tests ran in 0.01s", "no tests ran in 0.02s"),
+        ("tests timed out after 30s", "tests timed out after 60s"),
+        ("<Todo object at 0x7f3a2c>", "<Todo object at 0x10b4e0>"),
+        (
+            "/tmp/eval_workspaces_ab12/trial_3/app/main.py",
+            "/tmp/eval_workspaces_cd34/trial_17/app/main.py",
+        ),
+        ("/tmp/eval_trial_x9y8/app/main.py", "/tmp/eval_trial_q1w2/app/main.py"),
+    ],
+)
+def test_volatile_tool_output_shares_a_key(first, second):
+    assert cache_key(MODEL, _transcript(first), TOOLS) == cache_key(MODEL, _transcript(second), TOOLS)
+
+
+@pytest.mark.parametrize(
+    "first, second",
+    [
+        # Same counts and shape but different outcomes must not collide
+        ("3 passed in 0.12s", "3 failed in 0.12s"),
+        # Durations not in a known format are content
+        ("sleep took 0.12s", "sleep took 4.56s"),
+        ("retry after 5s", "retry after 30s"),
+        ("at 0x1f", "at 0x2f"),
+    ],
+)
+def test_other_tool_output_changes_the_key(first, second):
+    assert cache_key(MODEL, _transcript(first), TOOLS) != cache_key(MODEL, _transcript(second), TOOLS)
+
+
+def test_only_tool_results_are_normalised():
+    assert cache_key(MODEL, _transcript("ok", "Use a timeout of 5s in 0.10s"), TOOLS) != cache_key(
+        MODEL, _transcript("ok", "Use a timeout of 5s in 0.20s"), TOOLS
+    )
+    assert cache_key(MODEL, _transcript("ok", "3 passed in 0.12s"), TOOLS) != cache_key(
+        MODEL, _transcript("ok", "3 passed in 4.56s"), TOOLS
+    )
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(tmp_path / "llm.sqlite")
+    yield cache
+    cache.close()
+
+
+def _client_factory(backend, calls):
+    def factory():
+        calls.append(1)
+        return SimpleNamespace(chat=SimpleNamespace(completions=backend))
+
+    return factory
+
+
+def test_record_then_replay_without_a_client(cache):
+    calls = []
+    backend = ScriptedBackend([{"content": "Done."}])
+    recorder = CachedCompletions(cache, "record", client_factory=_client_factory(backend, calls))
+    recorded = recorder.create(model=MODEL, messages=_transcript("3 passed in 0.12s"), tools=TOOLS)
+    recorder.create(model=MODEL, messages=_transcript("3 passed in 0.50s"), tools=TOOLS)
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    replayer = CachedCompletions(cache, "replay", client_factory=_client_factory(backend, calls))
+    replayed = replayer.create(model=MODEL, messages=_transcript("3 passed in 9.99s"), tools=TOOLS)
+    assert replayed == recorded
+    assert len(calls) == 1
+
+
+def test_replay_miss_raises(cache):
+    replayer = CachedCompletions(cache, "replay", client_factory=_client_factory(None, []))
+    with pytest.raises(CacheMiss):
+        replayer.create(model=MODEL, messages=_transcript("ok"), tools=TOOLS)
+
+
+def test_replayed_stream_assembles_to_the_recorded_response(cache):
+    backend = ScriptedBackend([{"tool_calls": [{"name": "read_file", "arguments": {"path": "main.py"}}]}])
+    recorder = CachedCompletions(cache, "record", client_factory=_client_factory(backend, []))
+    recorded = recorder.create(model=MODEL, messages=_transcript("ok"), tools=TOOLS)
+    chunks = CachedCompletions(cache, "replay").create(model=MODEL, messages=_transcript("ok"), tools=TOOLS, stream=True)
+    assembler = StreamAssembler()
+    for chunk in chunks:
+        assembler.feed(chunk)
+    assert assembler.response() == recorded
+
+
+def test_unknown_mode_is_rejected(cache):
+    with pytest.raises(ValueError, match="Unknown cache mode"):
+        CachedCompletions(cache, "refresh")
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from output_capture import MAX_COMMAND_TIMEOUT_SEC, BoundedOutput, arun_bounded, clamp_timeout, run_bounded
+
+
+def test_small_output_is_kept_whole():
+    out = BoundedOutput(budget=10)
+    out.feed(b"hello")
+    out.feed(b"")
+    assert (out.text(), out.total, out.elided) == ("hello", 5, 0)
+
+
+def test_head_and_tail_are_kept_across_chunks():
+    out = BoundedOutput(budget=10)
+    for chunk in (b"abc", b"defgh", b"ijklmnop", b"qrstuvwxyz"):
+        out.feed(chunk)
+    assert out.total == 26
+    assert out.text() == "abcde\n... [16 bytes elided] ...\nvwxyz"
+
+
+def test_overflow_spills_the_full_stream(tmp_path):
+    spill = tmp_path / "logs" / "cmd.stdout.log"
+    out = BoundedOutput(budget=10, spill_path=spill)
+    data = bytes(range(65, 91)) * 3
+    for i in range(0, len(data), 7):
+        out.feed(data[i : i + 7])
+    out.close()
+    assert spill.read_bytes() == data
+    assert f"full output in {spill}" in out.text()
+
+
+def test_no_spill_file_within_budget(tmp_path):
+    spill = tmp_path / "cmd.stdout.log"
+    out = BoundedOutput(budget=10, spill_path=spill)
+    out.feed(b"0123456789")
+    out.close()
+    assert not spill.exists()
+
+
+def test_clamp_timeout():
+    assert clamp_timeout(None) == clamp_timeout(0) == clamp_timeout(-1) == 300
+    assert clamp_timeout(2) == 2.0
+    assert clamp_timeout(10 * MAX_COMMAND_TIMEOUT_SEC) == MAX_COMMAND_TIMEOUT_SEC
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A zombie is dead but still listed until reaped by its (re)parent
+    with open(f"/proc/{pid}/stat") as f:
+        return f.read().split(")")[-1].split()[0] != "Z"
+
+
+# The command forks a grandchild that would outlive a kill of the shell alone
+SPAWNS_GRANDCHILD = "sleep 30 & echo $!; echo started >&2; wait"
+
+
+@pytest.fixture(params=["sync", "async"])
+def run(request):
+    if request.param == "sync":
+        return run_bounded
+    return lambda *args: asyncio.run(arun_bounded(*args))
+
+
+def test_exit_code_and_bounded_streams(run, tmp_path):
+    stdout, stderr = BoundedOutput(budget=20), BoundedOutput()
+    assert run("seq 1 1000; echo oops >&2; exit 4", tmp_path, 10, stdout, stderr) == 4
+    assert stdout.text().startswith("1\n2\n3\n")
+    assert stdout.text().endswith("999\n1000\n")
+    assert stdout.total == len("".join(f"{i}\n" for i in range(1, 1001)))
+    assert stderr.text() == "oops\n"
+
+
+def test_timeout_kills_the_process_group(run, tmp_path):
+    stdout, stderr = BoundedOutput(), BoundedOutput()
+    start = time.monotonic()
+    assert run(SPAWNS_GRANDCHILD, tmp_path, 0.5, stdout, stderr) is None
+    assert time.monotonic() - start < 5
+    grandchild = int(stdout.text().split()[0])
+    deadline = time.monotonic() + 5
+    while _alive(grandchild) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _alive(grandchild)
+    assert stderr.text() == "started\n"
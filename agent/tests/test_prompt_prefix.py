@@ -0,0 +1,60 @@
+import json
+
+from openai.types.completion_usage import PromptTokensDetails
+
+from backends import ScriptedBackend
+from main import REQUEST_TOOLS, TOOLS, _record_usage, canonical_tools, prompt_cache_key, run_agent_task
+
+SCRIPT = [
+    {"tool_calls": [{"name": "read_file", "arguments": {"path": "main.py"}}]},
+    {"tool_calls": [{"name": "search_code", "arguments": {"query": "Todo"}}]},
+    {"content": "Done."},
+]
+
+
+class RecordingBackend(ScriptedBackend):
+    def __init__(self, turns):
+        super().__init__(turns)
+        self.requests = []
+
+    def create(self, **request):
+        self.requests.append(json.loads(json.dumps(request)))
+        return super().create(**request)
+
+
+def _bytes(value):
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def test_each_request_extends_the_previous_one(app_root):
+    backend = RecordingBackend(SCRIPT)
+    run_agent_task("Find Todo", app_root=app_root, backend=backend)
+    assert len(backend.requests) == 3
+    for previous, request in zip(backend.requests, backend.requests[1:]):
+        assert _bytes(request["tools"]) == _bytes(previous["tools"])
+        assert request["prompt_cache_key"] == previous["prompt_cache_key"]
+        before = _bytes(previous["messages"])[:-1]
+        assert _bytes(request["messages"]).startswith(before)
+
+
+def test_prefix_is_shared_across_trials_of_a_task(app_root):
+    first, second = RecordingBackend(SCRIPT), RecordingBackend(SCRIPT)
+    run_agent_task("Find Todo", app_root=app_root, backend=first)
+    run_agent_task("Find Todo", app_root=app_root, backend=second)
+    assert _bytes(first.requests[0]) == _bytes(second.requests[0])
+    assert prompt_cache_key("system", "task a") != prompt_cache_key("system", "task b")
+
+
+def test_canonical_tools_ignore_declaration_order():
+    assert _bytes(canonical_tools(list(reversed(TOOLS)))) == _bytes(REQUEST_TOOLS)
+    assert [t["function"]["name"] for t in REQUEST_TOOLS] == sorted(t["function"]["name"] for t in TOOLS)
+
+
+def test_cached_tokens_are_recorded():
+    response = ScriptedBackend([{"content": "Done."}]).create(model="m", messages=[{"role": "user", "content": "Hi"}])
+    response.usage.prompt_tokens_details = PromptTokensDetails(cached_tokens=3)
+    usage, calls = {}, []
+    _record_usage(response, usage, calls, latency_sec=0.5)
+    _record_usage(response, usage, calls, latency_sec=0.5)
+    assert usage["cached_tokens"] == 6
+    assert calls[0]["cached_tokens"] == 3
@@ -0,0 +1,52 @@
+import sys
+
+import pytest
+
+from pytest_service import PytestService, format_run
+
+
+@pytest.fixture
+def venv_app(app_root):
+    """app_root with this interpreter (which has pytest) as its .venv python."""
+    bin_dir = app_root / ".venv" / "bin"
+    bin_dir.mkdir(parents=True)
+    (bin_dir / "python").symlink_to(sys.executable)
+    return app_root
+
+
+@pytest.mark.parametrize("warm", [True, False])
+def test_runs_report_each_test(venv_app, warm):
+    (venv_app / "tests" / "test_more.py").write_text("def test_fails():\n    assert 1 == 2\n")
+    with PytestService(venv_app, warm=warm) as service:
+        run = service.run()
+    assert run.exit_code == 1
+    assert run.counts() == {"passed": 1, "failed": 1}
+    failed = next(t for t in run.tests if t["outcome"] == "failed")
+    assert failed["nodeid"] == "tests/test_more.py::test_fails"
+    assert "assert 1 == 2" in format_run(run)
+
+
+def test_warm_runs_pick_up_edits(venv_app):
+    with PytestService(venv_app) as service:
+        assert service.run().exit_code == 0
+        (venv_app / "main.py").write_text("def list_todos():\n    return []\n")
+        run = service.run(["tests/test_main.py"])
+    assert run.counts() == {"failed": 1}
+
+
+def test_a_pytest_that_cannot_start_is_an_errored_run(app_root, tmp_path, monkeypatch):
+    # No .venv and no poetry on PATH
+    monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+    run = PytestService(app_root, warm=False).run()
+    assert run.exit_code is None
+    assert not run.timed_out
+    assert run.output.startswith("Could not start pytest:")
+    assert "Could not start pytest:" in format_run(run)
+
+
+def test_timeout(venv_app):
+    (venv_app / "tests" / "test_slow.py").write_text("import time\n\n\ndef test_slow():\n    time.sleep(30)\n")
+    with PytestService(venv_app, warm=False) as service:
+        run = service.run(["tests/test_slow.py"], timeout=1)
+    assert (run.exit_code, run.timed_out) == (None, True)
+    assert format_run(run) == "Error: tests timed out after 1s"
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+import pytest
+
+from output_capture import BoundedOutput
+from shell import SENTINEL, ShellSession, StreamReader
+
+
+@pytest.fixture
+def shell(app_root):
+    session = ShellSession(app_root)
+    yield session
+    session.close()
+
+
+def test_exit_code_and_separate_streams(shell, app_root):
+    assert shell.run("echo out; echo err >&2; exit 3", app_root, timeout=10) == (3, "out\n", "err\n")
+    assert shell.run("true", app_root, timeout=10) == (0, "", "")
+
+
+def test_output_without_a_trailing_newline(shell, app_root):
+    assert shell.run("printf 'no newline'", app_root, timeout=10) == (0, "no newline", "")
+
+
+def test_sentinel_lookalikes_in_output_are_kept(shell, app_root):
+    """Only a marker with this command's token ends it, so printing the sentinel name is harmless."""
+    cmd = f"echo '{SENTINEL}deadbeef 0'; printf '\\n{SENTINEL}'; echo after"
+    code, out, _ = shell.run(cmd, app_root, timeout=10)
+    assert code == 0
+    assert out == f"{SENTINEL}deadbeef 0\n\n{SENTINEL}after\n"
+
+
+def test_commands_do_not_leak_state(shell, app_root):
+    shell.run("cd tests && export LEAK=1", app_root, timeout=10)
+    assert shell.run("pwd; echo ${LEAK:-unset}", app_root, timeout=10) == (0, f"{app_root}\nunset\n", "")
+    assert shell.run("pwd", app_root / "tests", timeout=10) == (0, f"{app_root / 'tests'}\n", "")
+
+
+def test_one_process_serves_every_command(shell, app_root):
+    first = shell.run("echo $$", app_root, timeout=10)[1]
+    assert shell.run("echo $$", app_root, timeout=10)[1] == first
+
+
+def test_timeout_kills_the_session_and_the_next_command_restarts_it(shell, app_root):
+    before = shell.run("echo $$", app_root, timeout=10)[1]
+    start = time.monotonic()
+    code, out, _ = shell.run("echo started; sleep 30", app_root, timeout=0.5)
+    assert code is None
+    assert out == "started\n"
+    assert time.monotonic() - start < 5
+    assert shell.run("echo $$", app_root, timeout=10)[1] != before
+    assert shell.run("echo again", app_root, timeout=10) == (0, "again\n", "")
+
+
+def test_poetry_run_uses_the_workspace_venv(app_root):
+    bin_dir = app_root / ".venv" / "bin"
+    bin_dir.mkdir(parents=True)
+    (bin_dir / "hello").write_text("#!/bin/sh\necho from venv\n")
+    (bin_dir / "hello").chmod(0o755)
+    session = ShellSession(app_root)
+    try:
+        assert session.run("poetry run hello", app_root, timeout=10) == (0, "from venv\n", "")
+    finally:
+        session.close()
+
+
+def test_large_output_is_bounded(shell, app_root):
+    sink = BoundedOutput(budget=100)
+    code, out, _ = shell.run("seq 1 100000", app_root, timeout=10, stdout=sink)
+    assert code == 0
+    assert out.startswith("1\n2\n")
+    assert out.endswith("99999\n100000\n")
+    assert sink.total == len("".join(f"{i}\n" for i in range(1, 100001)))
+
+
+def test_reader_finds_a_marker_split_across_writes():
+    read_fd, write_fd = os.pipe()
+    reader = StreamReader(os.fdopen(read_fd, "rb"))
+    sink = BoundedOutput()
+
+    def write():
+        for part in (b"output\n__MAR", b"KER__ 0\nrest"):
+            os.write(write_fd, part)
+            time.sleep(0.05)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    data, found = reader.read_until(b"\n__MARKER__ ", time.monotonic() + 5, sink)
+    writer.join()
+    assert (data, found) == (b"", True)
+    assert sink.text() == "output"
+    assert reader.read_line(time.monotonic() + 5) == b"0"
+    os.close(write_fd)
+    assert reader.read_until(b"\n", time.monotonic() + 5) == (b"rest", False)
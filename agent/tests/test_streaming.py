@@ -0,0 +1,113 @@
+import json
+import threading
+
+from openai.types.chat import ChatCompletionChunk
+
+from backends import ScriptedBackend
+from main import run_agent_task
+from streaming import StreamAssembler, response_chunks
+
+TWO_CALLS = [
+    {
+        "tool_calls": [
+            {"name": "read_file", "arguments": {"path": "main.py"}},
+            {"name": "write_file", "arguments": {"path": "notes.txt", "contents": "x" * 1_000}},
+        ]
+    },
+    {"content": "Done."},
+]
+
+
+def _chunk(tool_calls=None, content=None, finish_reason=None):
+    delta = {}
+    if tool_calls is not None:
+        delta["tool_calls"] = tool_calls
+    if content is not None:
+        delta["content"] = content
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "c",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "m",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+    )
+
+
+def test_a_call_is_released_once_its_arguments_are_a_whole_object():
+    assembler = StreamAssembler()
+    head = {"index": 0, "id": "a", "type": "function", "function": {"name": "read_file", "arguments": ""}}
+    assert assembler.feed(_chunk([head])) == []
+    assert assembler.feed(_chunk([{"index": 0, "function": {"arguments": '{"path": "a}'}}])) == []
+    assert assembler.feed(_chunk([{"index": 0, "function": {"arguments": '.py"}'}}])) == [
+        (0, "read_file", '{"path": "a}.py"}')
+    ]
+    assert assembler.finish() == []
+
+
+def test_a_new_call_releases_the_previous_one():
+    assembler = StreamAssembler()
+    first = {"index": 0, "id": "a", "type": "function", "function": {"name": "run_command", "arguments": '{"cmd"'}}
+    assert assembler.feed(_chunk([first])) == []
+    second = {"index": 1, "id": "b", "type": "function", "function": {"name": "read_file", "arguments": "{"}}
+    assert assembler.feed(_chunk([second])) == [(0, "run_command", '{"cmd"')]
+    assert assembler.feed(_chunk(finish_reason="tool_calls")) == []
+    assert assembler.finish() == [(1, "read_file", "{")]
+
+
+def test_synthesised_chunks_reassemble_to_the_response():
+    response = ScriptedBackend(TWO_CALLS).create(model="m", messages=[])
+    assembler = StreamAssembler()
+    released = []
+    for chunk in response_chunks(response):
+        released += assembler.feed(chunk)
+    released += assembler.finish()
+    assert assembler.response() == response
+    assert [(i, name, json.loads(args)) for i, name, args in released] == [
+        (0, "read_file", {"path": "main.py"}),
+        (1, "write_file", {"path": "notes.txt", "contents": "x" * 1_000}),
+    ]
+
+
+def test_content_only_stream():
+    assembler = StreamAssembler()
+    for piece in ("Do", "ne."):
+        assembler.feed(_chunk(content=piece))
+    assembler.feed(_chunk(finish_reason="stop"))
+    message = assembler.response().choices[0].message
+    assert (message.content, message.tool_calls) == ("Done.", None)
+
+
+class GatedBackend(ScriptedBackend):
+    """Holds the end of each stream until a tool call has started (or a timeout passes)."""
+
+    def __init__(self, turns):
+        super().__init__(turns)
+        self.tool_started = threading.Event()
+        self.started_mid_stream = []
+
+    def _stream(self, response):
+        chunks = response_chunks(response)
+        yield from chunks[:-1]
+        self.started_mid_stream.append(self.tool_started.wait(5))
+        yield chunks[-1]
+
+
+def test_streaming_starts_tools_before_the_turn_ends(app_root, monkeypatch):
+    import tools
+
+    backend = GatedBackend(TWO_CALLS)
+    real_read_file = tools._read_file
+
+    def read_file(*args, **kwargs):
+        backend.tool_started.set()
+        return real_read_file(*args, **kwargs)
+
+    monkeypatch.setattr(tools, "_read_file", read_file)
+    streamed = run_agent_task("Go", app_root=app_root, backend=backend, stream=True)
+    assert backend.started_mid_stream[0]
+    (app_root / "notes.txt").unlink()
+    plain = run_agent_task("Go", app_root=app_root, backend=ScriptedBackend(TWO_CALLS))
+    assert streamed.messages == plain.messages
+    assert streamed.llm_calls[0]["time_to_first_tool_sec"] <= streamed.llm_calls[0]["latency_sec"]
@@ -0,0 +1,99 @@
+import tools
+from tools import ToolState, _edit_file, _read_file
+
+
+def _numbered(n):
+    return "".join(f"line {i}\n" for i in range(1, n + 1))
+
+
+def test_read_file_whole(app_root):
+    assert _read_file("models.py", app_root) == (app_root / "models.py").read_text()
+
+
+def test_read_file_line_range(app_root):
+    (app_root / "big.txt").write_text(_numbered(10))
+    assert _read_file("big.txt", app_root, offset=3, limit=2) == (
+        "line 3\nline 4\n... [showing lines 3-4 of a 71-byte file; continue with offset=5] ..."
+    )
+    assert _read_file("big.txt", app_root, offset=9) == "line 9\nline 10\n"
+    assert _read_file("big.txt", app_root, offset=9, limit=5) == "line 9\nline 10\n"
+    assert _read_file("big.txt", app_root, offset=11) == "Error: offset 11 is past the end of the file"
+    assert _read_file("big.txt", app_root, offset=0) == "Error: offset must be >= 1"
+    assert _read_file("big.txt", app_root, limit=0) == "Error: limit must be >= 1"
+
+
+def test_read_file_is_capped_at_whole_lines(app_root, monkeypatch):
+    monkeypatch.setattr(tools, "READ_FILE_MAX_BYTES", 20)
+    (app_root / "big.txt").write_text(_numbered(10))
+    assert _read_file("big.txt", app_root) == (
+        "line 1\nline 2\n... [showing lines 1-2 of a 71-byte file; continue with offset=3] ..."
+    )
+    (app_root / "wide.txt").write_text("x" * 50 + "\nshort\n")
+    assert _read_file("wide.txt", app_root) == (
+        "x" * 20 + "\n... [line 1 is longer than 20 bytes; showing its first 20] ..."
+    )
+
+
+def test_read_file_large_files_are_mapped(app_root, monkeypatch):
+    monkeypatch.setattr(tools, "MMAP_THRESHOLD_BYTES", 10)
+    (app_root / "big.txt").write_text(_numbered(10))
+    assert _read_file("big.txt", app_root, offset=10) == "line 10\n"
+
+
+def test_read_file_errors(app_root):
+    assert _read_file("missing.py", app_root) == "Error: file not found: missing.py"
+    assert _read_file("tests", app_root) == "Error: path is a directory, not a file: tests"
+    assert _read_file("../outside.py", app_root) == "Path escapes app root: ../outside.py"
+    (app_root / "empty.py").write_text("")
+    assert _read_file("empty.py", app_root) == ""
+
+
+
+def test_edit_file_replaces_one_occurrence(app_root):
+    state = ToolState()
+    result = _edit_file("models.py", "self.title = title", "self.title = title.strip()", app_root=app_root, state=state)
+    assert result == "Edited models.py (line 3)"
+    assert "self.title = title.strip()\n" in (app_root / "models.py").read_text()
+    assert state.touched_files == {"models.py"}
+    assert state.bytes_emitted == len("self.title = title") + len("self.title = title.strip()")
+    assert state.bytes_written == (app_root / "models.py").stat().st_size
+
+
+def test_edit_file_ambiguous_match_writes_nothing(app_root):
+    (app_root / "dup.py").write_text("x = 1\ny = 2\nx = 1\n")
+    result = _edit_file("dup.py", "x = 1", "x = 3", app_root=app_root)
+    assert result.startswith("Error: old_string occurs 2 times in dup.py (lines 1, 3)")
+    assert (app_root / "dup.py").read_text() == "x = 1\ny = 2\nx = 1\n"
+    result = _edit_file("dup.py", "x = 1", "x = 3", replace_all=True, app_root=app_root)
+    assert result == "Edited dup.py (2 occurrences)"
+    assert (app_root / "dup.py").read_text() == "x = 3\ny = 2\nx = 3\n"
+
+
+def test_edit_file_not_found_points_at_the_closest_line(app_root):
+    result = _edit_file("models.py", "self.title=title", "pass", app_root=app_root)
+    assert result.startswith("Error: old_string not found in models.py. The closest line is 3: 'self.title = title'.")
+
+
+def test_edit_file_keeps_crlf_and_mode(app_root):
+    script = app_root / "run.sh"
+    script.write_bytes(b"echo a\r\necho b\r\n")
+    script.chmod(0o755)
+    _edit_file("run.sh", "echo b", "echo c", app_root=app_root)
+    assert script.read_bytes() == b"echo a\r\necho c\r\n"
+    assert script.stat().st_mode & 0o777 == 0o755
+    assert [p.name for p in app_root.iterdir() if p.name.endswith(".tmp")] == []
+
+
+def test_edit_file_rejects_no_op_and_bad_input(app_root):
+    assert _edit_file("models.py", "", "x", app_root=app_root).startswith("Error: old_string is empty")
+    assert _edit_file("models.py", "a", "a", app_root=app_root).startswith("Error: old_string and new_string")
+    assert _edit_file("missing.py", "a", "b", app_root=app_root) == "Error: file not found: missing.py"
+    (app_root / "blob.bin").write_bytes(b"\xff\xfe")
+    assert _edit_file("blob.bin", "a", "b", app_root=app_root) == "Error: blob.bin is not UTF-8 text; use write_file"
+
+
+def test_tool_state_records_writes(app_root):
+    state = ToolState()
+    state.record_write("main.py", 10, 100)
+    state.record_write("main.py", 5, 100)
+    assert (state.touched_files, state.bytes_emitted, state.bytes_written) == ({"main.py"}, 15, 200)
@@ -1,13 +1,73 @@
-"""Tools for the coding agent: run commands, read/write files in ../app."""
+"""Tools for the coding agent: run commands and tests, read/write/edit files in ../app."""
 
+import asyncio
+import difflib
+import itertools
+import mmap
+import os
+import re
+import shutil
 import subprocess
+import tempfile
+import threading
+from dataclasses import dataclass, field
 from pathlib import Path
 
+from code_index import DEFAULT_MAX_RESULTS, CodeIndex, format_results
+from output_capture import DEFAULT_OUTPUT_BUDGET_BYTES, BoundedOutput, arun_bounded, clamp_timeout, run_bounded
+from pytest_service import PytestService, format_run
+from shell import ShellSession
+from test_impact import TestImpactMap
+
 # App root: ../app relative to this file (agent/tools.py -> agent/ -> app)
 AGENT_DIR = Path(__file__).resolve().parent
 APP_ROOT = (AGENT_DIR / ".." / "app").resolve()
 
 
+@dataclass
+class ToolState:
+    """State shared by one task's tools: files written so far, the test impact map and code index if any."""
+
+    # Paths relative to the app root, as written through write_file or edit_file
+    touched_files: set[str] = field(default_factory=set)
+    test_impact: TestImpactMap | None = None
+    code_index: CodeIndex | None = None
+    # File-changing tool arguments the model emitted (contents, or old + new strings), in bytes
+    bytes_emitted: int = 0
+    # Bytes of file contents written to disk as a result
+    bytes_written: int = 0
+    # Bytes of each command output stream (stdout, stderr) kept in run_command results
+    output_budget: int = DEFAULT_OUTPUT_BUDGET_BYTES
+    # If set, a command output stream that overflows output_budget is also written here in full
+    command_log_dir: Path | None = None
+    _command_ids: itertools.count = field(default_factory=lambda: itertools.count(1), init=False, repr=False)
+    _code_index_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def record_write(self, rel_path: str, emitted: int, written: int) -> None:
+        self.touched_files.add(rel_path)
+        self.bytes_emitted += emitted
+        self.bytes_written += written
+        if self.code_index is not None:
+            self.code_index.update(rel_path)
+
+    def code_index_for(self, app_root: Path) -> CodeIndex:
+        """The code index, made on first use; parallel search_code calls share one build."""
+        with self._code_index_lock:
+            if self.code_index is None:
+                self.code_index = CodeIndex.for_workspace(app_root)
+            return self.code_index
+
+    def output_sinks(self) -> tuple[BoundedOutput, BoundedOutput]:
+        """Fresh stdout and stderr sinks for one command, spilling to numbered logs if command_log_dir is set."""
+        n = next(self._command_ids)
+        if self.command_log_dir is None:
+            return BoundedOutput(self.output_budget), BoundedOutput(self.output_budget)
+        return (
+            BoundedOutput(self.output_budget, self.command_log_dir / f"cmd_{n:03d}.stdout.log"),
+            BoundedOutput(self.output_budget, self.command_log_dir / f"cmd_{n:03d}.stderr.log"),
+        )
+
+
 def _resolve_app_path(path: str, app_root: Path) -> Path:
     """Resolve path relative to app_root; raise if it escapes app_root."""
     resolved = (app_root / path).resolve()
@@ -16,39 +76,187 @@ def _resolve_app_path(path: str, app_root: Path) -> Path:
     return resolved
 
 
-def _run_command(cmd: str, cwd: str | None = None, *, app_root: Path) -> str:
-    """Run a shell command. If cwd is '../app' or None, run from app_root."""
+def _replace_file(full: Path, contents: str) -> None:
+    """Write via a temp file + rename, so the file is never seen (or left) half-written."""
+    fd, tmp = tempfile.mkstemp(dir=full.parent, prefix=f".{full.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(contents)
+        if full.exists():
+            shutil.copymode(full, tmp)
+        os.replace(tmp, full)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _resolve_cwd(cwd: str | None, app_root: Path) -> Path:
+    """Resolve a tool cwd argument. '../app' or None means app_root."""
     run_cwd = app_root
     if cwd is not None and cwd != "../app":
         candidate = (AGENT_DIR / cwd).resolve() if not Path(cwd).is_absolute() else Path(cwd)
         if candidate.is_dir():
             run_cwd = candidate
+    return run_cwd
+
+
+def _format_command_result(returncode: int | None, stdout: str, stderr: str, timeout: float | None = None) -> str:
+    if returncode is None:
+        parts = [f"Error: command timed out after {timeout:g}s; partial output follows"]
+    else:
+        parts = [f"exit_code={returncode}"]
+    if stdout:
+        parts.append(f"stdout:\n{stdout}")
+    if stderr:
+        parts.append(f"stderr:\n{stderr}")
+    return "\n".join(parts)
+
+
+def _run_command(
+    cmd: str,
+    cwd: str | None = None,
+    read_only: bool = False,
+    timeout: float | None = None,
+    *,
+    app_root: Path,
+    state: ToolState | None = None,
+) -> str:
+    """Run a shell command. If cwd is '../app' or None, run from app_root.
+
+    read_only is a scheduling hint for the tool executor and does not change how the command runs.
+    Output is streamed and bounded per state.output_budget (head and tail kept); on timeout
+    (default 300s) the command is killed and the partial output returned.
+    """
+    run_cwd = _resolve_cwd(cwd, app_root)
+    timeout = clamp_timeout(timeout)
+    stdout, stderr = (state or ToolState()).output_sinks()
     try:
-        result = subprocess.run(
-            cmd,
-            shell=True,
-            cwd=run_cwd,
-            capture_output=True,
-            text=True,
-            timeout=300,
-        )
-        parts = [f"exit_code={result.returncode}"]
-        if result.stdout:
-            parts.append(f"stdout:\n{result.stdout}")
-        if result.stderr:
-            parts.append(f"stderr:\n{result.stderr}")
-        return "\n".join(parts)
-    except subprocess.TimeoutExpired:
-        return "Error: command timed out after 300s"
+        returncode = run_bounded(cmd, run_cwd, timeout, stdout, stderr)
+    except Exception as e:
+        return f"Error running command: {e}"
+    finally:
+        stdout.close()
+        stderr.close()
+    return _format_command_result(returncode, stdout.text(), stderr.text(), timeout)
+
+
+def _run_command_in_session(
+    cmd: str,
+    cwd: str | None = None,
+    read_only: bool = False,
+    timeout: float | None = None,
+    *,
+    app_root: Path,
+    shell: ShellSession,
+    state: ToolState | None = None,
+) -> str:
+    """Run a command in a persistent ShellSession, with the same cwd, timeout and output bounds as _run_command."""
+    run_cwd = _resolve_cwd(cwd, app_root)
+    timeout = clamp_timeout(timeout)
+    stdout, stderr = (state or ToolState()).output_sinks()
+    try:
+        exit_code, out, err = shell.run(cmd, run_cwd, timeout, stdout, stderr)
     except Exception as e:
         return f"Error running command: {e}"
+    finally:
+        stdout.close()
+        stderr.close()
+    return _format_command_result(exit_code, out, err, timeout)
 
 
-def _read_file(path: str, app_root: Path) -> str:
-    """Read a file from app. Path is relative to the app root."""
+async def _arun_command(
+    cmd: str,
+    cwd: str | None = None,
+    read_only: bool = False,
+    timeout: float | None = None,
+    *,
+    app_root: Path,
+    state: ToolState | None = None,
+) -> str:
+    """Async variant of _run_command using an asyncio subprocess."""
+    run_cwd = _resolve_cwd(cwd, app_root)
+    timeout = clamp_timeout(timeout)
+    stdout, stderr = (state or ToolState()).output_sinks()
+    try:
+        returncode = await arun_bounded(cmd, run_cwd, timeout, stdout, stderr)
+    except Exception as e:
+        return f"Error running command: {e}"
+    finally:
+        stdout.close()
+        stderr.close()
+    return _format_command_result(returncode, stdout.text(), stderr.text(), timeout)
+
+
+# Most bytes a single read_file call returns; the rest is reachable with offset/limit
+READ_FILE_MAX_BYTES = 64_000
+# Files at least this large are memory-mapped, so only the requested lines are paged in
+MMAP_THRESHOLD_BYTES = 1 << 20
+
+
+def _slice_lines(buf, offset: int, limit: int | None, max_bytes: int) -> str:
+    """Lines offset.. (1-based, at most limit of them) of buf (bytes or mmap), capped at max_bytes.
+
+    Appends a marker with the next offset to read when the file continues past what is shown.
+    """
+    size = len(buf)
+    start = 0
+    for _ in range(offset - 1):
+        newline = buf.find(b"\n", start)
+        if newline < 0:
+            return f"Error: offset {offset} is past the end of the file"
+        start = newline + 1
+    if start >= size and offset > 1:
+        return f"Error: offset {offset} is past the end of the file"
+
+    end = size
+    if limit is not None:
+        end = start
+        for _ in range(limit):
+            newline = buf.find(b"\n", end)
+            if newline < 0:
+                end = size
+                break
+            end = newline + 1
+
+    cut_mid_line = False
+    if end - start > max_bytes:
+        newline = buf.rfind(b"\n", start, start + max_bytes)
+        cut_mid_line = newline < 0
+        end = start + max_bytes if cut_mid_line else newline + 1
+
+    text = bytes(buf[start:end]).decode("utf-8", errors="replace")
+    if end >= size:
+        return text
+    n_lines = text.count("\n") + (1 if cut_mid_line else 0)
+    last = offset + n_lines - 1
+    if cut_mid_line:
+        return f"{text}\n... [line {offset} is longer than {max_bytes} bytes; showing its first {max_bytes}] ..."
+    return (
+        f"{text}... [showing lines {offset}-{last} of a {size}-byte file; "
+        f"continue with offset={last + 1}] ..."
+    )
+
+
+def _read_file(path: str, app_root: Path, offset: int | None = None, limit: int | None = None) -> str:
+    """Read a file from app. Path is relative to the app root.
+
+    offset (1-based first line) and limit (number of lines) select a range; output is capped
+    at READ_FILE_MAX_BYTES with a marker saying where to continue.
+    """
+    if offset is not None and offset < 1:
+        return "Error: offset must be >= 1"
+    if limit is not None and limit < 1:
+        return "Error: limit must be >= 1"
     try:
         full = _resolve_app_path(path, app_root)
-        return full.read_text(encoding="utf-8", errors="replace")
+        with open(full, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return ""
+            if size < MMAP_THRESHOLD_BYTES:
+                return _slice_lines(f.read(), offset or 1, limit, READ_FILE_MAX_BYTES)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return _slice_lines(mapped, offset or 1, limit, READ_FILE_MAX_BYTES)
     except ValueError as e:
         return str(e)
     except FileNotFoundError:
@@ -59,12 +267,15 @@ def _read_file(path: str, app_root: Path) -> str:
         return f"Error reading file: {e}"
 
 
-def _write_file(path: str, contents: str, app_root: Path) -> str:
+def _write_file(path: str, contents: str, app_root: Path, state: ToolState | None = None) -> str:
     """Write contents to a file in app. Path is relative to the app root. Creates parent dirs if needed."""
     try:
         full = _resolve_app_path(path, app_root)
         full.parent.mkdir(parents=True, exist_ok=True)
-        full.write_text(contents, encoding="utf-8")
+        _replace_file(full, contents)
+        if state is not None:
+            size = len(contents.encode("utf-8"))
+            state.record_write(full.relative_to(app_root).as_posix(), size, size)
         return f"Wrote {path}"
     except ValueError as e:
         return str(e)
@@ -72,27 +283,282 @@ def _write_file(path: str, contents: str, app_root: Path) -> str:
         return f"Error writing file: {e}"
 
 
-def run_command(cmd: str, cwd: str | None = None) -> str:
+def _line_of(text: str, index: int) -> int:
+    return text.count("\n", 0, index) + 1
+
+
+def _closest_match_hint(text: str, old_string: str) -> str:
+    """Point at the line most similar to old_string's first line, e.g. when only whitespace differs."""
+    first = next((line.strip() for line in old_string.splitlines() if line.strip()), "")
+    if not first:
+        return ""
+    lines = text.splitlines()
+    close = difflib.get_close_matches(first, [line.strip() for line in lines], n=1, cutoff=0.6)
+    if not close:
+        return ""
+    line_no = next(i for i, line in enumerate(lines, 1) if line.strip() == close[0])
+    return (
+        f" The closest line is {line_no}: {lines[line_no - 1].strip()!r}."
+        " Re-read the file and copy the text exactly, including whitespace."
+    )
+
+
+def _edit_file(
+    path: str,
+    old_string: str,
+    new_string: str,
+    replace_all: bool = False,
+    *,
+    app_root: Path,
+    state: ToolState | None = None,
+) -> str:
+    """Replace an exact occurrence of old_string with new_string in a file in app.
+
+    old_string must occur exactly once unless replace_all is set; otherwise nothing is written
+    and the error says why (not found, with the closest line, or which lines match).
+    """
+    if not old_string:
+        return "Error: old_string is empty; use write_file to create a file"
+    if old_string == new_string:
+        return "Error: old_string and new_string are identical; nothing to change"
+    try:
+        full = _resolve_app_path(path, app_root)
+        # newline="" keeps CRLF line endings intact through the edit
+        with open(full, encoding="utf-8", newline="") as f:
+            text = f.read()
+    except UnicodeDecodeError:
+        # Before ValueError, of which it is a subclass
+        return f"Error: {path} is not UTF-8 text; use write_file"
+    except ValueError as e:
+        return str(e)
+    except FileNotFoundError:
+        return f"Error: file not found: {path}"
+    except IsADirectoryError:
+        return f"Error: path is a directory, not a file: {path}"
+    except Exception as e:
+        return f"Error reading file: {e}"
+
+    count = text.count(old_string)
+    if count == 0:
+        return f"Error: old_string not found in {path}.{_closest_match_hint(text, old_string)}"
+    if count > 1 and not replace_all:
+        lines, start = [], 0
+        while (index := text.find(old_string, start)) >= 0:
+            lines.append(str(_line_of(text, index)))
+            start = index + len(old_string)
+        return (
+            f"Error: old_string occurs {count} times in {path} (lines {', '.join(lines)}); "
+            "include more surrounding context to make it unique, or set replace_all=true"
+        )
+
+    first_line = _line_of(text, text.find(old_string))
+    updated = text.replace(old_string, new_string) if replace_all else text.replace(old_string, new_string, 1)
+    try:
+        _replace_file(full, updated)
+    except Exception as e:
+        return f"Error writing file: {e}"
+    if state is not None:
+        emitted = len(old_string.encode("utf-8")) + len(new_string.encode("utf-8"))
+        state.record_write(full.relative_to(app_root).as_posix(), emitted, len(updated.encode("utf-8")))
+    where = f"{count} occurrences" if count > 1 else f"line {first_line}"
+    return f"Edited {path} ({where})"
+
+
+def _search_code(
+    query: str,
+    regex: bool = False,
+    path_glob: str | None = None,
+    case_sensitive: bool = False,
+    max_results: int = DEFAULT_MAX_RESULTS,
+    *,
+    app_root: Path,
+    state: ToolState | None = None,
+) -> str:
+    """Search the app's text files for query; return ranked path:line matches."""
+    if not query:
+        return "Error: query is empty"
+    if state is None:
+        state = ToolState()
+    try:
+        results, total = state.code_index_for(app_root).search(
+            query, regex=regex, case_sensitive=case_sensitive, path_glob=path_glob, max_results=max_results
+        )
+    except re.error as e:
+        return f"Error: invalid regex: {e}"
+    return format_results(query, results, total)
+
+
+def _run_tests(
+    paths: list[str] | None = None,
+    keyword: str | None = None,
+    fail_fast: bool = False,
+    affected_only: bool = False,
+    *,
+    tests: PytestService,
+    app_root: Path,
+    state: ToolState | None = None,
+) -> str:
+    """Run the app's tests (optionally only some paths/node ids, or those matching keyword); return a summary.
+
+    With affected_only and no paths, only test files affected by the files written so far run;
+    the full suite runs if nothing was written or the selection can't be determined.
+    """
+    args = list(paths or [])
+    note = ""
+    if affected_only and not args and state is not None and state.touched_files:
+        if state.test_impact is None:
+            state.test_impact = TestImpactMap.build(app_root)
+        selected = state.test_impact.affected_tests(state.touched_files, app_root)
+        if selected == []:
+            return f"No tests are affected by the files written so far ({', '.join(sorted(state.touched_files))})"
+        if selected:
+            args = selected
+            note = f"\n(affected tests only: {', '.join(selected)})"
+    if keyword:
+        args += ["-k", keyword]
+    if fail_fast:
+        args.append("-x")
+    return format_run(tests.run(args)) + note
+
+
+# Keeps the APP_ROOT code index between calls of the module-level tools
+_DEFAULT_STATE = ToolState()
+
+
+def run_command(cmd: str, cwd: str | None = None, read_only: bool = False, timeout: float | None = None) -> str:
     """Run a shell command. Uses default APP_ROOT. For parameterized app_root, use get_tool_functions()."""
-    return _run_command(cmd, cwd, APP_ROOT)
+    return _run_command(cmd, cwd, read_only, timeout, app_root=APP_ROOT)
 
 
-def read_file(path: str) -> str:
+def read_file(path: str, offset: int | None = None, limit: int | None = None) -> str:
     """Read a file from ../app. Uses default APP_ROOT. For parameterized app_root, use get_tool_functions()."""
-    return _read_file(path, APP_ROOT)
+    return _read_file(path, APP_ROOT, offset, limit)
 
 
 def write_file(path: str, contents: str) -> str:
     """Write contents to a file in ../app. Uses default APP_ROOT. For parameterized app_root, use get_tool_functions()."""
-    return _write_file(path, contents, APP_ROOT)
+    return _write_file(path, contents, APP_ROOT, _DEFAULT_STATE)
+
+
+def search_code(
+    query: str,
+    regex: bool = False,
+    path_glob: str | None = None,
+    case_sensitive: bool = False,
+    max_results: int = DEFAULT_MAX_RESULTS,
+) -> str:
+    """Search files in ../app. Uses default APP_ROOT. For parameterized app_root, use get_tool_functions()."""
+    return _search_code(
+        query, regex, path_glob, case_sensitive, max_results, app_root=APP_ROOT, state=_DEFAULT_STATE
+    )
+
 
+def edit_file(path: str, old_string: str, new_string: str, replace_all: bool = False) -> str:
+    """Edit a file in ../app by exact string replacement. Uses default APP_ROOT."""
+    return _edit_file(path, old_string, new_string, replace_all, app_root=APP_ROOT, state=_DEFAULT_STATE)
 
-def get_tool_functions(app_root: Path) -> dict[str, callable]:
-    """Return tool functions bound to the given app_root for use by run_agent_task."""
+
+def run_tests(
+    paths: list[str] | None = None, keyword: str | None = None, fail_fast: bool = False, affected_only: bool = False
+) -> str:
+    """Run tests in ../app in a one-off process. For a warm, parameterized runner, use get_tool_functions()."""
+    return _run_tests(
+        paths, keyword, fail_fast, affected_only, tests=PytestService(APP_ROOT, warm=False), app_root=APP_ROOT
+    )
+
+
+def get_tool_functions(
+    app_root: Path,
+    shell: ShellSession | None = None,
+    tests: PytestService | None = None,
+    state: ToolState | None = None,
+) -> dict[str, callable]:
+    """Return tool functions bound to the given app_root for use by run_agent_task.
+
+    If shell is given, run_command executes in that persistent session instead of a new process.
+    If tests is given, run_tests uses that (warm) service; otherwise each run is a cold process.
+    If state is given, files written are recorded in it (and run_tests can select affected tests),
+    and its output budget and log dir bound run_command output.
+    """
     from functools import partial
 
+    if shell is not None:
+        run_command_fn = partial(_run_command_in_session, app_root=app_root, shell=shell, state=state)
+    else:
+        run_command_fn = partial(_run_command, app_root=app_root, state=state)
     return {
-        "run_command": partial(_run_command, app_root=app_root),
+        "run_command": run_command_fn,
         "read_file": partial(_read_file, app_root=app_root),
-        "write_file": partial(_write_file, app_root=app_root),
+        "write_file": partial(_write_file, app_root=app_root, state=state),
+        "edit_file": partial(_edit_file, app_root=app_root, state=state),
+        "search_code": partial(_search_code, app_root=app_root, state=state if state is not None else ToolState()),
+        "run_tests": partial(
+            _run_tests, tests=tests or PytestService(app_root, warm=False), app_root=app_root, state=state
+        ),
+    }
+
+
+def get_async_tool_functions(
+    app_root: Path,
+    shell: ShellSession | None = None,
+    tests: PytestService | None = None,
+    state: ToolState | None = None,
+) -> dict[str, callable]:
+    """Return coroutine tool functions bound to app_root for use by arun_agent_task.
+
+    Commands run as asyncio subprocesses (or in the persistent shell, via a thread, if given);
+    file I/O runs in the default thread pool.
+    """
+    from functools import partial
+
+    async def run_command_in_session(
+        cmd: str, cwd: str | None = None, read_only: bool = False, timeout: float | None = None
+    ) -> str:
+        return await asyncio.to_thread(
+            _run_command_in_session, cmd, cwd, read_only, timeout, app_root=app_root, shell=shell, state=state
+        )
+
+    async def read_file(path: str, offset: int | None = None, limit: int | None = None) -> str:
+        return await asyncio.to_thread(_read_file, path, app_root, offset, limit)
+
+    async def write_file(path: str, contents: str) -> str:
+        return await asyncio.to_thread(_write_file, path, contents, app_root, state)
+
+    async def edit_file(path: str, old_string: str, new_string: str, replace_all: bool = False) -> str:
+        return await asyncio.to_thread(
+            _edit_file, path, old_string, new_string, replace_all, app_root=app_root, state=state
+        )
+
+    search_state = state if state is not None else ToolState()
+
+    async def search_code(
+        query: str,
+        regex: bool = False,
+        path_glob: str | None = None,
+        case_sensitive: bool = False,
+        max_results: int = DEFAULT_MAX_RESULTS,
+    ) -> str:
+        return await asyncio.to_thread(
+            _search_code, query, regex, path_glob, case_sensitive, max_results, app_root=app_root, state=search_state
+        )
+
+    test_service = tests or PytestService(app_root, warm=False)
+
+    async def run_tests(
+        paths: list[str] | None = None, keyword: str | None = None, fail_fast: bool = False, affected_only: bool = False
+    ) -> str:
+        return await asyncio.to_thread(
+            _run_tests, paths, keyword, fail_fast, affected_only, tests=test_service, app_root=app_root, state=state
+        )
+
+    run_command_fn = (
+        run_command_in_session if shell is not None else partial(_arun_command, app_root=app_root, state=state)
+    )
+    return {
+        "run_command": run_command_fn,
+        "read_file": read_file,
+        "write_file": write_file,
+        "edit_file": edit_file,
+        "search_code": search_code,
+        "run_tests": run_tests,
     }
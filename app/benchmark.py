@@ -0,0 +1,83 @@
+"""Throughput of a running todo API under concurrent keep-alive clients.
+
+Start the app to measure (`uvicorn main:app` or `uvicorn main_async:app`), then:
+
+    python benchmark.py --port 8000 --clients 64 --requests 20000
+
+Each client holds one connection and sends requests back to back: a quarter creates, the rest
+reads of single todos and list pages. Prints requests per second, latency percentiles and the
+count of each non-2xx/304 status. Uses raw sockets so the client costs little next to the server.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+SEED_TODOS = 200
+
+
+async def _request(reader, writer, method: str, path: str, body: dict | None = None) -> tuple[int, bytes]:
+    data = json.dumps(body).encode() if body is not None else b""
+    head = f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n"
+    writer.write(head.encode() + data)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def run(host: str, port: int, clients: int, n_requests: int) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    ids = []
+    for i in range(SEED_TODOS):
+        _, body = await _request(reader, writer, "POST", "/todos", {"title": f"seed {i}"})
+        ids.append(json.loads(body)["id"])
+    writer.close()
+
+    counter = iter(range(n_requests))
+    latencies: list[float] = []
+    errors: dict[int, int] = {}
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        for i in counter:
+            start = time.perf_counter()
+            if i % 4 == 0:
+                status, _ = await _request(reader, writer, "POST", "/todos", {"title": "bench"})
+            elif i % 4 == 1:
+                status, _ = await _request(reader, writer, "GET", f"/todos?limit=20&after_id={ids[i % SEED_TODOS]}")
+            else:
+                status, _ = await _request(reader, writer, "GET", f"/todos/{ids[i % SEED_TODOS]}")
+            latencies.append(time.perf_counter() - start)
+            if status >= 300 and status != 304:
+                errors[status] = errors.get(status, 0) + 1
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests_per_sec": round(n_requests / elapsed),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 1),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.host, args.port, args.clients, args.requests))))
+
+
+if __name__ == "__main__":
+    main()
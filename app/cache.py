@@ -0,0 +1,151 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import Any, Hashable
+
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL_SEC = 30.0
+
+
+class LRUCache:
+    """Bounded mapping with a per-entry TTL, evicting the least recently used entry when full. Thread-safe."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_sec: float = CACHE_TTL_SEC):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_sec, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A rendered response body with its validators (and any extra headers, e.g. a page cursor)."""
+
+    body: bytes
+    headers: dict[str, str]
+
+
+def cached_response(body: bytes, **extra_headers: str) -> CachedResponse:
+    """Wrap body read from the database just now: the ETag hashes its content, so any worker or
+    script writing the row yields a different tag, and Last-Modified is the read time, which is
+    never earlier than the row's last change."""
+    headers = {
+        "ETag": f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"',
+        "Last-Modified": formatdate(time.time(), usegmt=True),
+        **extra_headers,
+    }
+    return CachedResponse(body, headers)
+
+
+class TodoCache:
+    """Cached single todos and list pages, as CachedResponses.
+
+    Every committed write calls invalidate, which drops the written todos and all list pages and
+    bumps the generation. Reads pass the generation they started at to put_todo / put_page, so
+    nothing read while a write was in flight is stored. A conditional GET is answered with 304
+    from a live entry only; otherwise the row is read and its content hash compared. Invalidation
+    only sees this process's writes: a write by another worker or a script is picked up once the
+    entry expires, so the TTL bounds how stale a response (or a 304) can be. Thread-safe, as
+    main.py's sync handlers run in the threadpool.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_sec: float = CACHE_TTL_SEC):
+        self.todos = LRUCache(max_entries, ttl_sec)
+        self.pages = LRUCache(max_entries, ttl_sec)
+        self.generation = 0
+        self.not_modified = 0
+        # Makes the generation check and the store in put_* atomic with respect to invalidate
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        """Drop all entries and counters."""
+        for cache in (self.todos, self.pages):
+            cache.clear()
+            cache.hits = cache.misses = 0
+        self.not_modified = 0
+
+    def put_todo(self, todo_id: int, response: CachedResponse, generation: int) -> None:
+        with self._lock:
+            if generation == self.generation:
+                self.todos.set(todo_id, response)
+
+    def put_page(self, key: Hashable, response: CachedResponse, generation: int) -> None:
+        with self._lock:
+            if generation == self.generation:
+                self.pages.set(key, response)
+
+    def record_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def invalidate(self, todo_ids: list[int]) -> None:
+        """Forget todo_ids and every list page; call after the write has been committed.
+
+        Pass the ids of updated and deleted todos; a create only changes the list pages.
+        """
+        with self._lock:
+            self.generation += 1
+            for todo_id in todo_ids:
+                self.todos.pop(todo_id)
+            self.pages.clear()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "todos": self.todos.stats(),
+            "pages": self.pages.stats(),
+            "not_modified": self.not_modified,
+            "ttl_sec": self.todos.ttl_sec,
+        }
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """True if an If-None-Match header value names etag (weak comparison, as for GET).
+
+    "*" is not a match: it would mean answering 304 without knowing the todo exists.
+    """
+    if not if_none_match:
+        return False
+    return etag.removeprefix("W/") in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+todo_cache = TodoCache()
@@ -1,13 +1,68 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./todo.db"
+DATABASE_PATH = "./todo.db"
+
+# Engine profile, chosen with TODO_DB_PROFILE. default: the driver's own SQLite settings (rollback
+# journal, writers block readers). production: WAL so readers and a writer run concurrently,
+# fsync only at checkpoints, wait on locks instead of failing, and a pool sized for concurrent requests
+DB_PROFILE_ENV = "TODO_DB_PROFILE"
+DB_PROFILES = {
+    "default": {"pragmas": {}, "pool": {}},
+    "production": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,  # ms
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -64 * 1024,  # negative: KiB rather than pages
+        },
+        "pool": {"pool_size": 4, "max_overflow": 0, "pool_timeout": 30},
+        # The sync engine needs a connection per threadpool worker (anyio's default is 40): with
+        # fewer, handlers waiting for a connection can hold every worker while the sessions that
+        # hold the connections wait for a worker to run get_db's cleanup
+        "sync_pool": {"pool_size": 40, "max_overflow": 0, "pool_timeout": 30},
+    },
+}
+
+
+def _set_pragmas(pragmas: dict):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return on_connect
+
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-)
+def create_engines(profile: str, path: str = DATABASE_PATH):
+    """Return (sync engine, async engine) on the SQLite file at path, configured per profile."""
+    if profile not in DB_PROFILES:
+        raise ValueError(f"Unknown {DB_PROFILE_ENV}: {profile} (expected one of {', '.join(DB_PROFILES)})")
+    settings = DB_PROFILES[profile]
+    sync_engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        **settings.get("sync_pool", settings["pool"]),
+    )
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", **settings["pool"])
+    if settings["pragmas"]:
+        for target in (sync_engine, async_engine.sync_engine):
+            event.listen(target, "connect", _set_pragmas(settings["pragmas"]))
+    return sync_engine, async_engine
+
+
+# main.py serves requests with sync handlers on engine (the default); main_async.py serves the
+# same API with async handlers on async_engine, so a request waiting on SQLite doesn't hold a
+# threadpool worker
+engine, async_engine = create_engines(os.environ.get(DB_PROFILE_ENV, "default"))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Attribute access after commit would lazy-load, which async sessions can't do implicitly
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
@@ -17,3 +72,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,25 +1,164 @@
+import json
 from contextlib import asynccontextmanager
 
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.orm import Session
 
+from cache import CachedResponse, cached_response, etag_matches, todo_cache
 from database import Base, engine, get_db
-from models import Todo, TodoCreate, TodoResponse
+from models import (
+    BulkError,
+    BulkResult,
+    Todo,
+    TodoBulkCreate,
+    TodoBulkDelete,
+    TodoBulkUpdate,
+    TodoCreate,
+    TodoListItem,
+    TodoResponse,
+)
+
+
+def _create_schema(conn) -> None:
+    Base.metadata.create_all(bind=conn)
+    # create_all skips indexes of tables that already exist
+    for index in Todo.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        _create_schema(conn)
     yield
 
 
 app = FastAPI(lifespan=lifespan)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+TODO_FIELDS = ("id", "title", "description", "completed")
+
+# OpenAPI for the handlers that return a cached Response (and so can't use response_model)
+VALIDATOR_HEADERS = {
+    "ETag": {"description": "Hash of the response body", "schema": {"type": "string"}},
+    "Last-Modified": {"description": "When the body was read from the database", "schema": {"type": "string"}},
+}
+NOT_MODIFIED = {304: {"description": "Not modified: If-None-Match names the current ETag", "headers": VALIDATOR_HEADERS}}
+LIST_RESPONSES = {
+    200: {
+        "model": list[TodoListItem],
+        "description": "A page of todos with the requested fields",
+        "headers": {
+            **VALIDATOR_HEADERS,
+            "X-Next-Cursor": {
+                "description": "after_id for the next page; absent on the last page",
+                "schema": {"type": "string"},
+            },
+        },
+    },
+    **NOT_MODIFIED,
+}
+TODO_RESPONSES = {200: {"model": TodoResponse, "description": "The todo", "headers": VALIDATOR_HEADERS}, **NOT_MODIFIED}
+
+# The parts of each endpoint that don't touch the session are shared with main_async.py
+
+
+def _conditional(cached: CachedResponse, if_none_match: str | None) -> Response:
+    """cached as a 200, or a bodiless 304 if the client already holds it."""
+    if etag_matches(if_none_match, cached.headers["ETag"]):
+        todo_cache.record_not_modified()
+        return Response(status_code=304, headers=cached.headers)
+    return Response(cached.body, media_type="application/json", headers=cached.headers)
+
+
+def _projection(fields: str | None) -> tuple[str, ...]:
+    """The columns a fields= parameter selects, in TODO_FIELDS order; id is always included."""
+    if not fields:
+        return TODO_FIELDS
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(TODO_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(f for f in TODO_FIELDS if f == "id" or f in requested)
+
+
+def _page_query(names: tuple[str, ...], limit: int, after_id: int | None, completed: bool | None):
+    # Only the selected columns, as plain rows: no ORM objects or per-row model validation.
+    # One row past the page tells whether there is a next one
+    query = select(*(getattr(Todo, name) for name in names))
+    if completed is not None:
+        query = query.where(Todo.completed == completed)
+    if after_id is not None:
+        query = query.where(Todo.id > after_id)
+    return query.order_by(Todo.id).limit(limit + 1)
+
+
+def _render_page(rows, names: tuple[str, ...], limit: int) -> CachedResponse:
+    extra = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        extra["X-Next-Cursor"] = str(rows[-1].id)
+    # Cached rendered, so a hit skips serialisation too
+    body = json.dumps([dict(zip(names, row)) for row in rows], ensure_ascii=False, separators=(",", ":"))
+    return cached_response(body.encode("utf-8"), **extra)
+
+
+def _render_todo(todo: Todo) -> CachedResponse:
+    return cached_response(TodoResponse.model_validate(todo).model_dump_json().encode("utf-8"))
+
+
+def _plan_update(payload: TodoBulkUpdate, existing: set[int]) -> tuple[list[dict], list[int], list[BulkError]]:
+    """Rows to write, ids updated and per-item errors for a bulk update."""
+    rows, ids, errors = [], [], []
+    for index, item in enumerate(payload.todos):
+        changes = item.model_dump(exclude_unset=True)
+        nulls = sorted(k for k in ("title", "completed") if k in changes and changes[k] is None)
+        if item.id not in existing:
+            errors.append(BulkError(index=index, id=item.id, detail="Todo not found"))
+        elif nulls:
+            errors.append(BulkError(index=index, id=item.id, detail=f"{', '.join(nulls)} may not be null"))
+        elif len(changes) > 1:
+            rows.append(changes)
+            ids.append(item.id)
+        else:
+            ids.append(item.id)
+    return rows, ids, errors
+
+
+def _plan_delete(payload: TodoBulkDelete, existing: set[int]) -> tuple[list[int], list[BulkError]]:
+    """Ids to delete (each once) and per-item errors for a bulk delete."""
+    ids, errors = [], []
+    for index, todo_id in enumerate(payload.ids):
+        if todo_id not in existing:
+            errors.append(BulkError(index=index, id=todo_id, detail="Todo not found"))
+        elif todo_id not in ids:
+            ids.append(todo_id)
+    return ids, errors
+
 
-@app.get("/todos", response_model=list[TodoResponse])
-def list_todos(db: Session = Depends(get_db)):
-    todos = db.query(Todo).all()
-    return [TodoResponse.model_validate(t) for t in todos]
+@app.get("/todos", response_class=Response, responses=LIST_RESPONSES)
+def list_todos(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after_id: int | None = Query(None, description="Cursor: only todos with a greater id"),
+    completed: bool | None = None,
+    fields: str | None = Query(None, description="Comma-separated fields to return; id is always included"),
+    if_none_match: str | None = Header(None),
+    db: Session = Depends(get_db),
+):
+    """A page of todos in id order. If there are more, X-Next-Cursor holds the after_id for the next page.
+
+    Pages are served from todo_cache until the next write here or the entry expires.
+    """
+    names = _projection(fields)
+    key = (limit, after_id, completed, names)
+    generation = todo_cache.generation
+    page = todo_cache.pages.get(key)
+    if page is None:
+        page = _render_page(db.execute(_page_query(names, limit, after_id, completed)).all(), names, limit)
+        todo_cache.put_page(key, page, generation)
+    return _conditional(page, if_none_match)
 
 
 @app.post("/todos", response_model=TodoResponse, status_code=201)
@@ -31,36 +170,102 @@ def create_todo(todo: TodoCreate, db: Session = Depends(get_db)):
     )
     db.add(db_todo)
     db.commit()
+    todo_cache.invalidate([])
     db.refresh(db_todo)
     return TodoResponse.model_validate(db_todo)
 
 
-@app.get("/todos/{todo_id}", response_model=TodoResponse)
-def get_todo(todo_id: int, db: Session = Depends(get_db)):
-    todo = db.query(Todo).filter(Todo.id == todo_id).first()
-    if todo is None:
-        raise HTTPException(status_code=404, detail="Todo not found")
-    return TodoResponse.model_validate(todo)
+# Bulk routes are declared before /todos/{todo_id} so "bulk" isn't taken for an id
+
+
+def _existing_ids(db: Session, ids: list[int]) -> set[int]:
+    return set(db.scalars(select(Todo.id).where(Todo.id.in_(set(ids)))))
+
+
+def _bulk_outcome(db: Session, ids: list[int], errors: list[BulkError], atomic: bool) -> BulkResult:
+    """Commit and report, or with atomic and any errors, roll back and reject the whole request."""
+    if errors and atomic:
+        db.rollback()
+        raise HTTPException(status_code=422, detail=[e.model_dump() for e in errors])
+    db.commit()
+    todo_cache.invalidate(ids)
+    return BulkResult(ids=ids, errors=errors)
+
+
+@app.post("/todos/bulk", response_model=BulkResult, status_code=201)
+def create_todos(payload: TodoBulkCreate, db: Session = Depends(get_db)):
+    """Create all todos in one transaction with a single executemany INSERT; returns their ids in order.
+
+    Every item is validated before anything is written, so this is always all or nothing.
+    """
+    rows = [todo.model_dump() for todo in payload.todos]
+    # One multi-row INSERT ... RETURNING. Rows get increasing ids in VALUES order, but RETURNING
+    # order is unspecified: sort rather than ask for sort_by_parameter_order, which on SQLite
+    # falls back to a statement per row
+    ids = sorted(db.scalars(insert(Todo).returning(Todo.id), rows).all())
+    db.commit()
+    todo_cache.invalidate([])
+    return BulkResult(ids=ids)
+
+
+@app.patch("/todos/bulk", response_model=BulkResult)
+def update_todos(payload: TodoBulkUpdate, db: Session = Depends(get_db)):
+    """Apply partial updates (only the fields given per item) in one transaction."""
+    rows, ids, errors = _plan_update(payload, _existing_ids(db, [item.id for item in payload.todos]))
+    if rows and not (errors and payload.atomic):
+        # ORM bulk UPDATE by primary key: one executemany per distinct set of fields
+        db.execute(update(Todo), rows)
+    return _bulk_outcome(db, ids, errors, payload.atomic)
+
+
+@app.delete("/todos/bulk", response_model=BulkResult)
+def delete_todos(payload: TodoBulkDelete, db: Session = Depends(get_db)):
+    """Delete todos by id in one statement."""
+    ids, errors = _plan_delete(payload, _existing_ids(db, payload.ids))
+    if ids and not (errors and payload.atomic):
+        db.execute(delete(Todo).where(Todo.id.in_(ids)))
+    return _bulk_outcome(db, ids, errors, payload.atomic)
+
+
+@app.get("/todos/{todo_id}", response_class=Response, responses=TODO_RESPONSES)
+def get_todo(todo_id: int, if_none_match: str | None = Header(None), db: Session = Depends(get_db)):
+    generation = todo_cache.generation
+    cached = todo_cache.todos.get(todo_id)
+    if cached is None:
+        todo = db.get(Todo, todo_id)
+        if todo is None:
+            raise HTTPException(status_code=404, detail="Todo not found")
+        cached = _render_todo(todo)
+        todo_cache.put_todo(todo_id, cached, generation)
+    return _conditional(cached, if_none_match)
 
 
 @app.put("/todos/{todo_id}", response_model=TodoResponse)
 def update_todo(todo_id: int, todo: TodoCreate, db: Session = Depends(get_db)):
-    db_todo = db.query(Todo).filter(Todo.id == todo_id).first()
+    db_todo = db.get(Todo, todo_id)
     if db_todo is None:
         raise HTTPException(status_code=404, detail="Todo not found")
     db_todo.title = todo.title
     db_todo.description = todo.description
     db_todo.completed = todo.completed
     db.commit()
+    todo_cache.invalidate([todo_id])
     db.refresh(db_todo)
     return TodoResponse.model_validate(db_todo)
 
 
 @app.delete("/todos/{todo_id}", status_code=204)
 def delete_todo(todo_id: int, db: Session = Depends(get_db)):
-    db_todo = db.query(Todo).filter(Todo.id == todo_id).first()
+    db_todo = db.get(Todo, todo_id)
     if db_todo is None:
         raise HTTPException(status_code=404, detail="Todo not found")
     db.delete(db_todo)
     db.commit()
+    todo_cache.invalidate([todo_id])
     return None
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters and sizes of the todo and list page caches."""
+    return todo_cache.stats()
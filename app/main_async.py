@@ -0,0 +1,176 @@
+"""The todo API on the async stack: the routes of main.py as async handlers on an aiosqlite session.
+
+Serve it with `uvicorn main_async:app`. A handler awaiting SQLite yields the event loop instead of
+holding one of the threadpool workers that main.py's sync handlers run on, which pays off with many
+concurrent connections. Tests override get_async_db, as they override get_db for main.py.
+"""
+
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import todo_cache
+from database import async_engine, get_async_db
+from main import (
+    DEFAULT_PAGE_SIZE,
+    LIST_RESPONSES,
+    MAX_PAGE_SIZE,
+    TODO_RESPONSES,
+    _conditional,
+    _create_schema,
+    _page_query,
+    _plan_delete,
+    _plan_update,
+    _projection,
+    _render_page,
+    _render_todo,
+)
+from models import (
+    BulkError,
+    BulkResult,
+    Todo,
+    TodoBulkCreate,
+    TodoBulkDelete,
+    TodoBulkUpdate,
+    TodoCreate,
+    TodoResponse,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with async_engine.begin() as conn:
+        await conn.run_sync(_create_schema)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.get("/todos", response_class=Response, responses=LIST_RESPONSES)
+async def list_todos(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after_id: int | None = Query(None, description="Cursor: only todos with a greater id"),
+    completed: bool | None = None,
+    fields: str | None = Query(None, description="Comma-separated fields to return; id is always included"),
+    if_none_match: str | None = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """A page of todos in id order. If there are more, X-Next-Cursor holds the after_id for the next page.
+
+    Pages are served from todo_cache until the next write here or the entry expires.
+    """
+    names = _projection(fields)
+    key = (limit, after_id, completed, names)
+    generation = todo_cache.generation
+    page = todo_cache.pages.get(key)
+    if page is None:
+        rows = (await db.execute(_page_query(names, limit, after_id, completed))).all()
+        page = _render_page(rows, names, limit)
+        todo_cache.put_page(key, page, generation)
+    return _conditional(page, if_none_match)
+
+
+@app.post("/todos", response_model=TodoResponse, status_code=201)
+async def create_todo(todo: TodoCreate, db: AsyncSession = Depends(get_async_db)):
+    db_todo = Todo(
+        title=todo.title,
+        description=todo.description,
+        completed=todo.completed,
+    )
+    db.add(db_todo)
+    await db.commit()
+    todo_cache.invalidate([])
+    return TodoResponse.model_validate(db_todo)
+
+
+# Bulk routes are declared before /todos/{todo_id} so "bulk" isn't taken for an id
+
+
+async def _existing_ids(db: AsyncSession, ids: list[int]) -> set[int]:
+    return set(await db.scalars(select(Todo.id).where(Todo.id.in_(set(ids)))))
+
+
+async def _bulk_outcome(db: AsyncSession, ids: list[int], errors: list[BulkError], atomic: bool) -> BulkResult:
+    """Commit and report, or with atomic and any errors, roll back and reject the whole request."""
+    if errors and atomic:
+        await db.rollback()
+        raise HTTPException(status_code=422, detail=[e.model_dump() for e in errors])
+    await db.commit()
+    todo_cache.invalidate(ids)
+    return BulkResult(ids=ids, errors=errors)
+
+
+@app.post("/todos/bulk", response_model=BulkResult, status_code=201)
+async def create_todos(payload: TodoBulkCreate, db: AsyncSession = Depends(get_async_db)):
+    """Create all todos in one transaction with a single executemany INSERT; returns their ids in order."""
+    rows = [todo.model_dump() for todo in payload.todos]
+    ids = sorted((await db.scalars(insert(Todo).returning(Todo.id), rows)).all())
+    await db.commit()
+    todo_cache.invalidate([])
+    return BulkResult(ids=ids)
+
+
+@app.patch("/todos/bulk", response_model=BulkResult)
+async def update_todos(payload: TodoBulkUpdate, db: AsyncSession = Depends(get_async_db)):
+    """Apply partial updates (only the fields given per item) in one transaction."""
+    rows, ids, errors = _plan_update(payload, await _existing_ids(db, [item.id for item in payload.todos]))
+    if rows and not (errors and payload.atomic):
+        await db.execute(update(Todo), rows)
+    return await _bulk_outcome(db, ids, errors, payload.atomic)
+
+
+@app.delete("/todos/bulk", response_model=BulkResult)
+async def delete_todos(payload: TodoBulkDelete, db: AsyncSession = Depends(get_async_db)):
+    """Delete todos by id in one statement."""
+    ids, errors = _plan_delete(payload, await _existing_ids(db, payload.ids))
+    if ids and not (errors and payload.atomic):
+        await db.execute(delete(Todo).where(Todo.id.in_(ids)))
+    return await _bulk_outcome(db, ids, errors, payload.atomic)
+
+
+@app.get("/todos/{todo_id}", response_class=Response, responses=TODO_RESPONSES)
+async def get_todo(
+    todo_id: int, if_none_match: str | None = Header(None), db: AsyncSession = Depends(get_async_db)
+):
+    generation = todo_cache.generation
+    cached = todo_cache.todos.get(todo_id)
+    if cached is None:
+        todo = await db.get(Todo, todo_id)
+        if todo is None:
+            raise HTTPException(status_code=404, detail="Todo not found")
+        cached = _render_todo(todo)
+        todo_cache.put_todo(todo_id, cached, generation)
+    return _conditional(cached, if_none_match)
+
+
+@app.put("/todos/{todo_id}", response_model=TodoResponse)
+async def update_todo(todo_id: int, todo: TodoCreate, db: AsyncSession = Depends(get_async_db)):
+    db_todo = await db.get(Todo, todo_id)
+    if db_todo is None:
+        raise HTTPException(status_code=404, detail="Todo not found")
+    db_todo.title = todo.title
+    db_todo.description = todo.description
+    db_todo.completed = todo.completed
+    await db.commit()
+    todo_cache.invalidate([todo_id])
+    return TodoResponse.model_validate(db_todo)
+
+
+@app.delete("/todos/{todo_id}", status_code=204)
+async def delete_todo(todo_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_todo = await db.get(Todo, todo_id)
+    if db_todo is None:
+        raise HTTPException(status_code=404, detail="Todo not found")
+    await db.delete(db_todo)
+    await db.commit()
+    todo_cache.invalidate([todo_id])
+    return None
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and sizes of the todo and list page caches."""
+    return todo_cache.stats()
@@ -1,7 +1,10 @@
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, Index, Integer, String
 
 from database import Base
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+# Most todos one bulk request may carry
+MAX_BULK_ITEMS = 1000
 
 
 class Todo(Base):
@@ -12,6 +15,9 @@ class Todo(Base):
     description = Column(String, nullable=True)
     completed = Column(Boolean, default=False, nullable=False)
 
+    # Serves GET /todos?completed=...: filter, then walk ids in order from the cursor
+    __table_args__ = (Index("ix_todos_completed_id", "completed", "id"),)
+
 
 class TodoCreate(BaseModel):
     title: str
@@ -26,3 +32,48 @@ class TodoResponse(BaseModel):
     completed: bool
 
     model_config = {"from_attributes": True}
+
+
+class TodoListItem(BaseModel):
+    """A todo in GET /todos: only id and the fields asked for with fields= are present."""
+
+    id: int
+    title: str | None = None
+    description: str | None = None
+    completed: bool | None = None
+
+
+class TodoPatch(BaseModel):
+    """One item of PATCH /todos/bulk: the todo's id and the fields to change."""
+
+    id: int
+    title: str | None = None
+    description: str | None = None
+    completed: bool | None = None
+
+
+class TodoBulkCreate(BaseModel):
+    todos: list[TodoCreate] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+
+
+class TodoBulkUpdate(BaseModel):
+    todos: list[TodoPatch] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+    # All or nothing; if false, valid items are applied and the rest reported in errors
+    atomic: bool = True
+
+
+class TodoBulkDelete(BaseModel):
+    ids: list[int] = Field(min_length=1, max_length=MAX_BULK_ITEMS)
+    atomic: bool = True
+
+
+class BulkError(BaseModel):
+    index: int
+    id: int | None = None
+    detail: str
+
+
+class BulkResult(BaseModel):
+    # Ids created, updated or deleted, in request order
+    ids: list[int]
+    errors: list[BulkError] = []
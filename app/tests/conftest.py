@@ -1,14 +1,19 @@
+import asyncio
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
-from database import Base, get_db
+from cache import todo_cache
+from database import Base, get_async_db, get_db
 from models import Todo  # noqa: F401 - register Todo with Base
 
 
 TEST_DATABASE_URL = "sqlite:///:memory:"
+TEST_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
 test_engine = create_engine(
     TEST_DATABASE_URL,
@@ -19,6 +24,18 @@ TestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_eng
 
 Base.metadata.create_all(bind=test_engine)
 
+# main_async.py's in-memory database (a separate one: each stack keeps its own connection)
+test_async_engine = create_async_engine(TEST_ASYNC_DATABASE_URL, poolclass=StaticPool)
+TestAsyncSessionLocal = async_sessionmaker(test_async_engine, autoflush=False, expire_on_commit=False)
+
+
+async def _create_tables():
+    async with test_async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+asyncio.run(_create_tables())
+
 
 def get_db_test():
     db = TestSessionLocal()
@@ -28,11 +45,49 @@ def get_db_test():
         db.close()
 
 
+async def get_async_db_test():
+    async with TestAsyncSessionLocal() as db:
+        yield db
+
+
+@pytest.fixture(params=["sync", "async"])
+def stack(request):
+    """Which app the client fixture serves: main.py (sync) or main_async.py (async)."""
+    return request.param
+
+
 @pytest.fixture
-def client():
-    from main import app
+def run_sql(stack):
+    """Run a statement on the stack's test database directly, bypassing the app and its cache."""
+
+    def run(statement):
+        if stack == "sync":
+            with TestSessionLocal() as db:
+                db.execute(statement)
+                db.commit()
+            return
+
+        async def execute():
+            async with TestAsyncSessionLocal() as db:
+                await db.execute(statement)
+                await db.commit()
+
+        asyncio.run(execute())
+
+    return run
+
+
+@pytest.fixture
+def client(stack):
+    if stack == "sync":
+        from main import app
+
+        app.dependency_overrides[get_db] = get_db_test
+    else:
+        from main_async import app
 
-    app.dependency_overrides[get_db] = get_db_test
+        app.dependency_overrides[get_async_db] = get_async_db_test
+    todo_cache.clear()
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
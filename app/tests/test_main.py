@@ -1,3 +1,12 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text, update
+
+from database import create_engines
+from models import MAX_BULK_ITEMS, Todo
+
+
 def test_create_todo_and_retrieve_it(client):
     """Create a Todo item and then retrieve it to verify it exists."""
     response = client.post(
@@ -23,3 +32,269 @@ def test_create_todo_and_retrieve_it(client):
     assert retrieved["title"] == "Test"
     assert retrieved["description"] == "Test description"
     assert retrieved["completed"] is False
+
+
+def _create_todos(client, n, completed=False):
+    return [
+        client.post("/todos", json={"title": f"Todo {i}", "completed": completed}).json()["id"] for i in range(n)
+    ]
+
+
+def test_list_todos_pages_with_cursor(client):
+    """Walk the todos created here page by page via X-Next-Cursor."""
+    ids = _create_todos(client, 5)
+    start = ids[0] - 1
+
+    first = client.get("/todos", params={"limit": 2, "after_id": start})
+    assert first.status_code == 200
+    assert [t["id"] for t in first.json()] == ids[:2]
+    cursor = first.headers["X-Next-Cursor"]
+    assert cursor == str(ids[1])
+
+    second = client.get("/todos", params={"limit": 2, "after_id": cursor})
+    assert [t["id"] for t in second.json()] == ids[2:4]
+
+    last = client.get("/todos", params={"limit": 10, "after_id": ids[3]})
+    assert [t["id"] for t in last.json()] == ids[4:]
+    assert "X-Next-Cursor" not in last.headers
+
+
+def test_list_todos_filters_on_completed(client):
+    open_ids = _create_todos(client, 2)
+    done_ids = _create_todos(client, 2, completed=True)
+    start = open_ids[0] - 1
+
+    done = client.get("/todos", params={"completed": True, "after_id": start}).json()
+    assert [t["id"] for t in done] == done_ids
+    assert all(t["completed"] is True for t in done)
+
+    not_done = client.get("/todos", params={"completed": False, "after_id": start}).json()
+    assert [t["id"] for t in not_done] == open_ids
+
+
+def test_list_todos_projects_fields(client):
+    ids = _create_todos(client, 1)
+
+    todos = client.get("/todos", params={"fields": "title", "after_id": ids[0] - 1}).json()
+    assert todos == [{"id": ids[0], "title": "Todo 0"}]
+
+    response = client.get("/todos", params={"fields": "title,owner"})
+    assert response.status_code == 422
+
+
+def test_list_todos_openapi_describes_projections(client):
+    spec = client.get("/openapi.json").json()
+    assert spec["components"]["schemas"]["TodoListItem"]["required"] == ["id"]
+    responses = spec["paths"]["/todos"]["get"]["responses"]
+    assert "X-Next-Cursor" in responses["200"]["headers"]
+    assert "304" in responses
+
+
+def test_list_todos_caps_limit(client):
+    assert client.get("/todos", params={"limit": 0}).status_code == 422
+    assert client.get("/todos", params={"limit": 100_000}).status_code == 422
+
+
+def test_bulk_create_returns_ids_in_order(client):
+    response = client.post(
+        "/todos/bulk",
+        json={"todos": [{"title": "First"}, {"title": "Second", "description": "d", "completed": True}]},
+    )
+    assert response.status_code == 201
+    ids = response.json()["ids"]
+    assert len(ids) == 2 and ids[0] < ids[1]
+    assert client.get(f"/todos/{ids[0]}").json()["title"] == "First"
+    second = client.get(f"/todos/{ids[1]}").json()
+    assert second["description"] == "d" and second["completed"] is True
+
+
+def test_bulk_create_rejects_invalid_items(client):
+    before = client.get("/todos", params={"limit": 1000}).json()
+    response = client.post("/todos/bulk", json={"todos": [{"title": "Ok"}, {"description": "no title"}]})
+    assert response.status_code == 422
+    assert client.get("/todos", params={"limit": 1000}).json() == before
+
+
+def test_bulk_update_applies_partial_changes(client):
+    ids = _create_todos(client, 2)
+    response = client.patch(
+        "/todos/bulk",
+        json={"todos": [{"id": ids[0], "completed": True}, {"id": ids[1], "title": "Renamed"}]},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"ids": ids, "errors": []}
+    first, second = (client.get(f"/todos/{i}").json() for i in ids)
+    assert first["completed"] is True and first["title"] == "Todo 0"
+    assert second["title"] == "Renamed" and second["completed"] is False
+
+
+def test_bulk_update_atomic_rejects_all_on_error(client):
+    ids = _create_todos(client, 1)
+    missing = ids[0] + 1_000_000
+    response = client.patch(
+        "/todos/bulk", json={"todos": [{"id": ids[0], "title": "Changed"}, {"id": missing, "title": "x"}]}
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"] == [{"index": 1, "id": missing, "detail": "Todo not found"}]
+    assert client.get(f"/todos/{ids[0]}").json()["title"] == "Todo 0"
+
+
+def test_bulk_update_non_atomic_reports_failures(client):
+    ids = _create_todos(client, 1)
+    missing = ids[0] + 1_000_000
+    response = client.patch(
+        "/todos/bulk",
+        json={
+            "todos": [{"id": ids[0], "title": "Changed"}, {"id": missing}, {"id": ids[0], "title": None}],
+            "atomic": False,
+        },
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["ids"] == ids
+    assert [(e["index"], e["id"]) for e in body["errors"]] == [(1, missing), (2, ids[0])]
+    assert client.get(f"/todos/{ids[0]}").json()["title"] == "Changed"
+
+
+def test_bulk_delete(client):
+    ids = _create_todos(client, 3)
+    missing = ids[-1] + 1_000_000
+
+    atomic = client.request("DELETE", "/todos/bulk", json={"ids": [ids[0], missing]})
+    assert atomic.status_code == 422
+    assert client.get(f"/todos/{ids[0]}").status_code == 200
+
+    response = client.request("DELETE", "/todos/bulk", json={"ids": [ids[0], ids[1], missing], "atomic": False})
+    assert response.status_code == 200
+    assert response.json()["ids"] == ids[:2]
+    assert response.json()["errors"] == [{"index": 2, "id": missing, "detail": "Todo not found"}]
+    assert client.get(f"/todos/{ids[0]}").status_code == 404
+    assert client.get(f"/todos/{ids[1]}").status_code == 404
+    assert client.get(f"/todos/{ids[2]}").status_code == 200
+
+
+
+def test_bulk_requests_are_bounded(client):
+    assert client.post("/todos/bulk", json={"todos": []}).status_code == 422
+    too_many = [{"title": "x"}] * (MAX_BULK_ITEMS + 1)
+    assert client.post("/todos/bulk", json={"todos": too_many}).status_code == 422
+    assert client.request("DELETE", "/todos/bulk", json={"ids": list(range(1, MAX_BULK_ITEMS + 2))}).status_code == 422
+    response = client.post("/todos/bulk", json={"todos": [{"title": "x"}] * MAX_BULK_ITEMS})
+    assert response.status_code == 201
+    assert len(response.json()["ids"]) == MAX_BULK_ITEMS
+
+
+def test_bulk_writes_invalidate_cached_reads(client):
+    ids = _create_todos(client, 2)
+    etag = client.get(f"/todos/{ids[0]}").headers["ETag"]
+    page = client.get("/todos", params={"after_id": ids[0] - 1}).json()
+    client.patch("/todos/bulk", json={"todos": [{"id": ids[0], "title": "Renamed"}]})
+    response = client.get(f"/todos/{ids[0]}", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.json()["title"] == "Renamed"
+    client.request("DELETE", "/todos/bulk", json={"ids": [ids[1]]})
+    assert [t["id"] for t in client.get("/todos", params={"after_id": ids[0] - 1}).json()] == [ids[0]]
+    assert len(page) == 2
+
+def _pragmas(conn):
+    return [conn.execute(text(f"PRAGMA {name}")).scalar() for name in ("journal_mode", "synchronous", "busy_timeout")]
+
+
+def test_production_profile_sets_pragmas_on_both_engines(tmp_path):
+    sync_engine, async_engine = create_engines("production", str(tmp_path / "todo.db"))
+
+    async def async_pragmas():
+        async with async_engine.connect() as conn:
+            return await conn.run_sync(_pragmas)
+
+    try:
+        with sync_engine.connect() as conn:
+            assert _pragmas(conn) == ["wal", 1, 5000]  # synchronous: 1 is NORMAL
+        assert asyncio.run(async_pragmas()) == ["wal", 1, 5000]
+        # One connection per threadpool worker for sync handlers; async handlers share a few
+        assert (sync_engine.pool.size(), async_engine.pool.size()) == (40, 4)
+    finally:
+        sync_engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+
+def test_default_profile_keeps_driver_settings(tmp_path):
+    sync_engine, async_engine = create_engines("default", str(tmp_path / "todo.db"))
+    try:
+        with sync_engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+    finally:
+        sync_engine.dispose()
+        asyncio.run(async_engine.dispose())
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="TODO_DB_PROFILE"):
+        create_engines("fast")
+
+
+def test_get_todo_etag_and_not_modified(client):
+    todo_id = _create_todos(client, 1)[0]
+    first = client.get(f"/todos/{todo_id}")
+    etag = first.headers["ETag"]
+    assert "Last-Modified" in first.headers
+
+    again = client.get(f"/todos/{todo_id}", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+
+    client.put(f"/todos/{todo_id}", json={"title": "Changed", "completed": True})
+    changed = client.get(f"/todos/{todo_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["title"] == "Changed"
+    assert changed.headers["ETag"] != etag
+
+    client.delete(f"/todos/{todo_id}")
+    gone = client.get(f"/todos/{todo_id}", headers={"If-None-Match": changed.headers["ETag"]})
+    assert gone.status_code == 404
+
+
+def test_external_write_is_seen_once_the_entry_expires(client, run_sql):
+    """A write the cache never heard of (another worker, a script) must not keep earning 304s."""
+    from cache import todo_cache
+
+    todo_id = _create_todos(client, 1)[0]
+    etag = client.get(f"/todos/{todo_id}").headers["ETag"]
+    run_sql(update(Todo).where(Todo.id == todo_id).values(title="Changed elsewhere"))
+
+    todo_cache.todos.clear()  # as if the entry had expired
+    response = client.get(f"/todos/{todo_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Changed elsewhere"
+    assert response.headers["ETag"] != etag
+
+
+def test_cache_serves_repeat_reads_and_counts(client):
+    todo_id = _create_todos(client, 1)[0]
+    params = {"after_id": todo_id - 1}
+    for _ in range(3):
+        client.get(f"/todos/{todo_id}")
+        client.get("/todos", params=params)
+
+    stats = client.get("/cache/stats").json()
+    assert (stats["todos"]["misses"], stats["todos"]["hits"]) == (1, 2)
+    assert (stats["pages"]["misses"], stats["pages"]["hits"]) == (1, 2)
+
+
+def test_writes_invalidate_cached_pages(client):
+    ids = _create_todos(client, 2)
+    params = {"after_id": ids[0] - 1}
+    page = client.get("/todos", params=params)
+    etag = page.headers["ETag"]
+    assert client.get("/todos", params=params, headers={"If-None-Match": etag}).status_code == 304
+
+    new_id = client.post("/todos", json={"title": "New"}).json()["id"]
+    after_create = client.get("/todos", params=params, headers={"If-None-Match": etag})
+    assert after_create.status_code == 200
+    assert [t["id"] for t in after_create.json()] == ids + [new_id]
+
+    client.patch("/todos/bulk", json={"todos": [{"id": ids[0], "completed": True}]})
+    assert client.get("/todos", params=params).json()[0]["completed"] is True
+    assert client.get(f"/todos/{ids[0]}").json()["completed"] is True
+
+    client.request("DELETE", "/todos/bulk", json={"ids": [ids[1]]})
+    assert [t["id"] for t in client.get("/todos", params=params).json()] == [ids[0], new_id]
@@ -3,6 +3,32 @@
 from .types import SuiteResult, TaskResult, TrialResult
 
 
+def percentile(values: list[float], q: float) -> float:
+    """Linearly interpolated q-th percentile (0-100) of values; 0.0 if empty."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    lo = int(rank)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+
+
+def test_stats(trials: list[TrialResult]) -> tuple[dict[str, float], list[str]]:
+    """Per-test pass rate across trials, and the tests that both passed and failed (flaky).
+
+    Trials without per-test results, and skipped tests, are ignored.
+    """
+    runs: dict[str, list[bool]] = {}
+    for t in trials:
+        for test in t.outcome.tests or []:
+            if test["outcome"] != "skipped":
+                runs.setdefault(test["nodeid"], []).append(test["outcome"] == "passed")
+    pass_rates = {nodeid: sum(results) / len(results) for nodeid, results in sorted(runs.items())}
+    flaky = [nodeid for nodeid, rate in pass_rates.items() if 0.0 < rate < 1.0]
+    return pass_rates, flaky
+
+
 def aggregate_task(task_id: str, trials: list[TrialResult]) -> TaskResult:
     """Aggregate trials for a single task."""
     if not trials:
@@ -23,6 +49,22 @@ def aggregate_task(task_id: str, trials: list[TrialResult]) -> TaskResult:
     mean_tool_calls = sum(t.trajectory.n_tool_calls for t in trials) / n
     mean_tokens = sum(t.trajectory.usage.get("total_tokens", 0) for t in trials) / n
     mean_latency_sec = sum(t.trajectory.latency_sec for t in trials) / n
+    phases = sorted({phase for t in trials for phase in t.timings})
+    mean_timings = {phase: sum(t.timings.get(phase, 0.0) for t in trials) / n for phase in phases}
+    calls = [call for t in trials for call in t.trajectory.llm_calls]
+    call_latencies = [call["latency_sec"] for call in calls]
+    ttfts = [call.get("ttft_sec", call["latency_sec"]) for call in calls]
+    tool_leads = [
+        call["latency_sec"] - call["time_to_first_tool_sec"]
+        for call in calls
+        if call.get("time_to_first_tool_sec") is not None
+    ]
+    total_prompt_tokens = sum(t.trajectory.usage.get("prompt_tokens", 0) for t in trials)
+    total_cached_tokens = sum(t.trajectory.usage.get("cached_tokens", 0) for t in trials)
+    trial_scores = [
+        sum(gr.score for gr in t.grader_results) / len(t.grader_results) if t.grader_results else 0.0 for t in trials
+    ]
+    test_pass_rates, flaky_tests = test_stats(trials)
 
     return TaskResult(
         task_id=task_id,
@@ -32,6 +74,21 @@ def aggregate_task(task_id: str, trials: list[TrialResult]) -> TaskResult:
         mean_tool_calls=mean_tool_calls,
         mean_tokens=mean_tokens,
         mean_latency_sec=mean_latency_sec,
+        mean_timings=mean_timings,
+        total_tokens=sum(t.trajectory.usage.get("total_tokens", 0) for t in trials),
+        total_prompt_tokens=total_prompt_tokens,
+        total_completion_tokens=sum(t.trajectory.usage.get("completion_tokens", 0) for t in trials),
+        total_cached_tokens=total_cached_tokens,
+        prompt_cache_hit_rate=total_cached_tokens / total_prompt_tokens if total_prompt_tokens else 0.0,
+        n_llm_calls=len(call_latencies),
+        llm_call_p50_sec=percentile(call_latencies, 50),
+        llm_call_p95_sec=percentile(call_latencies, 95),
+        llm_ttft_p50_sec=percentile(ttfts, 50),
+        mean_tool_lead_sec=sum(tool_leads) / len(tool_leads) if tool_leads else 0.0,
+        mean_compaction_tokens_saved=sum(t.trajectory.compaction_tokens_saved for t in trials) / n,
+        mean_score=sum(trial_scores) / n,
+        test_pass_rates=test_pass_rates,
+        flaky_tests=flaky_tests,
     )
 
 
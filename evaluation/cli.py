@@ -1,26 +1,100 @@
 """CLI for running evaluations."""
 
 import argparse
+import asyncio
 import json
+import logging
 import sys
 from datetime import datetime
 from pathlib import Path
 
-# Ensure project root on path
+# Ensure project root on path, and agent/ for the agent's top-level imports (see runner.py)
 _PROJECT_ROOT = Path(__file__).resolve().parent.parent
-if str(_PROJECT_ROOT) not in sys.path:
-    sys.path.insert(0, str(_PROJECT_ROOT))
+for _path in (_PROJECT_ROOT, _PROJECT_ROOT / "agent"):
+    if str(_path) not in sys.path:
+        sys.path.insert(0, str(_path))
 
+from agent.backends import AsyncScriptedBackend, ScriptedBackend
+from agent.llm_cache import CACHE_MODES, AsyncCachedCompletions, CachedCompletions, ResponseCache
 from evaluation.aggregate import aggregate_suite, aggregate_task
 from evaluation.config import (
+    DEFAULT_BACKEND,
+    DEFAULT_COMMAND_OUTPUT_BUDGET,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_LLM_CACHE_MODE,
     DEFAULT_MAX_TURNS,
     DEFAULT_MODEL,
+    DEFAULT_SCRIPT,
+    DEFAULT_TEST_SELECTION,
     DEFAULT_TIMEOUT_SEC,
+    DEFAULT_TOKEN_BUDGET,
     DEFAULT_TRIALS_PER_TASK,
+    DEFAULT_WORKSPACE_MODE,
+    LLM_CACHE_PATH,
     RESULTS_DIR,
 )
+from evaluation.environment import cache_stats
 from evaluation.loader import load_suite
-from evaluation.runner import run_task
+from evaluation.outcome import TEST_SELECTION_MODES
+from evaluation.runner import arun_tasks, run_tasks
+from evaluation.storage import RUN_FILE, load_completed, save_trial, write_json_atomic
+from evaluation.workspace import WORKSPACE_MODES
+
+
+def _summary(suite_id: str, run_id: str, task_results: list, complete: bool) -> dict:
+    suite_result = aggregate_suite(suite_id, task_results)
+    return {
+        "suite_id": suite_id,
+        "run_id": run_id,
+        "complete": complete,
+        "overall_pass_rate": suite_result.overall_pass_rate,
+        "tasks": [
+            {
+                "task_id": tr.task_id,
+                "pass_rate": tr.pass_rate,
+                "mean_turns": tr.mean_turns,
+                "mean_tool_calls": tr.mean_tool_calls,
+                "mean_tokens": tr.mean_tokens,
+                "mean_latency_sec": tr.mean_latency_sec,
+                "mean_timings": tr.mean_timings,
+                "total_tokens": tr.total_tokens,
+                "total_prompt_tokens": tr.total_prompt_tokens,
+                "total_completion_tokens": tr.total_completion_tokens,
+                "total_cached_tokens": tr.total_cached_tokens,
+                "prompt_cache_hit_rate": tr.prompt_cache_hit_rate,
+                "n_llm_calls": tr.n_llm_calls,
+                "llm_call_p50_sec": tr.llm_call_p50_sec,
+                "llm_call_p95_sec": tr.llm_call_p95_sec,
+                "llm_ttft_p50_sec": tr.llm_ttft_p50_sec,
+                "mean_tool_lead_sec": tr.mean_tool_lead_sec,
+                "mean_compaction_tokens_saved": tr.mean_compaction_tokens_saved,
+                "mean_score": tr.mean_score,
+                "test_pass_rates": tr.test_pass_rates,
+                "flaky_tests": tr.flaky_tests,
+            }
+            for tr in task_results
+        ],
+    }
+
+
+def _run_config(args: argparse.Namespace, suite_id: str) -> dict:
+    """The settings that shape a run's results, recorded in run.json; a resume must repeat them."""
+    scripted = args.backend == "scripted"
+    return {
+        "suite_id": suite_id,
+        "trials": args.trials,
+        "model": args.model,
+        "max_turns": args.max_turns,
+        "timeout_sec": args.timeout,
+        "backend": args.backend,
+        "script": str(args.script) if scripted else None,
+        "backend_latency_sec": args.backend_latency if scripted else None,
+        "token_budget": args.token_budget,
+        "stream": args.stream,
+        "persistent_shell": args.persistent_shell,
+        "outcome_tests": args.outcome_tests,
+        "command_output_budget": args.command_output_budget,
+    }
 
 
 def main():
@@ -32,100 +106,215 @@ def main():
     parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS, help="Max agent turns per trial")
     parser.add_argument("--model", "-m", default=DEFAULT_MODEL, help="Model name")
     parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT_SEC, help="Timeout per trial (seconds)")
+    parser.add_argument(
+        "--concurrency", "-j", type=int, default=DEFAULT_CONCURRENCY, help="Max trials running at once across all tasks"
+    )
+    parser.add_argument(
+        "--workspace-mode",
+        choices=WORKSPACE_MODES,
+        default=DEFAULT_WORKSPACE_MODE,
+        help="How trial app copies are materialised",
+    )
+    parser.add_argument(
+        "--warm-workspaces", type=int, default=None, help="Workspaces to prepare ahead of time (default: concurrency)"
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Drive all trials from one asyncio event loop (concurrency becomes an in-flight limit)",
+    )
+    parser.add_argument(
+        "--llm-cache",
+        choices=CACHE_MODES,
+        default=DEFAULT_LLM_CACHE_MODE,
+        help="record: store LLM responses; replay: serve only recorded responses (offline); passthrough: no cache",
+    )
+    parser.add_argument("--llm-cache-path", type=Path, default=LLM_CACHE_PATH, help="SQLite file for recorded responses")
+    parser.add_argument(
+        "--backend",
+        choices=("openai", "scripted"),
+        default=DEFAULT_BACKEND,
+        help="Model backend: the OpenAI API or a local scripted policy (no network)",
+    )
+    parser.add_argument("--script", type=Path, default=DEFAULT_SCRIPT, help="Policy YAML for --backend scripted")
+    parser.add_argument(
+        "--backend-latency", type=float, default=None, help="Artificial latency per scripted LLM call (seconds)"
+    )
+    parser.add_argument(
+        "--token-budget",
+        type=int,
+        default=DEFAULT_TOKEN_BUDGET,
+        help="Compact the prompt when it exceeds this many (estimated) tokens; 0 disables compaction",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream completions and start each tool call as soon as its arguments are complete",
+    )
+    parser.add_argument(
+        "--persistent-shell",
+        action="store_true",
+        help="Run each trial's commands in one long-lived shell with the app virtualenv activated",
+    )
+    parser.add_argument(
+        "--warm-pytest",
+        action="store_true",
+        help="Serve the agent's run_tests tool and outcome capture from a warm, pre-imported pytest worker",
+    )
+    parser.add_argument(
+        "--outcome-tests",
+        choices=TEST_SELECTION_MODES,
+        default=DEFAULT_TEST_SELECTION,
+        help="Tests run for grading: the full suite, or only those affected by the agent's file writes",
+    )
+    parser.add_argument(
+        "--command-output-budget",
+        type=int,
+        default=DEFAULT_COMMAND_OUTPUT_BUDGET,
+        help="Bytes of each command's stdout and stderr shown to the agent (the head and tail are kept)",
+    )
+    parser.add_argument(
+        "--spill-command-logs",
+        action="store_true",
+        help="Write command output that overflows the budget in full to each trial's commands/ directory",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        default=None,
+        help="Continue an interrupted run in <output>/RUN_ID, skipping trials already saved there",
+    )
     args = parser.parse_args()
+    if args.backend == "scripted" and args.llm_cache != "passthrough":
+        parser.error("--llm-cache only applies to --backend openai")
+
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger("evaluation").setLevel(logging.INFO)
 
     #load the suite
     suite_id, tasks = load_suite(args.suite)
 
-    #create the output directory
-    run_id = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    out_dir = Path(args.output) / run_id
-    out_dir.mkdir(parents=True, exist_ok=True)
+    #create the output directory, or reopen the one being resumed; its run.json is never rewritten,
+    #as it records what the saved trials were run with
+    config = _run_config(args, suite_id)
+    if args.resume:
+        run_id = args.resume
+        out_dir = Path(args.output) / run_id
+        if not (out_dir / RUN_FILE).exists():
+            parser.error(f"--resume: no run {run_id} in {args.output}")
+        previous = json.loads((out_dir / RUN_FILE).read_text())
+        mismatched = [
+            f"{key}={previous[key]!r} (now {value!r})" if key in previous else f"{key} (not recorded)"
+            for key, value in config.items()
+            if previous.get(key, object()) != value
+        ]
+        if mismatched:
+            parser.error(f"--resume: run {run_id} was run with different settings: {', '.join(mismatched)}")
+        completed = load_completed(out_dir, tasks, args.trials)
+    else:
+        run_id = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        out_dir = Path(args.output) / run_id
+        out_dir.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(out_dir / RUN_FILE, {"run_id": run_id, **config})
+        completed = {}
 
     print(f"Suite: {suite_id} ({len(tasks)} tasks)")
     print(f"Trials per task: {args.trials}")
+    print(f"Concurrency: {args.concurrency}")
+    print(f"Backend: {args.backend}" + (f" ({args.script})" if args.backend == "scripted" else ""))
+    print(f"LLM cache: {args.llm_cache}")
     print(f"Output: {out_dir}")
+    if args.resume:
+        print(f"Resuming: {len(completed)} of {len(tasks) * args.trials} trials already complete")
     print()
 
-    task_results = []
-    for task in tasks:
-        print(f"Running task: {task.id} ({task.name})")
-        trials = run_task(
-            task,
-            n_trials=args.trials,
-            model=args.model,
-            max_turns=args.max_turns,
-            timeout_sec=args.timeout,
-        )
+    #each trial is saved as soon as it finishes; each task is aggregated once all of its trials
+    #have, and the summary rewritten so an interrupted run still leaves one behind
+    results_by_task = {}
 
-        #save the results of the trial
-        task_out = out_dir / task.id
-        task_out.mkdir(parents=True, exist_ok=True)
-        for i, tr in enumerate(trials):
-            trial_dir = task_out / f"trial_{i}"
-            trial_dir.mkdir(parents=True, exist_ok=True)
-            (trial_dir / "trajectory.json").write_text(
-                json.dumps(
-                    {
-                        "messages": tr.trajectory.messages,
-                        "n_turns": tr.trajectory.n_turns,
-                        "n_tool_calls": tr.trajectory.n_tool_calls,
-                        "usage": tr.trajectory.usage,
-                        "latency_sec": tr.trajectory.latency_sec,
-                        "finished": tr.trajectory.finished,
-                    },
-                    indent=2,
-                )
-            )
-            (trial_dir / "outcome.json").write_text(
-                json.dumps(
-                    {
-                        "pytest_exit_code": tr.outcome.pytest_exit_code,
-                        "pytest_stdout": tr.outcome.pytest_stdout,
-                        "pytest_stderr": tr.outcome.pytest_stderr,
-                        "db_todos": tr.outcome.db_todos,
-                    },
-                    indent=2,
-                )
-            )
-            (trial_dir / "grader_results.json").write_text(
-                json.dumps(
-                    [
-                        {"grader_name": gr.grader_name, "passed": gr.passed, "score": gr.score, "details": gr.details}
-                        for gr in tr.grader_results
-                    ],
-                    indent=2,
-                )
-            )
-
-        #aggregate the results of the trial
+    def record(task, trials):
         tr_agg = aggregate_task(task.id, trials)
-        task_results.append(tr_agg)
-        print(f" {tr_agg.pass_rate:.0%} passed, mean turns={tr_agg.mean_turns:.1f}, mean latency={tr_agg.mean_latency_sec:.1f}s")
+        results_by_task[task.id] = tr_agg
+        print(f"Finished task: {task.id} ({task.name})")
+        print(
+            f" {tr_agg.pass_rate:.0%} passed (mean score {tr_agg.mean_score:.2f}), "
+            f"mean turns={tr_agg.mean_turns:.1f}, mean latency={tr_agg.mean_latency_sec:.1f}s"
+        )
+        print(
+            f" tokens={tr_agg.total_tokens} ({tr_agg.prompt_cache_hit_rate:.0%} of prompt cached), "
+            f"llm calls={tr_agg.n_llm_calls}, "
+            f"llm latency p50={tr_agg.llm_call_p50_sec:.2f}s p95={tr_agg.llm_call_p95_sec:.2f}s, "
+            f"ttft p50={tr_agg.llm_ttft_p50_sec:.2f}s, tool lead={tr_agg.mean_tool_lead_sec:.2f}s"
+        )
+        print(" mean phase times: " + ", ".join(f"{k}={v:.2f}s" for k, v in tr_agg.mean_timings.items()))
+        if tr_agg.flaky_tests:
+            print(f" flaky tests: {', '.join(tr_agg.flaky_tests)}")
+        for tr in trials:
+            if tr.error is not None:
+                print(f" trial {tr.trial_index} errored: {tr.error}")
+        finished = [results_by_task[t.id] for t in tasks if t.id in results_by_task]
+        write_json_atomic(out_dir / "summary.json", _summary(suite_id, run_id, finished, complete=False))
+
+    #every trial gets its own backend; recorded responses are shared through one cache file
+    llm_cache = None
+    backend_factory = None
+    if args.backend == "scripted":
+        scripted_cls = AsyncScriptedBackend if args.use_async else ScriptedBackend
+        scripted = scripted_cls.from_yaml(args.script, latency_sec=args.backend_latency)
+        backend_factory = lambda: scripted  # noqa: E731
+    elif args.llm_cache != "passthrough":
+        llm_cache = ResponseCache(args.llm_cache_path)
+        cached_cls = AsyncCachedCompletions if args.use_async else CachedCompletions
+        backend_factory = lambda: cached_cls(llm_cache, args.llm_cache)  # noqa: E731
+
+    #run trials for all tasks on a shared worker pool (or one event loop with --async)
+    run_kwargs = dict(
+        n_trials=args.trials,
+        concurrency=args.concurrency,
+        workspace_mode=args.workspace_mode,
+        warm_workspaces=args.warm_workspaces,
+        model=args.model,
+        max_turns=args.max_turns,
+        timeout_sec=args.timeout,
+        backend_factory=backend_factory,
+        agent_options={
+            "token_budget": args.token_budget or None,
+            "persistent_shell": args.persistent_shell,
+            "output_budget": args.command_output_budget,
+            "stream": args.stream,
+        },
+        warm_pytest=args.warm_pytest,
+        test_selection=args.outcome_tests,
+        output_dir=out_dir if args.spill_command_logs else None,
+        completed=completed,
+        on_trial=lambda tr: save_trial(out_dir, tr),
+    )
+    if args.use_async:
+
+        async def drive():
+            async for task, trials in arun_tasks(tasks, **run_kwargs):
+                record(task, trials)
+
+        asyncio.run(drive())
+    else:
+        for task, trials in run_tasks(tasks, **run_kwargs):
+            record(task, trials)
+
+    #keep suite order regardless of completion order
+    task_results = [results_by_task[task.id] for task in tasks]
 
     #aggregate the results of the suite
     suite_result = aggregate_suite(suite_id, task_results)
-
-    summary = {
-        "suite_id": suite_id,
-        "run_id": run_id,
-        "overall_pass_rate": suite_result.overall_pass_rate,
-        "tasks": [
-            {
-                "task_id": tr.task_id,
-                "pass_rate": tr.pass_rate,
-                "mean_turns": tr.mean_turns,
-                "mean_tool_calls": tr.mean_tool_calls,
-                "mean_tokens": tr.mean_tokens,
-                "mean_latency_sec": tr.mean_latency_sec,
-            }
-            for tr in task_results
-        ],
-    }
-    (out_dir / "summary.json").write_text(json.dumps(summary, indent=2))
+    write_json_atomic(out_dir / "summary.json", _summary(suite_id, run_id, task_results, complete=True))
 
     print()
     print(f"Overall pass rate: {suite_result.overall_pass_rate:.1%}")
+    env_stats = cache_stats()
+    print(f"App env cache: {env_stats['hits']} hits, {env_stats['misses']} misses")
+    if llm_cache is not None:
+        print(f"LLM cache: {llm_cache.hits} hits, {llm_cache.misses} misses ({llm_cache.path})")
+        llm_cache.close()
     print(f"Summary: {out_dir / 'summary.json'}")
     return 0 if suite_result.overall_pass_rate >= 1.0 else 1
 
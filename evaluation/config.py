@@ -14,7 +14,25 @@ DEFAULT_MAX_TURNS = 50
 DEFAULT_TIMEOUT_SEC = 600.0
 DEFAULT_TRIALS_PER_TASK = 3
 DEFAULT_CONCURRENCY = 1
+DEFAULT_WORKSPACE_MODE = "auto"
+DEFAULT_LLM_CACHE_MODE = "passthrough"
+DEFAULT_BACKEND = "openai"
+DEFAULT_TOKEN_BUDGET = 32_000
+DEFAULT_TEST_SELECTION = "full"
+# Bytes of each command output stream the agent sees (head and tail)
+DEFAULT_COMMAND_OUTPUT_BUDGET = 32_000
 
 # Results output
 RESULTS_DIR = EVALUATION_DIR / "results"
 SUITES_DIR = EVALUATION_DIR / "suites"
+SCRIPTS_DIR = EVALUATION_DIR / "scripts"
+DEFAULT_SCRIPT = SCRIPTS_DIR / "smoke.yaml"
+
+# Pre-installed app virtualenvs, one per app lockfile hash
+APP_ENV_CACHE_DIR = EVALUATION_DIR / ".cache" / "app_envs"
+
+# Test impact maps, one per app baseline
+TEST_IMPACT_CACHE_DIR = EVALUATION_DIR / ".cache" / "test_impact"
+
+# Recorded LLM responses for record/replay runs
+LLM_CACHE_PATH = EVALUATION_DIR / ".cache" / "llm_responses.sqlite"
@@ -0,0 +1,98 @@
+"""Pre-installed app environments: one virtualenv per app lockfile, linked into each trial copy."""
+
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+
+from .config import APP_ENV_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Files that determine the app's installed dependencies
+LOCK_FILES = ("pyproject.toml", "poetry.lock")
+READY_MARKER = ".ready"
+
+# Never copied into a trial: the environment is linked, caches are rebuilt on demand
+SOURCE_IGNORE = shutil.ignore_patterns(".venv", "__pycache__", ".pytest_cache")
+
+_build_lock = threading.Lock()
+_failed_keys: set[str] = set()
+_stats = {"hits": 0, "misses": 0, "failures": 0}
+
+
+def lockfile_hash(app_root: Path) -> str:
+    """Hash the app's dependency spec (pyproject.toml + poetry.lock)."""
+    h = hashlib.sha256()
+    for name in LOCK_FILES:
+        path = app_root / name
+        h.update(name.encode())
+        h.update(path.read_bytes() if path.exists() else b"")
+    return h.hexdigest()
+
+
+def ensure_app_env(app_root: Path, cache_dir: Path = APP_ENV_CACHE_DIR) -> Path | None:
+    """Return a virtualenv with the app's dependencies installed, building it on first use.
+
+    Environments are cached per lockfile hash, so only the first trial of a run (or the
+    first run after a lockfile change) pays for `poetry install`. Returns None if the
+    environment could not be built; callers should fall back to installing in place.
+    """
+    key = lockfile_hash(app_root)[:16]
+    env_root = cache_dir / key
+    venv = env_root / ".venv"
+
+    with _build_lock:
+        if (env_root / READY_MARKER).exists() and venv.is_dir():
+            _stats["hits"] += 1
+            logger.info("App env cache hit: %s", key)
+            return venv
+        if key in _failed_keys:
+            return None
+
+        _stats["misses"] += 1
+        logger.info("App env cache miss: %s, building %s", key, venv)
+        # Virtualenvs embed absolute paths, so build in place; a partial build has no marker
+        if env_root.exists():
+            shutil.rmtree(env_root, ignore_errors=True)
+        env_root.mkdir(parents=True, exist_ok=True)
+        for name in LOCK_FILES:
+            if (app_root / name).exists():
+                shutil.copy2(app_root / name, env_root / name)
+
+        try:
+            result = subprocess.run(
+                ["poetry", "install", "--no-interaction", "--no-root"],
+                cwd=env_root,
+                capture_output=True,
+                text=True,
+                timeout=600,
+                env={**os.environ, "POETRY_VIRTUALENVS_IN_PROJECT": "true"},
+            )
+            error = (result.stderr or result.stdout).strip() if result.returncode != 0 else None
+        except (OSError, subprocess.TimeoutExpired) as e:
+            error = str(e)
+        if error is not None or not venv.is_dir():
+            _stats["failures"] += 1
+            _failed_keys.add(key)
+            logger.warning("Failed to build app env %s: %s", key, error or "no .venv created")
+            return None
+
+        (env_root / READY_MARKER).write_text(key)
+        return venv
+
+
+def link_app_env(trial_app: Path, venv: Path) -> None:
+    """Expose a cached virtualenv as trial_app/.venv, which `poetry run` picks up automatically."""
+    link = trial_app / ".venv"
+    if link.is_symlink() or link.exists():
+        return
+    link.symlink_to(venv, target_is_directory=True)
+
+
+def cache_stats() -> dict[str, int]:
+    """Return app env cache hit/miss counters for this process."""
+    return dict(_stats)
@@ -1,14 +1,26 @@
-"""Grader: pass if pytest exits with 0."""
+"""Grader: pass if pytest exits with 0; score is the fraction of tests that passed."""
 
 from ..types import GraderResult, Outcome, Task, Trajectory
 
 
 def grade(*, trajectory: Trajectory, outcome: Outcome, task: Task) -> GraderResult:
-    """Pass if pytest_exit_code == 0."""
+    """Pass if pytest_exit_code == 0. Partial credit by passed/total when per-test results exist."""
     passed = outcome.pytest_exit_code == 0
+    details = {"pytest_exit_code": outcome.pytest_exit_code}
+    score = 1.0 if passed else 0.0
+
+    # Skipped tests count neither way
+    ran = [t for t in outcome.tests or [] if t["outcome"] != "skipped"]
+    if ran:
+        n_passed = sum(1 for t in ran if t["outcome"] == "passed")
+        score = n_passed / len(ran)
+        details["tests_passed"] = n_passed
+        details["tests_total"] = len(ran)
+        details["failed_tests"] = [t["nodeid"] for t in ran if t["outcome"] != "passed"]
+
     return GraderResult(
         grader_name="deterministic_tests",
         passed=passed,
-        score=1.0 if passed else 0.0,
-        details={"pytest_exit_code": outcome.pytest_exit_code},
+        score=score,
+        details=details,
     )
@@ -2,20 +2,112 @@
 
 import sqlite3
 import subprocess
+import tempfile
+import xml.etree.ElementTree as ET
 from pathlib import Path
+from typing import TYPE_CHECKING, Any
 
 from .types import Outcome
 
+if TYPE_CHECKING:
+    from agent.pytest_service import PytestService
+    from agent.test_impact import TestImpactMap
 
-def capture_outcome(app_root: Path) -> Outcome:
-    """Run pytest in the app copy and optionally capture DB state. Returns Outcome."""
-    pytest_result = subprocess.run(
-        ["poetry", "run", "pytest", "-v"],
-        cwd=app_root,
-        capture_output=True,
-        text=True,
-        timeout=120,
-    )
+# full: always run the whole suite; affected: only test files affected by the files that differ
+# from the baseline (the whole suite when that can't be determined or selects nothing)
+TEST_SELECTION_MODES = ("full", "affected")
+
+# pytest output kept in Outcome (the tail, where the summary is); per-test results carry the detail
+MAX_PYTEST_OUTPUT_CHARS = 4_000
+# Failure text kept per failing test
+MAX_FAILURE_MESSAGE_CHARS = 500
+
+
+def _tail(text: str, keep_chars: int) -> str:
+    if len(text) <= keep_chars:
+        return text
+    return f"... [{len(text) - keep_chars} characters elided] ...\n{text[-keep_chars:]}"
+
+
+def _test_record(nodeid: str, outcome: str, duration: float, message: str | None = None) -> dict[str, Any]:
+    record: dict[str, Any] = {"nodeid": nodeid, "outcome": outcome, "duration": round(duration, 4)}
+    if message and outcome in ("failed", "error"):
+        record["message"] = message[-MAX_FAILURE_MESSAGE_CHARS:]
+    return record
+
+
+def parse_junit_xml(path: Path) -> list[dict[str, Any]]:
+    """Per-test results (nodeid, outcome, duration, message) from a pytest JUnit XML report.
+
+    Expects junit_family=xunit1, whose testcase elements carry the test file path.
+    """
+    tests = []
+    for case in ET.parse(path).getroot().iter("testcase"):
+        file = case.get("file") or ""
+        name = case.get("name", "")
+        # classname is the dotted module path, followed by the class for tests in a class
+        module = file.removesuffix(".py").replace("/", ".")
+        classname = case.get("classname", "")
+        scope = classname[len(module) + 1 :] if module and classname.startswith(module) else ""
+        if file and not classname and name == module:
+            nodeid = file  # collection error for a whole test file
+        else:
+            nodeid = "::".join(part for part in (file or classname, *scope.split("."), name) if part)
+
+        outcome, message = "passed", None
+        for child in case:
+            if child.tag in ("failure", "error"):
+                outcome = "failed" if child.tag == "failure" else "error"
+                message = child.get("message") or child.text
+                break
+            if child.tag == "skipped":
+                outcome = "skipped"
+        tests.append(_test_record(nodeid, outcome, float(case.get("time") or 0.0), message))
+    return tests
+
+
+def capture_outcome(
+    app_root: Path,
+    pytest_service: "PytestService | None" = None,
+    *,
+    files_changed: list[str] | None = None,
+    test_impact: "TestImpactMap | None" = None,
+) -> Outcome:
+    """Run pytest in the app copy and optionally capture DB state. Returns Outcome.
+
+    Per-test results come from the trial's warm pytest_service if given, otherwise from a JUnit
+    XML report written by a cold `poetry run pytest` process. With test_impact and files_changed,
+    only the affected test files run; if none (or an unknown set) are affected, the full suite runs.
+    """
+    selected = None
+    if test_impact is not None and files_changed:
+        selected = test_impact.affected_tests(files_changed, app_root) or None
+
+    tests: list[dict[str, Any]] | None = None
+    if pytest_service is not None:
+        run = pytest_service.run(["-q", *(selected or [])], timeout=120)
+        # A timed-out run has no exit code; -1 keeps it distinct from every pytest exit status
+        pytest_exit_code = -1 if run.exit_code is None else run.exit_code
+        pytest_stdout, pytest_stderr = run.output, ""
+        tests = [_test_record(t["nodeid"], t["outcome"], t["duration"], t.get("longrepr")) for t in run.tests]
+    else:
+        with tempfile.TemporaryDirectory(prefix="eval_junit_") as tmp:
+            report = Path(tmp) / "junit.xml"
+            pytest_result = subprocess.run(
+                ["poetry", "run", "pytest", "-q", f"--junitxml={report}", "-o", "junit_family=xunit1"]
+                + (selected or []),
+                cwd=app_root,
+                capture_output=True,
+                text=True,
+                timeout=120,
+            )
+            if report.exists():
+                try:
+                    tests = parse_junit_xml(report)
+                except ET.ParseError:
+                    pass
+        pytest_exit_code = pytest_result.returncode
+        pytest_stdout, pytest_stderr = pytest_result.stdout or "", pytest_result.stderr or ""
 
     db_todos: list[dict] | None = None
     db_path = app_root / "todo.db"
@@ -31,8 +123,11 @@ def capture_outcome(app_root: Path) -> Outcome:
             pass
 
     return Outcome(
-        pytest_exit_code=pytest_result.returncode,
-        pytest_stdout=pytest_result.stdout or "",
-        pytest_stderr=pytest_result.stderr or "",
+        pytest_exit_code=pytest_exit_code,
+        pytest_stdout=_tail(pytest_stdout, MAX_PYTEST_OUTPUT_CHARS),
+        pytest_stderr=_tail(pytest_stderr, MAX_PYTEST_OUTPUT_CHARS),
         db_todos=db_todos,
+        files_changed=files_changed,
+        tests=tests,
+        test_selection="full" if selected is None else "affected",
     )
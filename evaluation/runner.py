@@ -1,20 +1,37 @@
 """Run tasks: create app copy, run agent, capture outcome, run graders."""
 
-import shutil
+import asyncio
 import sys
-import tempfile
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Any
 
-from .config import APP_DIR, DEFAULT_MAX_TURNS, DEFAULT_MODEL, DEFAULT_TIMEOUT_SEC
+from .config import (
+    APP_DIR,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MAX_TURNS,
+    DEFAULT_MODEL,
+    DEFAULT_TEST_SELECTION,
+    DEFAULT_TIMEOUT_SEC,
+    DEFAULT_WORKSPACE_MODE,
+    TEST_IMPACT_CACHE_DIR,
+)
 from .outcome import capture_outcome
 from .types import GraderResult, Outcome, Task, Trajectory, TrialResult
+from .workspace import WorkspacePool, changed_files
 
-# Ensure project root is on path so we can import agent
+# Ensure project root is on path so we can import agent; agent modules import each other
+# as top-level modules (they also run as scripts from agent/), so agent/ goes on the path too
 _PROJECT_ROOT = Path(__file__).resolve().parent.parent
-if str(_PROJECT_ROOT) not in sys.path:
-    sys.path.insert(0, str(_PROJECT_ROOT))
+for _path in (_PROJECT_ROOT, _PROJECT_ROOT / "agent"):
+    if str(_path) not in sys.path:
+        sys.path.insert(0, str(_path))
 
-from agent.main import run_agent_task  # noqa: E402
+from agent.main import SYSTEM_PROMPT, RunResult, arun_agent_task, run_agent_task  # noqa: E402
+from agent.pytest_service import PytestService  # noqa: E402
+from agent.test_impact import TestImpactMap  # noqa: E402
 
 
 def _get_grader(name: str):
@@ -29,82 +46,410 @@ def _get_grader(name: str):
     return graders.get(name)
 
 
+def _system_prompt(task: Task) -> str:
+    # Same bytes as the agent's default prompt, so trials share a cacheable prompt prefix
+    return task.system_prompt_override or SYSTEM_PROMPT
+
+
+def _command_log_dir(output_dir: Path | None, task: Task, trial_index: int) -> Path | None:
+    return output_dir / task.id / f"trial_{trial_index}" / "commands" if output_dir is not None else None
+
+
+def _finish_trial(
+    task: Task,
+    trial_index: int,
+    result: RunResult,
+    trial_app: Path,
+    timings: dict[str, float],
+    pytest_service: PytestService | None = None,
+    test_impact: TestImpactMap | None = None,
+    baseline: Path | None = None,
+) -> TrialResult:
+    """Capture outcome from the trial's workspace and run the task's graders.
+
+    With test_impact and baseline, only tests affected by the files that differ from baseline run
+    (however they were changed: write tools or shell commands). Adds outcome_sec and grading_sec
+    to timings.
+    """
+    trajectory = Trajectory(
+        messages=result.messages,
+        n_turns=result.n_turns,
+        n_tool_calls=result.n_tool_calls,
+        usage=result.usage,
+        latency_sec=result.latency_sec,
+        finished=result.finished,
+        llm_calls=result.llm_calls,
+        compaction_tokens_saved=result.compaction_tokens_saved,
+        bytes_emitted=result.bytes_emitted,
+        bytes_written=result.bytes_written,
+    )
+
+    start = time.perf_counter()
+    # Not result.files_changed: that only lists files written by the agent's write tools
+    files_changed = changed_files(baseline, trial_app) if baseline is not None else None
+    outcome = capture_outcome(trial_app, pytest_service, files_changed=files_changed, test_impact=test_impact)
+    timings["outcome_sec"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    grader_results: list[GraderResult] = []
+    for grader_name in task.graders:
+        grader_fn = _get_grader(grader_name)
+        if grader_fn:
+            gr = grader_fn(trajectory=trajectory, outcome=outcome, task=task)
+            grader_results.append(gr)
+    timings["grading_sec"] = time.perf_counter() - start
+
+    return TrialResult(
+        task_id=task.id,
+        trial_index=trial_index,
+        trajectory=trajectory,
+        outcome=outcome,
+        grader_results=grader_results,
+        timings=timings,
+    )
+
+
 def run_trial(
     task: Task,
     trial_index: int,
     *,
     app_baseline: Path | None = None,
+    workspaces: WorkspacePool | None = None,
     model: str = DEFAULT_MODEL,
     max_turns: int = DEFAULT_MAX_TURNS,
     timeout_sec: float | None = DEFAULT_TIMEOUT_SEC,
+    backend_factory: Callable[[], Any] | None = None,
+    agent_options: dict[str, Any] | None = None,
+    warm_pytest: bool = False,
+    test_selection: str = DEFAULT_TEST_SELECTION,
+    output_dir: Path | None = None,
 ) -> TrialResult:
-    """Run a single trial: copy app, run agent, capture outcome, run graders."""
-    baseline = app_baseline or APP_DIR
-    with tempfile.TemporaryDirectory(prefix="eval_trial_") as tmp:
-        trial_app = Path(tmp) / "app"
-        shutil.copytree(baseline, trial_app)
-        # Install deps in the copy so poetry run pytest works
-        import subprocess
-
-        subprocess.run(
-            ["poetry", "install", "--no-interaction"],
-            cwd=trial_app,
-            capture_output=True,
-            timeout=60,
-        )
+    """Run a single trial: copy app, run agent, capture outcome, run graders.
 
-        system_prompt = task.system_prompt_override or (
-            "You are an expert coding agent. The app is in ../app. "
-            "When running tests or server commands, ALWAYS prepend poetry run (e.g. poetry run pytest)."
-        )
+    Pass a shared WorkspacePool to reuse warm workspaces; otherwise a one-off pool is used.
+    backend_factory, if given, builds the model backend for this trial (e.g. a cached one).
+    agent_options are extra keyword arguments for run_agent_task (e.g. token_budget).
+    With warm_pytest, the agent's run_tests tool and outcome capture share one warm PytestService.
+    With test_selection="affected", outcome capture runs only the tests affected by the files that
+    differ from the baseline snapshot, per the baseline's TestImpactMap (built once and cached).
+    With output_dir, command output that overflows the agent's output budget is kept in full
+    under output_dir/<task id>/trial_<i>/commands.
+    """
+    if workspaces is None:
+        with WorkspacePool(app_baseline or APP_DIR) as pool:
+            return run_trial(
+                task,
+                trial_index,
+                workspaces=pool,
+                model=model,
+                max_turns=max_turns,
+                timeout_sec=timeout_sec,
+                backend_factory=backend_factory,
+                agent_options=agent_options,
+                warm_pytest=warm_pytest,
+                test_selection=test_selection,
+                output_dir=output_dir,
+            )
 
+    start = time.perf_counter()
+    trial_app = workspaces.acquire()
+    timings = {"workspace_sec": time.perf_counter() - start}
+    pytest_service = PytestService(trial_app) if warm_pytest else None
+    try:
+        # Built from the fresh workspace, i.e. the baseline: cached after the first trial
+        test_impact = TestImpactMap.load_or_build(trial_app, TEST_IMPACT_CACHE_DIR) if test_selection == "affected" else None
+        start = time.perf_counter()
         result = run_agent_task(
             task.instruction,
             app_root=trial_app,
-            system_prompt=system_prompt,
+            system_prompt=_system_prompt(task),
             model=model,
             max_turns=max_turns,
             timeout_sec=timeout_sec,
+            backend=backend_factory() if backend_factory else None,
+            pytest_service=pytest_service,
+            test_impact=test_impact,
+            command_log_dir=_command_log_dir(output_dir, task, trial_index),
+            **(agent_options or {}),
         )
-
-        trajectory = Trajectory(
-            messages=result.messages,
-            n_turns=result.n_turns,
-            n_tool_calls=result.n_tool_calls,
-            usage=result.usage,
-            latency_sec=result.latency_sec,
-            finished=result.finished,
+        timings["agent_sec"] = time.perf_counter() - start
+        return _finish_trial(
+            task, trial_index, result, trial_app, timings, pytest_service, test_impact, workspaces.snapshot
         )
+    finally:
+        if pytest_service is not None:
+            pytest_service.close()
+        workspaces.release(trial_app)
+
 
-        outcome = capture_outcome(trial_app)
-
-        grader_results: list[GraderResult] = []
-        for grader_name in task.graders:
-            grader_fn = _get_grader(grader_name)
-            if grader_fn:
-                gr = grader_fn(trajectory=trajectory, outcome=outcome, task=task)
-                grader_results.append(gr)
-
-        return TrialResult(
-            task_id=task.id,
-            trial_index=trial_index,
-            trajectory=trajectory,
-            outcome=outcome,
-            grader_results=grader_results,
+async def arun_trial(
+    task: Task,
+    trial_index: int,
+    *,
+    workspaces: WorkspacePool,
+    model: str = DEFAULT_MODEL,
+    max_turns: int = DEFAULT_MAX_TURNS,
+    timeout_sec: float | None = DEFAULT_TIMEOUT_SEC,
+    backend_factory: Callable[[], Any] | None = None,
+    agent_options: dict[str, Any] | None = None,
+    warm_pytest: bool = False,
+    test_selection: str = DEFAULT_TEST_SELECTION,
+    output_dir: Path | None = None,
+) -> TrialResult:
+    """Async variant of run_trial: the agent runs on the event loop, blocking setup and grading in threads."""
+    start = time.perf_counter()
+    trial_app = await asyncio.to_thread(workspaces.acquire)
+    timings = {"workspace_sec": time.perf_counter() - start}
+    backend = backend_factory() if backend_factory else None
+    pytest_service = PytestService(trial_app) if warm_pytest else None
+    try:
+        test_impact = (
+            await asyncio.to_thread(TestImpactMap.load_or_build, trial_app, TEST_IMPACT_CACHE_DIR)
+            if test_selection == "affected"
+            else None
+        )
+        start = time.perf_counter()
+        result = await arun_agent_task(
+            task.instruction,
+            app_root=trial_app,
+            system_prompt=_system_prompt(task),
+            model=model,
+            max_turns=max_turns,
+            timeout_sec=timeout_sec,
+            backend=backend,
+            pytest_service=pytest_service,
+            test_impact=test_impact,
+            command_log_dir=_command_log_dir(output_dir, task, trial_index),
+            **(agent_options or {}),
+        )
+        timings["agent_sec"] = time.perf_counter() - start
+        return await asyncio.to_thread(
+            _finish_trial,
+            task,
+            trial_index,
+            result,
+            trial_app,
+            timings,
+            pytest_service,
+            test_impact,
+            workspaces.snapshot,
         )
+    finally:
+        if hasattr(backend, "aclose"):
+            await backend.aclose()
+        if pytest_service is not None:
+            pytest_service.close()
+        workspaces.release(trial_app)
+
+
+def _errored_trial(task: Task, trial_index: int, error: BaseException) -> TrialResult:
+    """A failed TrialResult for a trial that raised: every grader fails with the error text."""
+    text = f"{type(error).__name__}: {error}"
+    return TrialResult(
+        task_id=task.id,
+        trial_index=trial_index,
+        trajectory=Trajectory(messages=[], n_turns=0, n_tool_calls=0, usage={}, latency_sec=0.0, finished=False),
+        outcome=Outcome(pytest_exit_code=-1, pytest_stdout="", pytest_stderr=text),
+        grader_results=[GraderResult(name, passed=False, score=0.0, details={"error": text}) for name in task.graders],
+        error=text,
+    )
+
+
+def _split_completed(
+    tasks: list[Task], n_trials: int, completed: dict[tuple[str, int], TrialResult] | None
+) -> tuple[list[list[TrialResult | None]], list[tuple[int, int]]]:
+    """Per-task result slots pre-filled from completed, and the (task position, trial index) pairs left to run."""
+    completed = completed or {}
+    results: list[list[TrialResult | None]] = [
+        [completed.get((task.id, i)) for i in range(n_trials)] for task in tasks
+    ]
+    todo = [(pos, i) for pos in range(len(tasks)) for i in range(n_trials) if results[pos][i] is None]
+    return results, todo
+
+
+def run_tasks(
+    tasks: list[Task],
+    n_trials: int = 3,
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    workspace_mode: str = DEFAULT_WORKSPACE_MODE,
+    warm_workspaces: int | None = None,
+    model: str = DEFAULT_MODEL,
+    max_turns: int = DEFAULT_MAX_TURNS,
+    timeout_sec: float | None = DEFAULT_TIMEOUT_SEC,
+    backend_factory: Callable[[], Any] | None = None,
+    agent_options: dict[str, Any] | None = None,
+    warm_pytest: bool = False,
+    test_selection: str = DEFAULT_TEST_SELECTION,
+    output_dir: Path | None = None,
+    completed: dict[tuple[str, int], TrialResult] | None = None,
+    on_trial: Callable[[TrialResult], None] | None = None,
+) -> Iterator[tuple[Task, list[TrialResult]]]:
+    """Run N trials of every task on a bounded worker pool.
+
+    Trials from all tasks share the pool; each trial still gets its own app workspace from a
+    WorkspacePool that keeps `warm_workspaces` (default: `concurrency`) ready ahead of time.
+    Yields (task, trials) as soon as the last trial of a task finishes, with trials
+    ordered by trial index. output_dir is as for run_trial.
+
+    Trials in completed (by task id and trial index, e.g. loaded from an interrupted run) are
+    not run again; tasks with nothing left to run are yielded first. on_trial is called with
+    each newly finished trial, as soon as it finishes, from the calling thread.
+    """
+    if n_trials <= 0:
+        for task in tasks:
+            yield task, []
+        return
+
+    results, todo = _split_completed(tasks, n_trials, completed)
+    remaining = [sum(1 for pos_, _ in todo if pos_ == pos) for pos in range(len(tasks))]
+    for pos, task in enumerate(tasks):
+        if remaining[pos] == 0:
+            yield task, results[pos]
+    if not todo:
+        return
+
+    warm = concurrency if warm_workspaces is None else warm_workspaces
+    with (
+        WorkspacePool(APP_DIR, mode=workspace_mode, warm=warm, total=len(todo)) as workspaces,
+        ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool,
+    ):
+        futures = {
+            pool.submit(
+                run_trial,
+                tasks[pos],
+                i,
+                workspaces=workspaces,
+                model=model,
+                max_turns=max_turns,
+                timeout_sec=timeout_sec,
+                backend_factory=backend_factory,
+                agent_options=agent_options,
+                warm_pytest=warm_pytest,
+                test_selection=test_selection,
+                output_dir=output_dir,
+            ): (pos, i)
+            for pos, i in todo
+        }
+        for future in as_completed(futures):
+            pos, i = futures[future]
+            try:
+                results[pos][i] = future.result()
+            except Exception as e:
+                # One trial's failure (e.g. CacheMiss in replay) must not lose the rest of the run
+                results[pos][i] = _errored_trial(tasks[pos], i, e)
+            if on_trial is not None:
+                on_trial(results[pos][i])
+            remaining[pos] -= 1
+            if remaining[pos] == 0:
+                yield tasks[pos], results[pos]
 
 
 def run_task(
     task: Task,
     n_trials: int = 3,
     *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    workspace_mode: str = DEFAULT_WORKSPACE_MODE,
     model: str = DEFAULT_MODEL,
     max_turns: int = DEFAULT_MAX_TURNS,
     timeout_sec: float | None = DEFAULT_TIMEOUT_SEC,
+    backend_factory: Callable[[], Any] | None = None,
+    agent_options: dict[str, Any] | None = None,
+    warm_pytest: bool = False,
+    test_selection: str = DEFAULT_TEST_SELECTION,
+    output_dir: Path | None = None,
 ) -> list[TrialResult]:
-    """Run a task N times and return trial results."""
-    results = []
-    for i in range(n_trials):
-        tr = run_trial(task, i, model=model, max_turns=max_turns, timeout_sec=timeout_sec)
-        results.append(tr)
-    return results
+    """Run a task N times (up to `concurrency` trials at once) and return trial results."""
+    for _, trials in run_tasks(
+        [task],
+        n_trials,
+        concurrency=concurrency,
+        workspace_mode=workspace_mode,
+        model=model,
+        max_turns=max_turns,
+        timeout_sec=timeout_sec,
+        backend_factory=backend_factory,
+        agent_options=agent_options,
+        warm_pytest=warm_pytest,
+        test_selection=test_selection,
+        output_dir=output_dir,
+    ):
+        return trials
+    return []
+
+
+async def arun_tasks(
+    tasks: list[Task],
+    n_trials: int = 3,
+    *,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    workspace_mode: str = DEFAULT_WORKSPACE_MODE,
+    warm_workspaces: int | None = None,
+    model: str = DEFAULT_MODEL,
+    max_turns: int = DEFAULT_MAX_TURNS,
+    timeout_sec: float | None = DEFAULT_TIMEOUT_SEC,
+    backend_factory: Callable[[], Any] | None = None,
+    agent_options: dict[str, Any] | None = None,
+    warm_pytest: bool = False,
+    test_selection: str = DEFAULT_TEST_SELECTION,
+    output_dir: Path | None = None,
+    completed: dict[tuple[str, int], TrialResult] | None = None,
+    on_trial: Callable[[TrialResult], None] | None = None,
+) -> AsyncIterator[tuple[Task, list[TrialResult]]]:
+    """Async variant of run_tasks: all trials run on one event loop.
+
+    A semaphore caps in-flight trials at `concurrency` (e.g. to respect API rate limits),
+    so hundreds of trials can be driven without a thread each. completed and on_trial are as
+    for run_tasks.
+    """
+    if n_trials <= 0:
+        for task in tasks:
+            yield task, []
+        return
+
+    results, todo = _split_completed(tasks, n_trials, completed)
+    remaining = [sum(1 for pos_, _ in todo if pos_ == pos) for pos in range(len(tasks))]
+    for pos, task in enumerate(tasks):
+        if remaining[pos] == 0:
+            yield task, results[pos]
+    if not todo:
+        return
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    warm = concurrency if warm_workspaces is None else warm_workspaces
+
+    with WorkspacePool(APP_DIR, mode=workspace_mode, warm=warm, total=len(todo)) as workspaces:
+
+        async def one(pos: int, i: int) -> tuple[int, int, TrialResult]:
+            async with semaphore:
+                try:
+                    tr = await arun_trial(
+                        tasks[pos],
+                        i,
+                        workspaces=workspaces,
+                        model=model,
+                        max_turns=max_turns,
+                        timeout_sec=timeout_sec,
+                        backend_factory=backend_factory,
+                        agent_options=agent_options,
+                        warm_pytest=warm_pytest,
+                        test_selection=test_selection,
+                        output_dir=output_dir,
+                    )
+                except Exception as e:
+                    tr = _errored_trial(tasks[pos], i, e)
+            return pos, i, tr
+
+        pending = [asyncio.ensure_future(one(pos, i)) for pos, i in todo]
+        try:
+            for next_done in asyncio.as_completed(pending):
+                pos, i, tr = await next_done
+                results[pos][i] = tr
+                if on_trial is not None:
+                    on_trial(tr)
+                remaining[pos] -= 1
+                if remaining[pos] == 0:
+                    yield tasks[pos], results[pos]
+        finally:
+            for future in pending:
+                future.cancel()
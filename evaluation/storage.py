@@ -0,0 +1,92 @@
+"""On-disk trial results: one directory per trial, written atomically as each trial finishes.
+
+Layout under a run directory: <task id>/trial_<i>/ holds trajectory.json, outcome.json,
+grader_results.json and timings.json, then a DONE marker once all four are in place. A trial
+directory without the marker (interrupted mid-write, or only command logs) is incomplete and
+is run again on resume.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import asdict, fields
+from pathlib import Path
+from typing import Any
+
+from .types import GraderResult, Outcome, Task, Trajectory, TrialResult
+
+DONE_MARKER = "DONE"
+RUN_FILE = "run.json"
+
+
+def write_json_atomic(path: Path, data: Any) -> None:
+    """Write data as JSON via a temp file + rename, so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def trial_dir(run_dir: Path, task_id: str, trial_index: int) -> Path:
+    return run_dir / task_id / f"trial_{trial_index}"
+
+
+def save_trial(run_dir: Path, tr: TrialResult) -> None:
+    """Persist one finished trial; the DONE marker is written last.
+
+    A trial that raised (tr.error) is written without the marker, so it is run again on resume.
+    """
+    out = trial_dir(run_dir, tr.task_id, tr.trial_index)
+    write_json_atomic(out / "trajectory.json", asdict(tr.trajectory))
+    write_json_atomic(out / "outcome.json", asdict(tr.outcome))
+    write_json_atomic(out / "grader_results.json", [asdict(gr) for gr in tr.grader_results])
+    write_json_atomic(out / "timings.json", tr.timings)
+    if tr.error is not None:
+        return
+    write_json_atomic(out / DONE_MARKER, {"task_id": tr.task_id, "trial_index": tr.trial_index})
+
+
+def _known_fields(cls, data: dict[str, Any]) -> dict[str, Any]:
+    names = {f.name for f in fields(cls)}
+    return {k: v for k, v in data.items() if k in names}
+
+
+def load_trial(run_dir: Path, task_id: str, trial_index: int) -> TrialResult | None:
+    """A trial saved by save_trial, or None if it is missing or incomplete."""
+    path = trial_dir(run_dir, task_id, trial_index)
+    if not (path / DONE_MARKER).exists():
+        return None
+    try:
+        trajectory = json.loads((path / "trajectory.json").read_text())
+        outcome = json.loads((path / "outcome.json").read_text())
+        graders = json.loads((path / "grader_results.json").read_text())
+        timings = json.loads((path / "timings.json").read_text())
+    except (OSError, ValueError):
+        return None
+    return TrialResult(
+        task_id=task_id,
+        trial_index=trial_index,
+        trajectory=Trajectory(**_known_fields(Trajectory, trajectory)),
+        outcome=Outcome(**_known_fields(Outcome, outcome)),
+        grader_results=[GraderResult(**_known_fields(GraderResult, gr)) for gr in graders],
+        timings=timings,
+    )
+
+
+def load_completed(run_dir: Path, tasks: list[Task], n_trials: int) -> dict[tuple[str, int], TrialResult]:
+    """Completed trials of a run by (task id, trial index). Incomplete trial directories are removed."""
+    completed = {}
+    for task in tasks:
+        for i in range(n_trials):
+            tr = load_trial(run_dir, task.id, i)
+            if tr is not None:
+                completed[(task.id, i)] = tr
+            elif trial_dir(run_dir, task.id, i).exists():
+                shutil.rmtree(trial_dir(run_dir, task.id, i), ignore_errors=True)
+    return completed
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from evaluation import runner, workspace
+from evaluation.storage import DONE_MARKER, load_completed, load_trial, save_trial, trial_dir
+from evaluation.types import GraderResult, Outcome, Task, Trajectory, TrialResult
+
+TASKS = [Task(id="t1", name="One", instruction="Do one"), Task(id="t2", name="Two", instruction="Do two")]
+
+
+def _trial(task_id, trial_index, passed=True, error=None):
+    return TrialResult(
+        task_id=task_id,
+        trial_index=trial_index,
+        trajectory=Trajectory(messages=[], n_turns=1, n_tool_calls=0, usage={}, latency_sec=0.1, finished=True),
+        outcome=Outcome(pytest_exit_code=0 if passed else 1, pytest_stdout="", pytest_stderr=""),
+        grader_results=[GraderResult("deterministic_tests", passed=passed, score=float(passed))],
+        timings={"agent_sec": 0.1},
+        error=error,
+    )
+
+
+def test_saved_trial_loads_back(tmp_path):
+    tr = _trial("t1", 0)
+    save_trial(tmp_path, tr)
+    assert (trial_dir(tmp_path, "t1", 0) / DONE_MARKER).exists()
+    assert load_trial(tmp_path, "t1", 0) == tr
+
+
+def test_errored_trial_is_saved_without_the_marker(tmp_path):
+    save_trial(tmp_path, _trial("t1", 0, passed=False, error="CacheMiss: no recorded response"))
+    assert (trial_dir(tmp_path, "t1", 0) / "outcome.json").exists()
+    assert not (trial_dir(tmp_path, "t1", 0) / DONE_MARKER).exists()
+    assert load_trial(tmp_path, "t1", 0) is None
+
+
+def test_load_completed_skips_and_removes_incomplete_dirs(tmp_path):
+    save_trial(tmp_path, _trial("t1", 0))
+    save_trial(tmp_path, _trial("t1", 1, error="boom"))
+    # Interrupted after some files were written: no marker
+    partial = trial_dir(tmp_path, "t2", 0)
+    partial.mkdir(parents=True)
+    (partial / "trajectory.json").write_text("{}")
+    # Marker present but a file is unreadable
+    save_trial(tmp_path, _trial("t2", 1))
+    (trial_dir(tmp_path, "t2", 1) / "outcome.json").write_text("{trunc")
+
+    completed = load_completed(tmp_path, TASKS, n_trials=2)
+    assert list(completed) == [("t1", 0)]
+    assert not trial_dir(tmp_path, "t1", 1).exists()
+    assert not partial.exists()
+    assert not trial_dir(tmp_path, "t2", 1).exists()
+    assert trial_dir(tmp_path, "t1", 0).exists()
+
+
+def test_resume_runs_only_the_missing_trials(tmp_path, monkeypatch):
+    venv = tmp_path / "venv"
+    venv.mkdir()
+    monkeypatch.setattr(workspace, "ensure_app_env", lambda root: venv)
+    ran = []
+
+    def run_trial(task, trial_index, **kwargs):
+        ran.append((task.id, trial_index))
+        if (task.id, trial_index) == ("t2", 1):
+            raise RuntimeError("backend down")
+        return _trial(task.id, trial_index)
+
+    monkeypatch.setattr(runner, "run_trial", run_trial)
+    run_dir = tmp_path / "run"
+    save_trial(run_dir, _trial("t1", 0))
+    save_trial(run_dir, _trial("t1", 1))
+    save_trial(run_dir, _trial("t2", 0, error="boom"))
+
+    completed = load_completed(run_dir, TASKS, n_trials=2)
+    by_id = {
+        task.id: trials
+        for task, trials in runner.run_tasks(
+            TASKS, 2, concurrency=2, warm_workspaces=0, completed=completed, on_trial=lambda tr: save_trial(run_dir, tr)
+        )
+    }
+    assert sorted(ran) == [("t2", 0), ("t2", 1)]
+    assert [tr.error for tr in by_id["t1"]] == [None, None]
+    errored = by_id["t2"][1]
+    assert errored.error == "RuntimeError: backend down"
+    assert [gr.passed for gr in errored.grader_results] == [False]
+
+    # The errored trial is run again on the next resume, and only it
+    assert sorted(load_completed(run_dir, TASKS, n_trials=2)) == [("t1", 0), ("t1", 1), ("t2", 0)]
+
+
+def test_run_config_is_written_atomically(tmp_path):
+    from evaluation.storage import write_json_atomic
+
+    write_json_atomic(tmp_path / "run.json", {"run_id": "r1"})
+    assert json.loads((tmp_path / "run.json").read_text()) == {"run_id": "r1"}
+    assert [p.name for p in tmp_path.iterdir()] == ["run.json"]
+    with pytest.raises(TypeError):
+        write_json_atomic(tmp_path / "run.json", {"bad": object()})
+    assert json.loads((tmp_path / "run.json").read_text()) == {"run_id": "r1"}
+    assert [p.name for p in tmp_path.iterdir()] == ["run.json"]
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from evaluation import workspace
+from evaluation.workspace import WorkspacePool, changed_files
+
+
+@pytest.fixture
+def baseline(tmp_path, monkeypatch):
+    """A small app tree, with the cached app env replaced by an empty directory."""
+    app = tmp_path / "app"
+    app.mkdir()
+    (app / "main.py").write_text("app = None\n")
+    (app / "tests").mkdir()
+    (app / "tests" / "test_main.py").write_text("def test_ok():\n    pass\n")
+    venv = tmp_path / "venv"
+    venv.mkdir()
+    monkeypatch.setattr(workspace, "ensure_app_env", lambda root: venv)
+    return app
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_warm_pool_refills_after_acquire(baseline):
+    """Each acquire from a warm pool schedules one replacement."""
+    with WorkspacePool(baseline, mode="copy", warm=2) as pool:
+        _wait_for(lambda: pool._ready.qsize() == 2)
+        first = pool.acquire()
+        assert (first / "main.py").read_text() == "app = None\n"
+        assert (first / ".venv").is_symlink()
+        _wait_for(lambda: pool._ready.qsize() == 2)
+        second = pool.acquire()
+        assert second != first
+
+
+def test_warm_pool_stops_at_total(baseline):
+    """No more than total workspaces are built, and acquiring past it fails."""
+    with WorkspacePool(baseline, mode="copy", warm=2, total=3) as pool:
+        acquired = [pool.acquire() for _ in range(3)]
+        assert len(set(acquired)) == 3
+        assert pool._planned == 3
+        assert pool._ready.empty()
+        with pytest.raises(RuntimeError):
+            pool.acquire()
+
+
+def test_acquire_raises_a_failed_warm_build(baseline, monkeypatch):
+    def fail():
+        raise OSError("disk full")
+
+    pool = WorkspacePool(baseline, mode="copy")
+    monkeypatch.setattr(pool, "_materialise", fail)
+    pool.warm = 1
+    pool._schedule_fill()
+    with pytest.raises(OSError, match="disk full"):
+        pool.acquire()
+    pool.close()
+
+
+def test_release_and_close_remove_workspaces(baseline):
+    pool = WorkspacePool(baseline, mode="copy", warm=1)
+    released = pool.acquire()
+    kept = pool.acquire()
+    pool.release(released)
+    _wait_for(lambda: not released.parent.exists())
+    assert kept.exists()
+    pool.close()
+    assert not pool.root.exists()
+
+
+def test_workspaces_are_isolated_from_the_baseline(baseline):
+    with WorkspacePool(baseline, mode="auto") as pool:
+        ws = pool.acquire()
+        (ws / "main.py").write_text("app = 1\n")
+        assert (baseline / "main.py").read_text() == "app = None\n"
+        assert (pool.acquire() / "main.py").read_text() == "app = None\n"
+
+
+def test_unknown_mode_is_rejected(baseline):
+    with pytest.raises(ValueError, match="hardlink"):
+        WorkspacePool(baseline, mode="hardlink")
+
+
+def test_changed_files_compares_contents(baseline):
+    with WorkspacePool(baseline, mode="copy") as pool:
+        ws = pool.acquire()
+        (ws / "main.py").write_text("app = 1\n")
+        (ws / "tests" / "test_main.py").unlink()
+        (ws / "models.py").write_text("")
+        (ws / "todo.db").write_bytes(b"sqlite")
+        (ws / "__pycache__").mkdir()
+        (ws / "__pycache__" / "main.cpython-313.pyc").write_bytes(b"")
+        assert changed_files(baseline, ws) == ["main.py", "models.py", "tests/test_main.py"]
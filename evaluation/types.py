@@ -27,6 +27,12 @@ class Trajectory:
     usage: dict[str, int]
     latency_sec: float
     finished: bool
+    # One entry per LLM call: prompt_tokens, completion_tokens, total_tokens, cached_tokens, latency_sec
+    llm_calls: list[dict[str, Any]] = field(default_factory=list)
+    compaction_tokens_saved: int = 0
+    # Bytes the model emitted in file-changing tool calls vs bytes of files written as a result
+    bytes_emitted: int = 0
+    bytes_written: int = 0
 
 
 @dataclass
@@ -38,6 +44,11 @@ class Outcome:
     pytest_stderr: str
     db_todos: list[dict[str, Any]] | None = None
     files_changed: list[str] | None = None
+    # One entry per test: nodeid, outcome (passed/failed/error/skipped), duration, message on failure.
+    # None if per-test results could not be collected
+    tests: list[dict[str, Any]] | None = None
+    # "affected" if only the tests affected by files_changed ran, "full" otherwise
+    test_selection: str = "full"
 
 
 @dataclass
@@ -59,6 +70,10 @@ class TrialResult:
     trajectory: Trajectory
     outcome: Outcome
     grader_results: list[GraderResult]
+    # Wall time per harness phase: workspace_sec, agent_sec, outcome_sec, grading_sec
+    timings: dict[str, float] = field(default_factory=dict)
+    # Set if the trial raised instead of finishing (e.g. a replay cache miss); it then counts as failed
+    error: str | None = None
 
 
 @dataclass
@@ -72,6 +87,28 @@ class TaskResult:
     mean_tool_calls: float
     mean_tokens: float
     mean_latency_sec: float
+    mean_timings: dict[str, float] = field(default_factory=dict)
+    total_tokens: int = 0
+    total_prompt_tokens: int = 0
+    total_completion_tokens: int = 0
+    total_cached_tokens: int = 0
+    # Share of prompt tokens served from the provider's prompt cache
+    prompt_cache_hit_rate: float = 0.0
+    n_llm_calls: int = 0
+    llm_call_p50_sec: float = 0.0
+    llm_call_p95_sec: float = 0.0
+    # Time to the first streamed chunk (the whole call without streaming)
+    llm_ttft_p50_sec: float = 0.0
+    # Mean time between the first tool call being dispatched and the end of its LLM call, over
+    # turns with tool calls: the generation time tool execution overlapped (0 without streaming)
+    mean_tool_lead_sec: float = 0.0
+    mean_compaction_tokens_saved: float = 0.0
+    # Mean over trials of the mean grader score (partial credit, unlike pass_rate)
+    mean_score: float = 0.0
+    # Per test nodeid: share of the trials that ran it in which it passed
+    test_pass_rates: dict[str, float] = field(default_factory=dict)
+    # Tests that passed in some trials and failed in others
+    flaky_tests: list[str] = field(default_factory=list)
 
 
 @dataclass
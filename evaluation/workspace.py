@@ -0,0 +1,199 @@
+"""Trial workspaces: cheap app copies from a warm pool, cleaned up in the background."""
+
+import filecmp
+import fnmatch
+import itertools
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .environment import SOURCE_IGNORE, ensure_app_env, link_app_env
+
+logger = logging.getLogger(__name__)
+
+WORKSPACE_MODES = ("auto", "copy", "reflink")
+
+# Data files the app writes as it runs (e.g. SQLite databases), which are not sources
+MUTABLE_PATTERNS = ("*.db", "*.sqlite", "*.sqlite3", "*.db-journal", "*.db-wal", "*.db-shm")
+# Directories that hold environments and caches rather than sources (as SOURCE_IGNORE)
+SOURCE_DIRS_IGNORED = {".venv", "__pycache__", ".pytest_cache"}
+
+
+def _is_mutable(path: str) -> bool:
+    name = os.path.basename(path)
+    return any(fnmatch.fnmatch(name, pattern) for pattern in MUTABLE_PATTERNS)
+
+
+def _source_files(root: Path) -> set[str]:
+    """Relative posix paths of the files under root that belong to the app's sources."""
+    files = set()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SOURCE_DIRS_IGNORED]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if not _is_mutable(path):
+                files.add(Path(path).relative_to(root).as_posix())
+    return files
+
+
+def changed_files(baseline: Path, workspace: Path) -> list[str]:
+    """Files added, removed or modified in workspace relative to baseline, as relative posix paths.
+
+    Contents are compared, so a change counts however it was made (write tools, shell redirection,
+    sed -i). Databases and caches are not sources and are left out.
+    """
+    before, after = _source_files(baseline), _source_files(workspace)
+    modified = {rel for rel in before & after if not filecmp.cmp(baseline / rel, workspace / rel, shallow=False)}
+    return sorted((before ^ after) | modified)
+
+
+def _reflink_supported(directory: Path) -> bool:
+    """Return True if `cp --reflink=always` works on the filesystem holding directory."""
+    src = directory / ".reflink_probe"
+    dst = directory / ".reflink_probe_copy"
+    try:
+        src.write_bytes(b"probe")
+        result = subprocess.run(
+            ["cp", "--reflink=always", str(src), str(dst)],
+            capture_output=True,
+        )
+        return result.returncode == 0
+    except OSError:
+        return False
+    finally:
+        src.unlink(missing_ok=True)
+        dst.unlink(missing_ok=True)
+
+
+class WorkspacePool:
+    """Hands out isolated app workspaces materialised from a private baseline snapshot.
+
+    Modes:
+      copy     - full copy of the source tree
+      reflink  - copy-on-write clones (`cp --reflink`), falls back to copy if unsupported
+      auto     - reflink where supported, else copy
+
+    Up to `warm` workspaces are materialised ahead of time in a background thread (warming
+    stops once `total` workspaces have been prepared, if given), and released workspaces are
+    deleted in the background.
+    """
+
+    def __init__(self, baseline: Path, *, mode: str = "auto", warm: int = 0, total: int | None = None):
+        if mode not in WORKSPACE_MODES:
+            raise ValueError(f"Unknown workspace mode: {mode} (expected one of {', '.join(WORKSPACE_MODES)})")
+        self.root = Path(tempfile.mkdtemp(prefix="eval_workspaces_"))
+        self.warm = max(0, warm)
+        self.total = total
+
+        # Snapshot the baseline so links/clones never point into the real app directory
+        self.snapshot = self.root / "baseline"
+        shutil.copytree(baseline, self.snapshot, ignore=SOURCE_IGNORE)
+
+        if mode in ("auto", "reflink"):
+            if _reflink_supported(self.root):
+                mode = "reflink"
+            else:
+                if mode == "reflink":
+                    logger.warning("Reflinks not supported under %s, falling back to copy", self.root)
+                mode = "copy"
+        self.mode = mode
+        self.venv = ensure_app_env(baseline)
+
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._planned = 0
+        self._issued = 0
+        self._ready: queue.Queue[Path | BaseException] = queue.Queue()
+        self._filler = ThreadPoolExecutor(max_workers=1, thread_name_prefix="workspace-fill")
+        self._cleaner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="workspace-clean")
+        for _ in range(self.warm):
+            self._schedule_fill()
+
+    def _materialise(self) -> Path:
+        """Create a new workspace and return its app directory."""
+        workspace = self.root / f"trial_{next(self._counter)}" / "app"
+        workspace.parent.mkdir(parents=True)
+        if self.mode == "reflink":
+            result = subprocess.run(
+                ["cp", "-a", "--reflink=always", str(self.snapshot), str(workspace)],
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode != 0:
+                shutil.rmtree(workspace, ignore_errors=True)
+                shutil.copytree(self.snapshot, workspace)
+        else:
+            shutil.copytree(self.snapshot, workspace)
+
+        if self.venv is not None:
+            link_app_env(workspace, self.venv)
+        else:
+            # No cached env available: install deps in the copy so poetry run pytest works
+            subprocess.run(
+                ["poetry", "install", "--no-interaction"],
+                cwd=workspace,
+                capture_output=True,
+                timeout=60,
+            )
+        return workspace
+
+    def _reserve(self) -> bool:
+        """Count one more workspace against `total`; return False if the budget is spent."""
+        with self._lock:
+            if self.total is not None and self._planned >= self.total:
+                return False
+            self._planned += 1
+            return True
+
+    def _fill(self) -> None:
+        try:
+            self._ready.put(self._materialise())
+        except BaseException as e:
+            # Hand the failure to the acquire() waiting for this workspace
+            self._ready.put(e)
+
+    def _schedule_fill(self) -> None:
+        if self._reserve():
+            self._filler.submit(self._fill)
+
+    def acquire(self) -> Path:
+        """Return a fresh workspace, from the warm pool if one is ready.
+
+        With a `total`, at most that many workspaces are handed out. Once the budget is spent on
+        warm workspaces still being built, this waits for one rather than building another.
+        """
+        with self._lock:
+            if self.total is not None and self._issued >= self.total:
+                raise RuntimeError(f"All {self.total} workspaces of this pool have been acquired")
+            self._issued += 1
+        try:
+            workspace = self._ready.get_nowait()
+        except queue.Empty:
+            workspace = self._materialise() if self._reserve() else self._ready.get()
+        if isinstance(workspace, BaseException):
+            raise workspace
+        if self.warm:
+            self._schedule_fill()
+        return workspace
+
+    def release(self, workspace: Path) -> None:
+        """Schedule a workspace for deletion without blocking the caller."""
+        self._cleaner.submit(shutil.rmtree, workspace.parent, ignore_errors=True)
+
+    def close(self) -> None:
+        """Stop warming, wait for pending cleanup and delete everything under the pool root."""
+        self._filler.shutdown(wait=True, cancel_futures=True)
+        self._cleaner.shutdown(wait=True)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def __enter__(self) -> "WorkspacePool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()